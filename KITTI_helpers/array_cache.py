@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Cache of NumPy arrays keyed by a hash of everything they were computed from, used by
+learn_params1.evaluate to store ground truth/detection associations.
+
+An entry is a directory <cache_key> holding one .npy file per array.  Arrays are loaded memory
+mapped, so concurrent jobs on one machine share them through the page cache.  Entries are written
+to a temporary directory and renamed into place, so readers only ever see complete entries.
+"""
+import errno
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+#change when the arrays stored for the same inputs change, to invalidate existing entries
+CACHE_FORMAT_VERSION = 1
+
+def get_cache_key(filenames, parameters):
+    """
+    Inputs:
+    - filenames: list of input files (e.g. label files, detection files, source files of the code
+        computing the arrays), IOError is raised if one is missing
+    - parameters: tuple of parameters with a deterministic repr
+
+    Output:
+    - cache_key: hex digest of CACHE_FORMAT_VERSION, parameters and the names and contents of filenames
+    """
+    sha = hashlib.sha1()
+    sha.update(repr((CACHE_FORMAT_VERSION, parameters)))
+    for filename in filenames:
+        if not os.path.isfile(filename):
+            raise IOError(errno.ENOENT, "cache key input file not found", filename)
+        sha.update("\0%s\0" % filename)
+        with open(filename, "rb") as f:
+            sha.update(f.read())
+    return sha.hexdigest()
+
+def load_arrays(cache_directory, cache_key):
+    """
+    Output:
+    - arrays: dictionary of read only memory mapped arrays stored under cache_key, or None if there is no such entry
+    """
+    entry_directory = os.path.join(cache_directory, cache_key)
+    if not os.path.isdir(entry_directory):
+        return None
+    arrays = {}
+    for filename in os.listdir(entry_directory):
+        (name, extension) = os.path.splitext(filename)
+        if extension == ".npy":
+            arrays[name] = np.load(os.path.join(entry_directory, filename), mmap_mode='r')
+    return arrays
+
+def save_arrays(cache_directory, cache_key, arrays):
+    """
+    Atomically store arrays under cache_key.  If another process stored the same entry first, its
+    entry is kept.
+
+    Inputs:
+    - arrays: dictionary of arrays (not object arrays), keys are used as file names
+    """
+    if not os.path.exists(cache_directory):
+        try:
+            os.makedirs(cache_directory)
+        except OSError as exc:
+            if exc.errno != errno.EEXIST:
+                raise
+    temp_directory = tempfile.mkdtemp(prefix=".%s." % cache_key, dir=cache_directory)
+    try:
+        #mkdtemp makes the directory readable by its owner only
+        os.chmod(temp_directory, 0755)
+        for (name, array) in arrays.items():
+            np.save(os.path.join(temp_directory, "%s.npy" % name), np.asarray(array))
+        os.rename(temp_directory, os.path.join(cache_directory, cache_key))
+    except OSError as exc:
+        shutil.rmtree(temp_directory, ignore_errors=True)
+        if exc.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+            raise
+    except:
+        shutil.rmtree(temp_directory, ignore_errors=True)
+        raise
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Bounding box overlaps and gated assignment, used to match targets between particles when outputting
+online results (rbpf_KITTI_det_scores.match_target_ids) and to associate ground truth with tracker
+output in the KITTI evaluation (jdk_helper_evaluate_results).
+
+Boxes are arrays of shape (n, 4), each row [x1, y1, x2, y2] in KITTI format.
+"""
+import numpy as np
+from munkres import Munkres
+try:
+    #scipy >= 0.17
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+#'auto' uses 'scipy' if scipy.optimize.linear_sum_assignment is available and 'sparse' otherwise.
+#'scipy' solves the whole cost matrix with linear_sum_assignment, 'munkres' with the pure Python
+#Munkres solver, 'sparse' splits the pairs within the gate into connected components and solves each
+#component with Munkres
+ASSIGNMENT_BACKEND = 'auto'
+
+#cost of pairs outside the gate, so every solver prefers any number of pairs within the gate to one
+#pair outside it
+MAX_COST = 1e9
+
+def get_box_overlaps(boxes_a, boxes_b, criterion="union"):
+    """
+    Vectorized boxoverlap (KITTI devkit_tracking/python/evaluate_tracking.py) of every pair of boxes
+
+    Inputs:
+    - boxes_a: array of shape (n, 4)
+    - boxes_b: array of shape (m, 4)
+    - criterion: if 'union', overlap = (a inter b) / (a union b).  If 'a', overlap = (a inter b) / a,
+        where b should be a dontcare area.
+
+    Output:
+    - overlaps: array of shape (n, m), overlaps[i, j] is the overlap of boxes_a[i] and boxes_b[j]
+    """
+    boxes_a = np.asarray(boxes_a, dtype=float).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=float).reshape(-1, 4)
+    w = np.minimum(boxes_a[:, np.newaxis, 2], boxes_b[np.newaxis, :, 2]) - np.maximum(boxes_a[:, np.newaxis, 0], boxes_b[np.newaxis, :, 0])
+    h = np.minimum(boxes_a[:, np.newaxis, 3], boxes_b[np.newaxis, :, 3]) - np.maximum(boxes_a[:, np.newaxis, 1], boxes_b[np.newaxis, :, 1])
+    overlapping = (w > 0.) & (h > 0.)
+    inter = w*h
+    aarea = ((boxes_a[:, 2] - boxes_a[:, 0])*(boxes_a[:, 3] - boxes_a[:, 1]))[:, np.newaxis]
+    if criterion.lower() == "union":
+        barea = ((boxes_b[:, 2] - boxes_b[:, 0])*(boxes_b[:, 3] - boxes_b[:, 1]))[np.newaxis, :]
+        union = np.where(overlapping, aarea + barea - inter, 1.)
+        overlaps = inter/union
+    elif criterion.lower() == "a":
+        overlaps = inter/np.where(overlapping, aarea, 1.)
+    else:
+        raise TypeError("Unkown type for criterion")
+    overlaps[~overlapping] = 0.
+    return overlaps
+
+def solve_gated_assignment(cost_matrix, max_gated_cost, backend=None, munkres_ties=False):
+    """
+    Minimum cost assignment of rows to columns using only pairs within the gate: the same pairs as
+    running Munkres on cost_matrix with the costs of pairs outside the gate replaced by MAX_COST and
+    dropping the assigned pairs outside the gate.  When several assignments have the minimum cost the
+    backends may pick different ones.
+
+    Inputs:
+    - cost_matrix: 2d array of shape (n, m)
+    - max_gated_cost: pairs with cost <= max_gated_cost are within the gate
+    - backend: 'scipy', 'munkres', 'sparse', 'auto' or None for ASSIGNMENT_BACKEND
+    - munkres_ties: if True, cost matrices where a row or column has the same cost for two pairs within
+        the gate (e.g. duplicate boxes, the usual cause of ties) are solved with Munkres, so results
+        are the same as with the 'munkres' backend
+
+    Output:
+    - assigned_pairs: list of (row, col) tuples of the assigned pairs within the gate, sorted by row
+    """
+    if backend is None:
+        backend = ASSIGNMENT_BACKEND
+    if backend == 'auto':
+        backend = 'scipy' if linear_sum_assignment is not None else 'sparse'
+
+    cost_matrix = np.asarray(cost_matrix, dtype=float)
+    assert(cost_matrix.ndim == 2), cost_matrix.shape
+    gated = cost_matrix <= max_gated_cost
+    if not np.any(gated):
+        return []
+    gated_cost_matrix = np.where(gated, cost_matrix, MAX_COST)
+    if munkres_ties and backend != 'munkres' and has_repeated_costs(np.where(gated, cost_matrix, np.nan)):
+        backend = 'munkres'
+
+    if backend == 'scipy':
+        (rows, cols) = linear_sum_assignment(gated_cost_matrix)
+        assigned_pairs = zip(rows, cols)
+    elif backend == 'munkres':
+        assigned_pairs = Munkres().compute(gated_cost_matrix.tolist())
+    else:
+        assert(backend == 'sparse'), backend
+        assigned_pairs = []
+        for (rows, cols) in get_gated_components(gated):
+            component_pairs = Munkres().compute(gated_cost_matrix[np.ix_(rows, cols)].tolist())
+            assigned_pairs.extend([(rows[row], cols[col]) for (row, col) in component_pairs])
+    return sorted([(int(row), int(col)) for (row, col) in assigned_pairs if gated[row, col]])
+
+def has_repeated_costs(costs):
+    """
+    Output:
+    - repeated: True if a row or column of costs has the same (not nan) value twice
+    """
+    for sorted_costs in [np.sort(costs, axis=1), np.sort(costs, axis=0).T]:
+        if sorted_costs.shape[1] > 1 and np.any(sorted_costs[:, 1:] == sorted_costs[:, :-1]):
+            return True
+    return False
+
+def get_gated_components(gated):
+    """
+    Connected components of the bipartite graph of rows and columns with an edge for every pair within
+    the gate.  Pairs in different components never compete, so each component can be assigned on its own.
+
+    Input:
+    - gated: boolean array of shape (n, m), gated[i, j] if row i and column j are within the gate
+
+    Output:
+    - components: list of (rows, cols) arrays of the components with at least one pair within the gate
+    """
+    (row_count, col_count) = gated.shape
+    #union find over rows 0..n-1 and columns n..n+m-1
+    parents = range(row_count + col_count)
+    def find(node):
+        while parents[node] != node:
+            parents[node] = parents[parents[node]]
+            node = parents[node]
+        return node
+    for (row, col) in zip(*np.nonzero(gated)):
+        (root1, root2) = (find(row), find(row_count + col))
+        if root1 != root2:
+            parents[root1] = root2
+
+    rows_by_root = {}
+    cols_by_root = {}
+    for row in np.flatnonzero(np.any(gated, axis=1)):
+        rows_by_root.setdefault(find(row), []).append(row)
+    for col in np.flatnonzero(np.any(gated, axis=0)):
+        cols_by_root.setdefault(find(row_count + col), []).append(col)
+    return [(np.array(rows_by_root[root]), np.array(cols_by_root[root])) for root in sorted(rows_by_root)]
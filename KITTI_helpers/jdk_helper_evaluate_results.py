@@ -2,8 +2,10 @@
 # encoding: utf-8
 
 import sys,os,copy,math
-from munkres import Munkres
+import multiprocessing
+from StringIO import StringIO
 from collections import defaultdict
+from itertools import chain
 try:
     from ordereddict import OrderedDict # can be installed using pip
 except:
@@ -14,6 +16,19 @@ import numpy as np
 import glob
 
 import mailpy
+from box_assignment import get_box_overlaps
+from box_assignment import solve_gated_assignment
+from kitti_loader import load_kitti_sequence
+
+#number of worker processes eval_results evaluates runs on, by default one per core
+NUM_EVAL_PROCESSES = multiprocessing.cpu_count()
+
+#number of metrics in trackingEvaluation.get_results_as_array
+N_METRICS = 21
+
+#ground truth shared by the evaluation worker processes, set by evaluate_runs before the
+#pool is created so forked workers read it without loading or copying it again
+SHARED_GROUNDTRUTH = None
 
 #########################################################################
 # function that does the evaluation
@@ -65,6 +80,68 @@ class tData:
         attrs = vars(self)
         return '\n'.join("%s: %s" % item for item in attrs.items())
 
+def get_boxes(objects):
+    """
+    Output:
+    - boxes: array of shape (n, 4), the [x1, y1, x2, y2] bounding boxes of the n tData objects
+    """
+    return np.array([[o.x1, o.y1, o.x2, o.y2] for o in objects], dtype=float).reshape(-1, 4)
+
+def count_trajectory_metrics(trajectories, ignored):
+    """
+    MT/PT/ML, id-switches and fragmentations of ground truth trajectories, vectorized over the frames
+    of all trajectories
+
+    Inputs:
+    - trajectories: list of ground truth trajectories, trajectories[i][f] is the id of the tracker
+        associated with trajectory i on its fth frame, -1 if none
+    - ignored: list of the same shape as trajectories, ignored[i][f] is True if trajectory i is
+        ignored on its fth frame
+
+    Output:
+    - counts: tuple (n_ignored, MT, PT, ML, id_switches, fragments) where n_ignored is the number of
+        trajectories that are ignored on every frame
+    """
+    lengths = np.array([len(g) for g in trajectories], dtype=int)
+    if len(lengths) == 0:
+        return (0, 0, 0, 0, 0, 0)
+    g = np.fromiter(chain.from_iterable(trajectories), dtype=int, count=np.sum(lengths))
+    ign = np.fromiter(chain.from_iterable(ignored), dtype=bool, count=np.sum(lengths))
+    trajectory_index = np.repeat(np.arange(len(lengths)), lengths)
+    position = np.arange(len(g)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    first = position == 0
+    last = position == lengths[trajectory_index] - 1
+
+    # last_id after every frame: the first frame's tracker id, then -1 after an ignored frame, the
+    # tracker id after a tracked frame and unchanged after an untracked frame
+    changed = first | ign | (g != -1)
+    new_last_id = np.where(first | ~ign, g, -1)
+    last_id = new_last_id[np.maximum.accumulate(np.where(changed, np.arange(len(g)), 0))]
+    # last_id, g[f-1] and g[f+1] seen on frame f, only used where they are in the same trajectory
+    prev_last_id = np.roll(last_id, 1)
+    prev_g = np.roll(g, 1)
+    next_g = np.roll(g, -1)
+
+    counted = ~first & ~ign
+    id_switches = counted & (prev_last_id != g) & (prev_last_id != -1) & (g != -1) & (prev_g != -1)
+    fragments = counted & ~last & (prev_g != g) & (prev_last_id != -1) & (g != -1) & (next_g != -1)
+    # handle last frame; tracked state is handeled by last_id
+    fragments |= counted & last & (prev_g != g) & (g != -1)
+    # first detection (necessary to be in gt_trajectories) is always tracked
+    tracked = np.bincount(trajectory_index, weights=(first & (g >= 0)) | (counted & (g != -1)), minlength=len(lengths))
+
+    # all frames of a trajectory are ignored
+    all_ignored = np.bincount(trajectory_index, weights=ign, minlength=len(lengths)) == lengths
+    untracked = ~all_ignored & (np.bincount(trajectory_index, weights=(g == -1), minlength=len(lengths)) == lengths)
+    tracking_ratio = tracked/lengths.astype(float)
+    evaluated = ~all_ignored & ~untracked
+    MT = evaluated & (tracking_ratio > 0.8)
+    ML = untracked | (evaluated & (tracking_ratio < 0.2))
+    PT = evaluated & ~MT & ~ML
+    counted_trajectories = evaluated[trajectory_index]
+    return (int(np.sum(all_ignored)), int(np.sum(MT)), int(np.sum(PT)), int(np.sum(ML)), \
+            int(np.sum(id_switches & counted_trajectories)), int(np.sum(fragments & counted_trajectories)))
+
 class trackingEvaluation(object):
     """ tracking statistics (CLEAR MOT, id-switches, fragments, ML/PT/MT, precision/recall)
              MOTA	- Multi-object tracking accuracy in [0,100]
@@ -164,6 +241,17 @@ class trackingEvaluation(object):
             return False
         return True
 
+    def setGroundtruth(self, groundtruth):
+        """
+        Use ground truth already loaded by load_groundtruth instead of loading it again.
+        The ground truth objects are not copied, compute3rdPartyMetrics only overwrites
+        their per frame association fields so they can be shared by many evaluations.
+        """
+        self.groundtruth = [groundtruth[s_name][0] for s_name in self.sequence_name]
+        self.dcareas     = [groundtruth[s_name][1] for s_name in self.sequence_name]
+        self.n_gt_seq    = [groundtruth[s_name][2] for s_name in self.sequence_name]
+        self.n_gt_trajectories = sum(self.n_gt_seq)
+
     def loadTracker(self):
         """Helper function to load tracker data"""
         try:
@@ -179,9 +267,6 @@ class trackingEvaluation(object):
             Use loadGroundtruth() or loadTracker() to load this data.
             Loads detections in KITTI format from textfiles.
         """
-        # construct objectDetections object to hold detection data
-        t_data  = tData()
-        data    = []
         eval_2d = True
         eval_3d = True
 
@@ -189,97 +274,29 @@ class trackingEvaluation(object):
         n_trajectories     = 0
         n_trajectories_seq = []
         for seq, s_name in enumerate(self.sequence_name):
-            i              = 0
             filename       = os.path.join(root_dir, "%s.txt" % s_name)
-            f              = open(filename, "r") 
-
-            f_data         = [[] for x in xrange(self.n_frames[seq])] # current set has only 1059 entries, sufficient length is checked anyway
-            ids            = []
-            n_in_seq       = 0
-            id_frame_cache = []
-            for line in f:
-                # KITTI tracking benchmark data format:
-                # (frame,tracklet_id,objectType,truncation,occlusion,alpha,x1,y1,x2,y2,h,w,l,X,Y,Z,ry)
-                line = line.strip()
-                fields            = line.split(" ")
-                # classes that should be loaded (ignored neighboring classes)
-                if "car" in cls.lower():
-                    classes = ["car","van"]
-                elif "pedestrian" in cls.lower():
-                    classes = ["pedestrian","person_sitting"]
-                else:
-                    classes = [cls.lower()]
-                classes += ["dontcare"]
-                if not any([s for s in classes if s in fields[2].lower()]):
-                    continue
-                # get fields from table
-                t_data.frame        = int(float(fields[0]))     # frame
-                t_data.track_id     = int(float(fields[1]))     # id
-                t_data.obj_type     = fields[2].lower()         # object type [car, pedestrian, cyclist, ...]
-                t_data.truncation   = float(fields[3])          # truncation [0..1]
-                t_data.occlusion    = int(float(fields[4]))     # occlusion  [0,1,2]
-                t_data.obs_angle    = float(fields[5])          # observation angle [rad]
-                t_data.x1           = float(fields[6])          # left   [px]
-                t_data.y1           = float(fields[7])          # top    [px]
-                t_data.x2           = float(fields[8])          # right  [px]
-                t_data.y2           = float(fields[9])          # bottom [px]
-                t_data.h            = float(fields[10])         # height [m]
-                t_data.w            = float(fields[11])         # width  [m]
-                t_data.l            = float(fields[12])         # length [m]
-                t_data.X            = float(fields[13])         # X [m]
-                t_data.Y            = float(fields[14])         # Y [m]
-                t_data.Z            = float(fields[15])         # Z [m]
-                t_data.yaw          = float(fields[16])         # yaw angle [rad]
-                if not loading_groundtruth:
-                    if len(fields) == 17:
-                        t_data.score = -1
-                    elif len(fields) == 18:
-                        t_data.score  = float(fields[17])     # detection score
-                    else:
-                        self.mail.msg("file is not in KITTI format")
-                        return
-
-                # do not consider objects marked as invalid
-                if t_data.track_id is -1 and t_data.obj_type != "dontcare":
-                    continue
-
-                idx = t_data.frame
-                # check if length for frame data is sufficient
-                if idx >= len(f_data):
-                    print "extend f_data", idx, len(f_data)
-                    f_data += [[] for x in xrange(max(500, idx-len(f_data)))]
-                try:
-                    id_frame = (t_data.frame,t_data.track_id)
-                    if id_frame in id_frame_cache and not loading_groundtruth:
-                        self.mail.msg("track ids are not unique for sequence %d: frame %d" % (seq,t_data.frame))
-                        self.mail.msg("track id %d occured at least twice for this frame" % t_data.track_id)
-                        self.mail.msg("Exiting...")
-                        #continue # this allows to evaluate non-unique result files
-                        return False
-                    id_frame_cache.append(id_frame)
-                    f_data[t_data.frame].append(copy.copy(t_data))
-                except:
-                    print len(f_data), idx
-                    raise
-
-                if t_data.track_id not in ids and t_data.obj_type!="dontcare":
-                    ids.append(t_data.track_id)
-                    n_trajectories +=1
-                    n_in_seq +=1
-
+            sequence       = load_kitti_sequence(filename, cls, self.n_frames[seq], has_scores=not loading_groundtruth)
+            if sequence is None:
+                self.mail.msg("file is not in KITTI format")
+                return
+            if not loading_groundtruth:
+                id_frame = sequence.get_duplicate_id()
+                if id_frame is not None:
+                    self.mail.msg("track ids are not unique for sequence %d: frame %d" % (seq,id_frame[0]))
+                    self.mail.msg("track id %d occured at least twice for this frame" % id_frame[1])
+                    self.mail.msg("Exiting...")
+                    return False
                 # check if uploaded data provides information for 2D and 3D evaluation
-                if not loading_groundtruth and eval_2d is True and(t_data.x1==-1 or t_data.x2==-1 or t_data.y1==-1 or t_data.y2==-1):
-                    eval_2d = False
-                if not loading_groundtruth and eval_3d is True and(t_data.X==-1000 or t_data.Y==-1000 or t_data.Z==-1000):
-                    eval_3d = False
+                eval_2d = eval_2d and sequence.has_2d_boxes()
+                eval_3d = eval_3d and sequence.has_3d_positions()
 
-            # only add existing frames
+            n_in_seq = sequence.get_trajectory_count()
+            n_trajectories += n_in_seq
             n_trajectories_seq.append(n_in_seq)
-            seq_data.append(f_data)
-            f.close()
+            seq_data.append(sequence)
 
         if not loading_groundtruth:
-            self.tracker=seq_data
+            self.tracker=[sequence.get_frames(tData) for sequence in seq_data]
             self.n_tr_trajectories=n_trajectories
             self.eval_2d = eval_2d
             self.eval_3d = eval_3d
@@ -290,26 +307,14 @@ class trackingEvaluation(object):
             # split ground truth and DontCare areas
             self.dcareas     = []
             self.groundtruth = []
-            for seq_idx in range(len(seq_data)):
-                seq_gt = seq_data[seq_idx]
-                s_g, s_dc = [],[]
-                for f in range(len(seq_gt)):
-                    all_gt = seq_gt[f]
-                    g,dc = [],[]
-                    for gg in all_gt:
-                        if gg.obj_type=="dontcare":
-                            dc.append(gg)
-                        else:
-                            g.append(gg)
-                    s_g.append(g)
-                    s_dc.append(dc)
-                self.dcareas.append(s_dc)
-                self.groundtruth.append(s_g)
+            for sequence in seq_data:
+                is_dontcare = sequence.objects['obj_type'] == "dontcare"
+                self.dcareas.append(sequence.get_frames(tData, is_dontcare))
+                self.groundtruth.append(sequence.get_frames(tData, ~is_dontcare))
             self.n_gt_seq=n_trajectories_seq
             self.n_gt_trajectories=n_trajectories
         return True
-            
-            
+
     def boxoverlap(self,a,b,criterion="union"):
         """
             boxoverlap computes intersection over union for bbox a and b in KITTI format.
@@ -347,19 +352,17 @@ class trackingEvaluation(object):
                   MT/PT/ML
         """
 
-        # construct Munkres object for Hungarian Method association
-        hm = Munkres()
-        max_cost = 1e9
-
         # go through all frames and associate ground truth and tracker results
         # groundtruth and tracker contain lists for every single frame containing lists of KITTI format detections
         fr, ids = 0,0 
 #        for seq_idx in range(len(self.groundtruth)):
 #        for seq_idx in [6, 7, 8, 9, 10, 11, 15, 16, 17, 18, 19, 20]:
         for seq_idx in self.seq_idx_to_eval:
-            seq_gt           = self.groundtruth[seq_idx]
-            seq_dc           = self.dcareas[seq_idx]
-            seq_tracker      = self.tracker[seq_idx]
+            # loaded data is ordered as self.sequence_name, which needn't start at sequence 0
+            seq_pos          = self.sequence_name.index("%04d" % seq_idx)
+            seq_gt           = self.groundtruth[seq_pos]
+            seq_dc           = self.dcareas[seq_pos]
+            seq_tracker      = self.tracker[seq_pos]
             seq_trajectories = defaultdict(list)
             seq_ignored      = defaultdict(list)
             seqtp            = 0
@@ -367,7 +370,8 @@ class trackingEvaluation(object):
             seqfp            = 0
             seqcost          = 0
 
-            last_ids = [[],[]]
+            # last_ids[gt track id] = associated tracker id (-1 if none) on the previous frame
+            last_ids = {}
             tmp_frags = 0
             for f in range(len(seq_gt)):
                 g = seq_gt[f]
@@ -378,9 +382,13 @@ class trackingEvaluation(object):
                 self.n_gt += len(g)
                 self.n_tr += len(t)
 
-                # use hungarian method to associate, using boxoverlap 0..1 as cost
-                # build cost matrix
-                cost_matrix = []
+                # associate with minimum cost assignment, using boxoverlap 0..1 as cost
+                # build cost matrix, overlap == 1 is cost ==0
+                cost_matrix = 1-get_box_overlaps(get_boxes(g), get_boxes(t))
+                # associate, gating for boxoverlap
+                # equal cost associations are chosen as by Munkres so metrics don't depend on the solver
+                association_matrix = solve_gated_assignment(cost_matrix, self.min_overlap, munkres_ties=True)
+
                 this_ids = [[],[]]
                 for gg in g:
                     # save current ids
@@ -389,26 +397,11 @@ class trackingEvaluation(object):
                     gg.tracker       = -1
                     gg.id_switch     = 0
                     gg.fragmentation = 0
-                    cost_row         = []
-                    for tt in t:
-                        # overlap == 1 is cost ==0
-                        c = 1-self.boxoverlap(gg,tt)
-                        # gating for boxoverlap
-                        if c<=self.min_overlap:
-                            cost_row.append(c)
-                        else:
-                            cost_row.append(max_cost)
-                    cost_matrix.append(cost_row)
                     # all ground truth trajectories are initially not associated
                     # extend groundtruth trajectories lists (merge lists)
                     seq_trajectories[gg.track_id].append(-1)
                     seq_ignored[gg.track_id].append(False)
 
-                if len(g) is 0:
-                    cost_matrix=[[]]
-                # associate
-                association_matrix = hm.compute(cost_matrix)
-
                 # mapping for tracker ids and ground truth ids
                 tmptp = 0
                 tmpfp = 0
@@ -416,41 +409,35 @@ class trackingEvaluation(object):
                 tmpc  = 0
                 this_cost = [-1]*len(g)
                 for row,col in association_matrix:
-                    # apply gating on boxoverlap
-                    c = cost_matrix[row][col]
-                    if c < max_cost:
-                        g[row].tracker   = t[col].track_id
-                        this_ids[1][row] = t[col].track_id
-                        t[col].valid     = True
-                        g[row].distance  = c
-                        self.total_cost += 1-c
-                        seqcost         += 1-c
-                        tmpc            += 1-c
-                        seq_trajectories[g[row].track_id][-1] = t[col].track_id
-
-                        # true positives are only valid associations
-                        self.tp += 1
-                        tmptp   += 1
-                        this_cost.append(c)
-                    else:
-                        g[row].tracker = -1
-                        self.fn       += 1
-                        tmpfn         += 1
+                    # only associations within the gate are returned
+                    c = float(cost_matrix[row, col])
+                    g[row].tracker   = t[col].track_id
+                    this_ids[1][row] = t[col].track_id
+                    t[col].valid     = True
+                    g[row].distance  = c
+                    self.total_cost += 1-c
+                    seqcost         += 1-c
+                    tmpc            += 1-c
+                    seq_trajectories[g[row].track_id][-1] = t[col].track_id
+
+                    # true positives are only valid associations
+                    self.tp += 1
+                    tmptp   += 1
+                    this_cost.append(c)
 
                 # associate tracker and DontCare areas
                 # ignore tracker in neighboring classes
                 nignoredtracker = 0
-                for tt in t:
+                # tracker boxes that are more than half covered by a DontCare area
+                in_dcarea = np.any(get_box_overlaps(get_boxes(t), get_boxes(dc), "a")>0.5, axis=1)
+                for tt_idx,tt in enumerate(t):
                     if (self.cls=="car" and tt.obj_type=="van") or (self.cls=="pedestrian" and tt.obj_type=="person_sitting"):
                         nignoredtracker+= 1
                         tt.ignored      = True
                         continue
-                    for d in dc:
-                        overlap = self.boxoverlap(tt,d,"a")
-                        if overlap>0.5 and not tt.valid:
-                            tt.ignored      = True
-                            nignoredtracker+= 1
-                            break
+                    if in_dcarea[tt_idx] and not tt.valid:
+                        tt.ignored      = True
+                        nignoredtracker+= 1
 
                 # check for ignored FN/TP (truncation or neighboring object class)
                 ignoredfn  = 0
@@ -484,7 +471,7 @@ class trackingEvaluation(object):
                 tmptp -= nignoredtp
                 self.n_gt -= (ignoredfn + nignoredtp)
 
-                # false negatives = associated gt bboxes exceding association threshold + non-associated gt bboxes
+                # false negatives = non-associated gt bboxes
                 tmpfn   += len(g)-len(association_matrix)-ignoredfn
                 self.fn += len(g)-len(association_matrix)-ignoredfn
                 # false positives = tracker bboxes - associated tracker bboxes
@@ -518,10 +505,9 @@ class trackingEvaluation(object):
 
                 # check for id switches or fragmentations
                 for i,tt in enumerate(this_ids[0]):
-                    if tt in last_ids[0]:
-                        idx = last_ids[0].index(tt)
+                    if tt in last_ids:
                         tid = this_ids[1][i]
-                        lid = last_ids[1][idx]
+                        lid = last_ids[tt]
                         if tid != lid and lid != -1 and tid != -1:
                             if g[i].truncation<self.max_truncation:
                                 g[i].id_switch = 1
@@ -532,8 +518,10 @@ class trackingEvaluation(object):
                                 tmp_frags +=1
                                 fr +=1    
 
-                # save current index
-                last_ids = this_ids
+                # save current index, the first association of a track id as for list.index
+                last_ids = {}
+                for tt, tid in reversed(zip(this_ids[0], this_ids[1])):
+                    last_ids[tt] = tid
                 # compute MOTP_t
                 MODP_t = 0
                 if tmptp!=0:
@@ -549,53 +537,15 @@ class trackingEvaluation(object):
         for seq_idx, (seq_trajectories,seq_ignored) in enumerate(zip(self.gt_trajectories, self.ign_trajectories)):
             if len(seq_trajectories)==0:
                 continue
-            tmpMT, tmpML, tmpPT, tmpId_switches, tmpFragments = [0]*5
-            n_ignored_tr = 0
-            for g, ign_g in zip(seq_trajectories.values(), seq_ignored.values()):
-                # all frames of this gt trajectory are ignored
-                if all(ign_g):
-                    n_ignored_tr+=1
-                    n_ignored_tr_total+=1
-                    continue
-                if all([this==-1 for this in g]):
-                    tmpML+=1
-                    self.ML+=1
-                    continue
-                # compute tracked frames in trajectory
-                last_id = g[0]
-                # first detection (necessary to be in gt_trajectories) is always tracked
-                tracked = 1 if g[0]>=0 else 0
-                lgt = 0 if ign_g[0] else 1
-                for f in range(1,len(g)):
-                    if ign_g[f]:
-                        last_id = -1
-                        continue
-                    lgt+=1
-                    if last_id != g[f] and last_id != -1 and g[f] != -1 and g[f-1] != -1:
-                        tmpId_switches   += 1
-                        self.id_switches += 1
-                    if f < len(g)-1 and g[f-1] != g[f] and last_id != -1  and g[f] != -1 and g[f+1] != -1:
-                        tmpFragments   += 1
-                        self.fragments += 1
-                    if g[f] != -1:
-                        tracked += 1
-                        last_id = g[f]
-                # handle last frame; tracked state is handeled in for loop (g[f]!=-1)
-                if len(g)>1 and g[f-1] != g[f] and last_id != -1  and g[f] != -1 and not ign_g[f]:
-                    tmpFragments   += 1
-                    self.fragments += 1
-
-                # compute MT/PT/ML
-                tracking_ratio = tracked/float(len(g))
-                if tracking_ratio > 0.8:
-                    tmpMT   += 1
-                    self.MT += 1
-                elif tracking_ratio < 0.2:
-                    tmpML   += 1
-                    self.ML += 1
-                else: # 0.2 <= tracking_ratio <= 0.8
-                    tmpPT   += 1
-                    self.PT += 1
+            track_ids = seq_trajectories.keys()
+            (n_ignored_tr, tmpMT, tmpPT, tmpML, tmpId_switches, tmpFragments) = count_trajectory_metrics( \
+                [seq_trajectories[track_id] for track_id in track_ids], [seq_ignored[track_id] for track_id in track_ids])
+            n_ignored_tr_total += n_ignored_tr
+            self.MT          += tmpMT
+            self.PT          += tmpPT
+            self.ML          += tmpML
+            self.id_switches += tmpId_switches
+            self.fragments   += tmpFragments
 
         if (self.n_gt_trajectories-n_ignored_tr_total)==0:
             self.MT = 0.
@@ -798,7 +748,28 @@ class trackingEvaluation(object):
         self.printSep()
         dump.close()
 
-def evaluate(det_path, seq_idx_to_eval, class_to_eval = "car"):
+def load_groundtruth(seq_idx_to_eval, class_to_eval = "car"):
+    """
+    Inputs:
+    - seq_idx_to_eval: a list of sequence indices
+    - class_to_eval: class of objects to load
+
+    Output:
+    - groundtruth: dictionary, groundtruth[sequence name] is (ground truth objects by frame,
+        DontCare areas by frame, number of ground truth trajectories) for every sequence in
+        seq_idx_to_eval, to pass to evaluate, or None if the ground truth was not found
+    """
+    e = trackingEvaluation(None, seq_idx_to_eval, cls=class_to_eval)
+    if not e.loadGroundtruth():
+        return None
+    return dict(zip(e.sequence_name, zip(e.groundtruth, e.dcareas, e.n_gt_seq)))
+
+def evaluate(det_path, seq_idx_to_eval, class_to_eval = "car", groundtruth = None):
+    """
+    Inputs:
+    - groundtruth: ground truth from load_groundtruth for (a superset of) seq_idx_to_eval and
+        class_to_eval, or None to load the ground truth of seq_idx_to_eval
+    """
     # start evaluation and instanciated eval object
 #    mail.msg("Processing Result for KITTI Tracking Benchmark")
     print "Evaluating class ", class_to_eval
@@ -810,7 +781,9 @@ def evaluate(det_path, seq_idx_to_eval, class_to_eval = "car"):
         print "det_path: ", det_path
         return False
     # load groundtruth data for this class
-    if not e.loadGroundtruth():
+    if groundtruth is not None:
+        e.setGroundtruth(groundtruth)
+    elif not e.loadGroundtruth():
         print "Ground truth not found."
         return False
     # sanity checks
@@ -874,7 +847,77 @@ def print_multi_run_metrics(packed_metrics, number_of_runs):
      
         print "="*80
 
-def eval_results(all_run_results, seq_idx_to_eval, info_by_run=None):
+def get_run_folders(all_run_results):
+    """
+    Output:
+    - run_folders: folders in all_run_results, in glob order (the order of info_by_run in eval_results)
+    """
+    return [cur_run_results for cur_run_results in glob.glob(all_run_results + "/*") if os.path.isdir(cur_run_results)]
+
+def evaluate_run(task):
+    """
+    Evaluate one run with SHARED_GROUNDTRUTH, in a worker process of evaluate_runs
+
+    Input:
+    - task: (run_folder, seq_idx_to_eval) tuple
+
+    Output:
+    - (metrics, output): metrics from evaluate and everything evaluate printed
+    """
+    (run_folder, seq_idx_to_eval) = task
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        metrics = evaluate(run_folder + "/", seq_idx_to_eval, groundtruth=SHARED_GROUNDTRUTH) # + operator used for string concatenation!
+        output = sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+    assert(metrics is not False), (run_folder, output)
+    return (metrics, output)
+
+def evaluate_runs(run_folders, seq_idx_groups, num_processes=None):
+    """
+    Evaluate every run on every group of sequences on a process pool.  Ground truth is loaded once
+    for all sequences and shared with the worker processes.
+
+    Inputs:
+    - run_folders: list of folders containing .txt results for each sequence, e.g. from get_run_folders
+    - seq_idx_groups: list of lists of sequence indices, each run is evaluated on each list
+    - num_processes: number of worker processes, NUM_EVAL_PROCESSES if None
+
+    Outputs:
+    - metrics_by_group: array of shape (len(seq_idx_groups), len(run_folders), N_METRICS),
+        metrics_by_group[i, j] are the metrics of run_folders[j] on seq_idx_groups[i]
+    - output_by_group: output_by_group[i][j] is what evaluate printed for run_folders[j] on seq_idx_groups[i]
+    """
+    global SHARED_GROUNDTRUTH
+    if num_processes is None:
+        num_processes = NUM_EVAL_PROCESSES
+    all_seq_idx = sorted(set(chain(*seq_idx_groups)))
+    SHARED_GROUNDTRUTH = load_groundtruth(all_seq_idx)
+    assert(SHARED_GROUNDTRUTH is not None), "Ground truth not found."
+
+    tasks = [(run_folder, seq_idx_to_eval) for seq_idx_to_eval in seq_idx_groups for run_folder in run_folders]
+    try:
+        if num_processes > 1 and len(tasks) > 1:
+            pool = multiprocessing.Pool(min(num_processes, len(tasks)))
+            results = pool.map(evaluate_run, tasks)
+            pool.close()
+            pool.join()
+        else:
+            results = map(evaluate_run, tasks)
+    finally:
+        SHARED_GROUNDTRUTH = None
+
+    metrics_by_group = np.empty((len(seq_idx_groups), len(run_folders), N_METRICS))
+    output_by_group = [[None for run_folder in run_folders] for seq_idx_to_eval in seq_idx_groups]
+    for (task_idx, (metrics, output)) in enumerate(results):
+        (group_idx, run_idx) = divmod(task_idx, len(run_folders))
+        metrics_by_group[group_idx, run_idx] = metrics
+        output_by_group[group_idx][run_idx] = output
+    return (metrics_by_group, output_by_group)
+
+def eval_results(all_run_results, seq_idx_to_eval, info_by_run=None, evaluated_runs=None):
     """
     Inputs:
     - seq_idx_to_eval: a list of sequence indices to evaluate
@@ -883,6 +926,8 @@ def eval_results(all_run_results, seq_idx_to_eval, info_by_run=None):
     - info_by_run: a list of length equal to the number of runs, where each element is a list containing
         info from that run (all should be the same length and have the same type of info) if available.
         If not available, this will be None
+    - evaluated_runs: (metrics, output) of every run in get_run_folders(all_run_results) on
+        seq_idx_to_eval if already computed by evaluate_runs, or None to evaluate them here
 
     Output:
     - number_of_runs: the number of runs evaluated over
@@ -895,26 +940,24 @@ def eval_results(all_run_results, seq_idx_to_eval, info_by_run=None):
     print "info_by_run:"
     print info_by_run
 
-    all_runs_metrics = None
-
-    number_of_runs = 0
-    for cur_run_results in glob.iglob(all_run_results + "/*"): # + operator used for string concatenation!
-        if os.path.isdir(cur_run_results):
-            cur_run_metrics = evaluate(cur_run_results + "/", seq_idx_to_eval) # + operator used for string concatenation!
-            orig_metrics_len = len(cur_run_metrics)
-            #append run info, if given, to evaluation metrics
-            if info_by_run:
-                cur_run_metrics.resize(len(cur_run_metrics) + len(info_by_run[0]))
-                for info_idx in range(len(info_by_run[0])):
-                    assert(len(info_by_run[0]) == len(info_by_run[number_of_runs]))
-                    assert(number_of_runs < len(info_by_run)), number_of_runs
-                    cur_run_metrics[orig_metrics_len + info_idx] = info_by_run[number_of_runs][info_idx]
-            cur_run_metrics = np.expand_dims(cur_run_metrics, axis=0)
-            if all_runs_metrics == None:
-                all_runs_metrics = cur_run_metrics
-            else:
-                all_runs_metrics = np.concatenate((all_runs_metrics, cur_run_metrics), axis=0)
-            number_of_runs+=1
+    if evaluated_runs is None:
+        (metrics_by_group, output_by_group) = evaluate_runs(get_run_folders(all_run_results), [seq_idx_to_eval])
+        evaluated_runs = (metrics_by_group[0], output_by_group[0])
+    (runs_metrics, runs_output) = evaluated_runs
+    number_of_runs = len(runs_metrics)
+    for output in runs_output:
+        sys.stdout.write(output)
+
+    #append run info, if given, to evaluation metrics
+    info_len = 0
+    if info_by_run:
+        info_len = len(info_by_run[0])
+        assert(number_of_runs <= len(info_by_run)), number_of_runs
+    all_runs_metrics = np.empty((number_of_runs, N_METRICS + info_len))
+    all_runs_metrics[:, :N_METRICS] = runs_metrics
+    for run_idx in range(number_of_runs if info_len else 0):
+        assert(len(info_by_run[run_idx]) == info_len)
+        all_runs_metrics[run_idx, N_METRICS:] = info_by_run[run_idx]
 
     metric_medians = np.median(all_runs_metrics, axis=0)
     metric_means = np.mean(all_runs_metrics, axis=0)
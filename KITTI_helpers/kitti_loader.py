@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Columnar loader for KITTI tracking label and detection files, shared by the trackingEvaluation
+classes in learn_params1 and jdk_helper_evaluate_results.
+
+A sequence file is read into one structured array with a row per object, sorted by frame, and
+per frame offsets into it (CSR style): the objects of frame f are objects[frame_offsets[f]:frame_offsets[f+1]].
+Objects (tData) are only created when a frame is accessed through FrameObjects.
+"""
+import numpy as np
+
+#KITTI tracking benchmark data format, one object per line:
+#(frame,tracklet_id,objectType,truncation,occlusion,alpha,x1,y1,x2,y2,h,w,l,X,Y,Z,ry[,score])
+KITTI_FIELD_COUNT = 17
+
+#attributes of tData set from the columns of the same name
+OBJECT_FIELDS = ['frame', 'track_id', 'obj_type', 'truncation', 'occlusion', 'obs_angle', 'x1', 'y1', 'x2', 'y2', \
+                 'h', 'w', 'l', 'X', 'Y', 'Z', 'yaw', 'score']
+
+OBJECT_DTYPE = np.dtype([('frame', np.int64), ('track_id', np.int64), ('obj_type', 'S32'), ('truncation', float), \
+                         ('occlusion', np.int64), ('obs_angle', float), ('x1', float), ('y1', float), ('x2', float), \
+                         ('y2', float), ('h', float), ('w', float), ('l', float), ('X', float), ('Y', float), \
+                         ('Z', float), ('yaw', float), ('score', float), ('line', np.int64)])
+
+#score of ground truth objects (the tData default) and of detections without a score
+NO_SCORE_GT = -1000
+NO_SCORE_DETECTION = -1
+
+def get_load_classes(cls):
+    """
+    Output:
+    - classes: object types loaded when evaluating cls (ignored neighboring classes and dontcare),
+        an object is loaded if any of these is a substring of its type
+    """
+    if "car" in cls.lower():
+        classes = ["car","van"]
+    elif "pedestrian" in cls.lower():
+        classes = ["pedestrian","person_sitting"]
+    else:
+        classes = [cls.lower()]
+    return classes + ["dontcare"]
+
+def read_kitti_rows(filename, classes, has_scores):
+    """
+    Parse the lines of a KITTI file whose object type matches classes
+
+    Inputs:
+    - filename: KITTI format .txt file
+    - classes: list of object types from get_load_classes
+    - has_scores: if True, column 17 is the detection score (NO_SCORE_DETECTION if missing),
+        else scores are NO_SCORE_GT
+
+    Outputs:
+    - objects: structured array of OBJECT_DTYPE in file order, 'line' is the line index in the file
+    - field_counts: array, field_counts[i] is the number of fields on the line of objects[i]
+    - line_count: number of lines in the file
+    """
+    with open(filename, "r") as f:
+        lines = f.read().split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    lines = [line.strip() for line in lines]
+    line_field_counts = np.array([line.count(" ") + 1 for line in lines], dtype=np.int64)
+
+    groups = []
+    for field_count in np.unique(line_field_counts):
+        line_indices = np.flatnonzero(line_field_counts == field_count)
+        table = np.array(" ".join([lines[line_idx] for line_idx in line_indices]).split(" ")).reshape(len(line_indices), field_count)
+        obj_types = np.char.lower(table[:, 2])
+        (unique_types, type_indices) = np.unique(obj_types, return_inverse=True)
+        type_loaded = np.array([any([s for s in classes if s in obj_type]) for obj_type in unique_types], dtype=bool)
+        loaded = type_loaded[type_indices]
+        table = table[loaded]
+
+        group = np.zeros(len(table), dtype=OBJECT_DTYPE)
+        group['line'] = line_indices[loaded]
+        group['obj_type'] = obj_types[loaded]
+        for (column, name) in enumerate(OBJECT_FIELDS[:KITTI_FIELD_COUNT]):
+            if name == 'obj_type':
+                continue
+            elif OBJECT_DTYPE[name] == np.int64:
+                #int(float(field))
+                group[name] = table[:, column].astype(float).astype(np.int64)
+            else:
+                group[name] = table[:, column].astype(float)
+        if not has_scores:
+            group['score'] = NO_SCORE_GT
+        elif field_count > KITTI_FIELD_COUNT:
+            group['score'] = table[:, KITTI_FIELD_COUNT].astype(float)
+        else:
+            group['score'] = NO_SCORE_DETECTION
+        groups.append((group, np.repeat(field_count, len(group))))
+
+    if len(groups) == 0:
+        return (np.zeros(0, dtype=OBJECT_DTYPE), np.zeros(0, dtype=np.int64), len(lines))
+    objects = np.concatenate([group for (group, group_field_counts) in groups])
+    field_counts = np.concatenate([group_field_counts for (group, group_field_counts) in groups])
+    file_order = np.argsort(objects['line'], kind='mergesort')
+    return (objects[file_order], field_counts[file_order], len(lines))
+
+def get_frame_count(frames, n_frames):
+    """
+    Number of frames, extended like the per frame lists of the original line by line loader
+    when a frame beyond the sequence length from the seqmap occurs
+
+    Inputs:
+    - frames: array of frame indices in file order
+    - n_frames: number of frames in the sequence from the seqmap
+
+    Output:
+    - frame_count: n_frames, extended by max(500, frame - frame_count) for every frame >= frame_count
+    """
+    frame_count = n_frames
+    for frame in frames[frames >= n_frames].tolist():
+        if frame >= frame_count:
+            print "extend f_data", frame, frame_count
+            frame_count += max(500, frame - frame_count)
+            if frame >= frame_count:
+                print frame_count, frame
+                raise IndexError("list index out of range")
+    return frame_count
+
+class KittiSequence(object):
+    """
+    Objects of one sequence file in columnar form
+
+    - objects: structured array of OBJECT_DTYPE sorted by frame, objects of the same frame in file order
+    - frame_offsets: array of length frame_count+1, objects of frame f are objects[frame_offsets[f]:frame_offsets[f+1]]
+    - line_count: number of lines in the file
+    """
+    def __init__(self, objects, frame_count, line_count):
+        frame_order = np.argsort(objects['frame'], kind='mergesort')
+        self.objects = objects[frame_order]
+        self.frame_offsets = get_frame_offsets(self.objects['frame'], frame_count)
+        self.line_count = line_count
+
+    def get_trajectory_count(self):
+        """
+        Output:
+        - trajectory_count: number of distinct track ids of objects that are not dontcare
+        """
+        return len(np.unique(self.objects['track_id'][self.objects['obj_type'] != "dontcare"]))
+
+    def get_duplicate_id(self):
+        """
+        Output:
+        - id_frame: (frame, track id) of the first object in file order whose track id already
+            occured in its frame, or None if track ids are unique within every frame
+        """
+        id_frames = zip(self.objects['frame'].tolist(), self.objects['track_id'].tolist())
+        if len(set(id_frames)) == len(id_frames):
+            return None
+        id_frame_cache = set()
+        for object_idx in np.argsort(self.objects['line'], kind='mergesort'):
+            if id_frames[object_idx] in id_frame_cache:
+                return id_frames[object_idx]
+            id_frame_cache.add(id_frames[object_idx])
+
+    def has_2d_boxes(self):
+        return not np.any((self.objects['x1'] == -1) | (self.objects['x2'] == -1) | \
+                          (self.objects['y1'] == -1) | (self.objects['y2'] == -1))
+
+    def has_3d_positions(self):
+        return not np.any((self.objects['X'] == -1000) | (self.objects['Y'] == -1000) | (self.objects['Z'] == -1000))
+
+    def get_frames(self, object_class, mask=None):
+        """
+        Inputs:
+        - object_class: class of the objects to create, e.g. tData
+        - mask: boolean array over self.objects selecting the objects to include, or None for all
+
+        Output:
+        - frames: FrameObjects of the (selected) objects
+        """
+        if mask is None:
+            return FrameObjects(self.objects, self.frame_offsets, object_class)
+        objects = self.objects[mask]
+        return FrameObjects(objects, get_frame_offsets(objects['frame'], len(self.frame_offsets) - 1), object_class)
+
+def get_frame_offsets(frames, frame_count):
+    """
+    Inputs:
+    - frames: sorted array of frame indices
+    - frame_count: number of frames
+
+    Output:
+    - frame_offsets: array of length frame_count+1, frames[frame_offsets[f]:frame_offsets[f+1]] == f
+    """
+    return np.searchsorted(frames, np.arange(frame_count + 1))
+
+class FrameObjects(object):
+    """
+    List like sequence of frames, frames[f] is the list of objects in frame f (negative indices and
+    slices work like they do for a list).  The objects of a frame are created the first time it is
+    accessed and the same list is returned afterwards, so attributes set on the objects (e.g. by
+    compute3rdPartyMetrics) persist.
+    """
+    def __init__(self, objects, frame_offsets, object_class):
+        self.objects = objects
+        self.frame_offsets = frame_offsets
+        self.object_class = object_class
+        self.frames = [None for f in xrange(len(frame_offsets) - 1)]
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, f):
+        if isinstance(f, slice):
+            return [self[frame] for frame in xrange(*f.indices(len(self)))]
+        if not isinstance(f, (int, long, np.integer)):
+            raise TypeError("frame indices must be integers or slices, not %s" % type(f).__name__)
+        if f < 0:
+            f += len(self)
+        if f < 0 or f >= len(self):
+            raise IndexError("frame index out of range")
+        if self.frames[f] is None:
+            self.frames[f] = self.create_frame_objects(f)
+        return self.frames[f]
+
+    def create_frame_objects(self, f):
+        """
+        Output:
+        - frame_objects: list of new objects of class object_class, one per object in frame f
+        """
+        frame_objects = []
+        for row in self.objects[self.frame_offsets[f]:self.frame_offsets[f+1]].tolist():
+            cur_object = self.object_class()
+            cur_object.__dict__.update(zip(OBJECT_FIELDS, row))
+            frame_objects.append(cur_object)
+        return frame_objects
+
+    def __iter__(self):
+        for f in xrange(len(self)):
+            yield self[f]
+
+def load_kitti_sequence(filename, cls, n_frames, has_scores, cutoff_score=None, first_fake_track_id=None):
+    """
+    Load a KITTI label or detection file
+
+    Inputs:
+    - filename: KITTI format .txt file
+    - cls: class to evaluate, see get_load_classes
+    - n_frames: number of frames in the sequence
+    - has_scores: True for tracker or detection files, False for ground truth
+    - cutoff_score: if not None, drop detections with a score <= cutoff_score
+    - first_fake_track_id: if not None, the object on line i (from 0) of the file gets track id
+        first_fake_track_id + i instead of the track id in the file
+
+    Output:
+    - sequence: KittiSequence of the loaded objects without objects marked as invalid (track id -1),
+        or None if has_scores and a line of a loaded object does not have 17 or 18 fields
+    """
+    (objects, field_counts, line_count) = read_kitti_rows(filename, get_load_classes(cls), has_scores)
+    if has_scores:
+        if np.any((field_counts != KITTI_FIELD_COUNT) & (field_counts != KITTI_FIELD_COUNT + 1)):
+            return None
+        if cutoff_score is not None:
+            objects = objects[(field_counts == KITTI_FIELD_COUNT) | (objects['score'] > cutoff_score)]
+    if first_fake_track_id is not None:
+        objects['track_id'] = first_fake_track_id + objects['line']
+    # do not consider objects marked as invalid
+    objects = objects[(objects['track_id'] != -1) | (objects['obj_type'] == "dontcare")]
+    return KittiSequence(objects, get_frame_count(objects['frame'], n_frames), line_count)
@@ -14,18 +14,28 @@ from collections import defaultdict
 #    from collections import OrderedDict # only included from python 2.7 on
 
 import mailpy
+import kitti_loader
+from kitti_loader import load_kitti_sequence
+from array_cache import get_cache_key
+from array_cache import load_arrays
+from array_cache import save_arrays
 #from learn_Q import run_EM_on_Q_multiple_targets
 #from learn_Q import Target
 #from learn_Q import default_time_step
-import pickle
 
 LEARN_Q_FROM_ALL_GT = False
 SKIP_LEARNING_Q = True
 
-#load ground truth data and detection data, when available, from saved pickle file
-#to cut down on load time
-USE_PICKLED_DATA = True
-PICKELD_DATA_DIRECTORY = "./KITTI_helpers/learn_params1_pickled_data"
+#load ground truth data and detection data, when available, from the cache of arrays saved by
+#evaluate for the same label files, detection files, parameters and code, to cut down on load time
+USE_CACHED_DATA = True
+#data files and the cache are found relative to this file, not the working directory
+KITTI_HELPERS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+CACHED_DATA_DIRECTORY = os.path.join(KITTI_HELPERS_DIRECTORY, "learn_params1_cached_data")
+
+#gtObject and detObject constructor arguments stored in the cache, in order
+GT_OBJECT_FIELDS = ['x1', 'x2', 'y1', 'y2', 'track_id']
+DET_OBJECT_FIELDS = ['x1', 'x2', 'y1', 'y2', 'assoc', 'score']
 
 CAMERA_PIXEL_WIDTH = 1242
 CAMERA_PIXEL_HEIGHT = 375
@@ -158,7 +168,7 @@ class trackingEvaluation(object):
              missed         - number of missed targets (FN)
     """
 
-    def __init__(self, cutoff_score, det_method, gt_path="./KITTI_helpers/data/training_ground_truth", min_overlap=0.5, max_truncation = 0.15, mail=None, cls="car"):
+    def __init__(self, cutoff_score, det_method, gt_path=os.path.join(KITTI_HELPERS_DIRECTORY, "data/training_ground_truth"), min_overlap=0.5, max_truncation = 0.15, mail=None, cls="car"):
         #jdk parameters to learn
         self.cutoff_score = cutoff_score
         self.clutter_count_list = []
@@ -206,10 +216,10 @@ class trackingEvaluation(object):
         # get number of sequences and
         # get number of frames per sequence from test mapping
         # (created while extracting the benchmark)
-        filename_test_mapping = "./KITTI_helpers/data/evaluate_tracking.seqmap"
+        self.filename_test_mapping = os.path.join(KITTI_HELPERS_DIRECTORY, "data/evaluate_tracking.seqmap")
         self.n_frames         = []
         self.sequence_name    = []
-        with open(filename_test_mapping, "r") as fh:
+        with open(self.filename_test_mapping, "r") as fh:
             for i,l in enumerate(fh):
                 fields = l.split(" ")
                 self.sequence_name.append("%04d" % int(fields[0]))
@@ -227,7 +237,7 @@ class trackingEvaluation(object):
         self.gt_path           = os.path.join(gt_path, "label_02")
 
         self.det_method = det_method
-        self.t_path            = os.path.join("./KITTI_helpers/data/object_detections", self.det_method, "training/det_02")
+        self.t_path            = os.path.join(KITTI_HELPERS_DIRECTORY, "data/object_detections", self.det_method, "training/det_02")
         self.n_gt              = 0
         self.n_gt_trajectories = 0
         self.n_gt_seq          = []
@@ -274,6 +284,20 @@ class trackingEvaluation(object):
             os.makedirs(self.eval_dir)
             print "done"
 
+    def get_input_filenames(self):
+        """
+        Output:
+        - filenames: the files evaluate's results depend on: the seqmap, ground truth and detection files
+            of every sequence, and the source files of the evaluation code
+        """
+        filenames = [self.filename_test_mapping]
+        for s_name in self.sequence_name:
+            filenames.append(os.path.join(self.gt_path, "%s.txt" % s_name))
+            filenames.append(os.path.join(self.t_path, "%s.txt" % s_name))
+        for module_file in [__file__, kitti_loader.__file__]:
+            filenames.append(os.path.splitext(os.path.abspath(module_file))[0] + ".py")
+        return filenames
+
     def loadGroundtruth(self, include_dontcare_in_gt):
         """Helper function to load ground truth"""
         try:
@@ -297,9 +321,6 @@ class trackingEvaluation(object):
             Use loadGroundtruth() or loadDetections() to load this data.
             Loads detections in KITTI format from textfiles.
         """
-        # construct objectDetections object to hold detection data
-        t_data  = tData()
-        data    = []
         eval_2d = True
         eval_3d = True
 
@@ -308,107 +329,30 @@ class trackingEvaluation(object):
         n_trajectories_seq = []
 
         if not loading_groundtruth:
-            fake_track_id = 0 #we'll assign a unique id to every detected object
+            fake_track_id = 1 #we'll assign a unique id to every detected object, the number of its line in all files
 
         for seq, s_name in enumerate(self.sequence_name):
-            i              = 0
             filename       = os.path.join(root_dir, "%s.txt" % s_name)
-            f              = open(filename, "r") 
-
-            f_data         = [[] for x in xrange(self.n_frames[seq])] # current set has only 1059 entries, sufficient length is checked anyway
-            ids            = []
-            n_in_seq       = 0
-            id_frame_cache = []
-            for line in f:
-                if not loading_groundtruth:
-                    fake_track_id += 1
-                # KITTI tracking benchmark data format:
-                # (frame,tracklet_id,objectType,truncation,occlusion,alpha,x1,y1,x2,y2,h,w,l,X,Y,Z,ry)
-                line = line.strip()
-                fields            = line.split(" ")
-                # classes that should be loaded (ignored neighboring classes)
-                if "car" in cls.lower():
-                    classes = ["car","van"]
-                elif "pedestrian" in cls.lower():
-                    classes = ["pedestrian","person_sitting"]
-                else:
-                    classes = [cls.lower()]
-                classes += ["dontcare"]
-                if not any([s for s in classes if s in fields[2].lower()]):
-                    continue
-                # get fields from table
-                t_data.frame        = int(float(fields[0]))     # frame
-                if loading_groundtruth:
-                    t_data.track_id     = int(float(fields[1]))     # id
-                else: 
-                    t_data.track_id = fake_track_id
-                t_data.obj_type     = fields[2].lower()         # object type [car, pedestrian, cyclist, ...]
-                t_data.truncation   = float(fields[3])          # truncation [0..1]
-                t_data.occlusion    = int(float(fields[4]))     # occlusion  [0,1,2]
-                t_data.obs_angle    = float(fields[5])          # observation angle [rad]
-                t_data.x1           = float(fields[6])          # left   [px]
-                t_data.y1           = float(fields[7])          # top    [px]
-                t_data.x2           = float(fields[8])          # right  [px]
-                t_data.y2           = float(fields[9])          # bottom [px]
-                t_data.h            = float(fields[10])         # height [m]
-                t_data.w            = float(fields[11])         # width  [m]
-                t_data.l            = float(fields[12])         # length [m]
-                t_data.X            = float(fields[13])         # X [m]
-                t_data.Y            = float(fields[14])         # Y [m]
-                t_data.Z            = float(fields[15])         # Z [m]
-                t_data.yaw          = float(fields[16])         # yaw angle [rad]
-                if not loading_groundtruth:
-                    if len(fields) == 17:
-                        t_data.score = -1
-                    elif len(fields) == 18:
-                        t_data.score  = float(fields[17])     # detection score
-                        if t_data.score <= self.cutoff_score:
-                            continue
-                    else:
-                        self.mail.msg("file is not in KITTI format")
-                        return
-
-                # do not consider objects marked as invalid
-                if t_data.track_id is -1 and t_data.obj_type != "dontcare":
-                    continue
-
-                idx = t_data.frame
-                # check if length for frame data is sufficient
-                if idx >= len(f_data):
-                    print "extend f_data", idx, len(f_data)
-                    f_data += [[] for x in xrange(max(500, idx-len(f_data)))]
-                try:
-                    id_frame = (t_data.frame,t_data.track_id)
-                    if id_frame in id_frame_cache and not loading_groundtruth:
-                        self.mail.msg("track ids are not unique for sequence %d: frame %d" % (seq,t_data.frame))
-                        self.mail.msg("track id %d occured at least twice for this frame" % t_data.track_id)
-                        self.mail.msg("Exiting...")
-                        #continue # this allows to evaluate non-unique result files
-                        return False
-                    id_frame_cache.append(id_frame)
-                    f_data[t_data.frame].append(copy.copy(t_data))
-                except:
-                    print len(f_data), idx
-                    raise
-
-                if t_data.track_id not in ids and t_data.obj_type!="dontcare":
-                    ids.append(t_data.track_id)
-                    n_trajectories +=1
-                    n_in_seq +=1
-
+            if loading_groundtruth:
+                sequence   = load_kitti_sequence(filename, cls, self.n_frames[seq], has_scores=False)
+            else:
+                sequence   = load_kitti_sequence(filename, cls, self.n_frames[seq], has_scores=True, \
+                                                 cutoff_score=self.cutoff_score, first_fake_track_id=fake_track_id)
+                if sequence is None:
+                    self.mail.msg("file is not in KITTI format")
+                    return
+                fake_track_id += sequence.line_count
                 # check if uploaded data provides information for 2D and 3D evaluation
-                if not loading_groundtruth and eval_2d is True and(t_data.x1==-1 or t_data.x2==-1 or t_data.y1==-1 or t_data.y2==-1):
-                    eval_2d = False
-                if not loading_groundtruth and eval_3d is True and(t_data.X==-1000 or t_data.Y==-1000 or t_data.Z==-1000):
-                    eval_3d = False
+                eval_2d = eval_2d and sequence.has_2d_boxes()
+                eval_3d = eval_3d and sequence.has_3d_positions()
 
-            # only add existing frames
+            n_in_seq = sequence.get_trajectory_count()
+            n_trajectories += n_in_seq
             n_trajectories_seq.append(n_in_seq)
-            seq_data.append(f_data)
-            f.close()
+            seq_data.append(sequence)
 
         if not loading_groundtruth:
-            self.tracker=seq_data
+            self.tracker=[sequence.get_frames(tData) for sequence in seq_data]
             self.n_tr_trajectories=n_trajectories
             self.eval_2d = eval_2d
             self.eval_3d = eval_3d
@@ -419,24 +363,13 @@ class trackingEvaluation(object):
             # split ground truth and DontCare areas
             self.dcareas     = []
             self.groundtruth = []
-            for seq_idx in range(len(seq_data)):
-                seq_gt = seq_data[seq_idx]
-                s_g, s_dc = [],[]
-                for f in range(len(seq_gt)):
-                    all_gt = seq_gt[f]
-                    g,dc = [],[]
-                    for gg in all_gt:
-                        if include_dontcare_in_gt:
-                            g.append(gg)
-                        else:
-                            if gg.obj_type=="dontcare":
-                                dc.append(gg)
-                            else:
-                                g.append(gg)
-                    s_g.append(g)
-                    s_dc.append(dc)
-                self.dcareas.append(s_dc)
-                self.groundtruth.append(s_g)
+            for sequence in seq_data:
+                if include_dontcare_in_gt:
+                    is_dontcare = np.zeros(len(sequence.objects), dtype=bool)
+                else:
+                    is_dontcare = sequence.objects['obj_type'] == "dontcare"
+                self.dcareas.append(sequence.get_frames(tData, is_dontcare))
+                self.groundtruth.append(sequence.get_frames(tData, ~is_dontcare))
             self.n_gt_seq=n_trajectories_seq
             self.n_gt_trajectories=n_trajectories
         return True
@@ -1046,25 +979,21 @@ def evaluate(min_score, det_method,mail,obj_class = "car", include_ignored_gt =
 
     """
     # start evaluation and instanciated eval object
+    e = trackingEvaluation(min_score, det_method=det_method, mail=mail,cls=obj_class)
 
-    if USE_PICKLED_DATA:
-        if not os.path.exists(PICKELD_DATA_DIRECTORY):
-            os.makedirs(PICKELD_DATA_DIRECTORY)
-
-        data_filename = PICKELD_DATA_DIRECTORY + "/min_score_%f_det_method_%s_obj_class_%s_include_ignored_gt_%s_include_dontcare_gt_%s_include_ignored_det_%s.pickle" % \
-                                                 (min_score, det_method, obj_class, include_ignored_gt, include_dontcare_in_gt, include_ignored_detections)
-
-        if os.path.isfile(data_filename): 
-            f = open(data_filename, 'r')
-            (gt_objects, det_objects) = pickle.load(f)
-            f.close()
+    if USE_CACHED_DATA:
+        cache_key = get_cache_key(e.get_input_filenames(), (min_score, det_method, obj_class, include_ignored_gt, \
+                                                            include_dontcare_in_gt, include_ignored_detections))
+        arrays = load_arrays(CACHED_DATA_DIRECTORY, cache_key)
+        if arrays is not None:
+            gt_objects = arrays_to_objects(arrays, 'gt_', GT_OBJECT_FIELDS, gtObject)
+            det_objects = arrays_to_objects(arrays, 'det_', DET_OBJECT_FIELDS, detObject)
             return (gt_objects, det_objects)
 
 
     mail.msg("Processing Result for KITTI Tracking Benchmark")
     classes = []
     assert(obj_class == "car" or obj_class == "pedestrian")
-    e = trackingEvaluation(min_score, det_method=det_method, mail=mail,cls=obj_class)
     # load tracker data and check provided classes
     e.loadDetections()
     mail.msg("Evaluate Object Class: %s" % obj_class.upper())
@@ -1092,10 +1021,10 @@ def evaluate(min_score, det_method,mail,obj_class = "car", include_ignored_gt =
 
     (gt_objects, det_objects) = e.compute3rdPartyMetrics(include_ignored_gt, include_dontcare_in_gt, include_ignored_detections)
 
-    if USE_PICKLED_DATA:
-        f = open(data_filename, 'w')
-        pickle.dump((gt_objects, det_objects), f)
-        f.close()  
+    if USE_CACHED_DATA:
+        arrays = objects_to_arrays(gt_objects, 'gt_', GT_OBJECT_FIELDS)
+        arrays.update(objects_to_arrays(det_objects, 'det_', DET_OBJECT_FIELDS))
+        save_arrays(CACHED_DATA_DIRECTORY, cache_key, arrays)
 
     # finish
     if len(classes)==0:
@@ -1110,6 +1039,60 @@ def evaluate(min_score, det_method,mail,obj_class = "car", include_ignored_gt =
 
 
 
+def objects_to_arrays(objects, prefix, fields):
+    """
+    Inputs:
+    - objects: objects[i][j] is a list of objects in the jth frame of the ith sequence, e.g. gt_objects
+    - prefix: prefix of the array names
+    - fields: attributes of the objects to store
+
+    Output:
+    - arrays: dictionary of arrays, named (after prefix):
+        'frame_counts'[i] is the number of frames in sequence i,
+        'object_counts'[k] is the number of objects in frame k of all sequences concatenated,
+        field[n] is the attribute field of object n of all frames concatenated, for every field in fields
+    """
+    frames = [frame for seq_objects in objects for frame in seq_objects]
+    all_objects = [cur_object for frame in frames for cur_object in frame]
+    arrays = {prefix + 'frame_counts': np.array([len(seq_objects) for seq_objects in objects], dtype=np.int64),
+              prefix + 'object_counts': np.array([len(frame) for frame in frames], dtype=np.int64)}
+    for field in fields:
+        arrays[prefix + field] = np.array([getattr(cur_object, field) for cur_object in all_objects])
+    return arrays
+
+class CachedFrameObjects(kitti_loader.FrameObjects):
+    """
+    Frames of one sequence from the arrays of objects_to_arrays, see kitti_loader.FrameObjects.  The
+    objects of a frame are created from its slice of the (memory mapped) field arrays when the frame
+    is first accessed.  objects is a list of the field arrays, objects[k][n] is constructor argument k
+    of object n of the sequence.
+    """
+    def create_frame_objects(self, f):
+        (first, last) = (self.frame_offsets[f], self.frame_offsets[f+1])
+        return [self.object_class(*args) for args in zip(*[field_array[first:last].tolist() for field_array in self.objects])]
+
+def arrays_to_objects(arrays, prefix, fields, object_class):
+    """
+    Inverse of objects_to_arrays
+
+    Inputs:
+    - arrays: dictionary of arrays from objects_to_arrays
+    - prefix, fields: as passed to objects_to_arrays
+    - object_class: class of the objects, constructed with the fields as arguments in order
+
+    Output:
+    - objects: objects[i][j] is a list of objects in the jth frame of the ith sequence, objects[i] is
+        a CachedFrameObjects that creates the objects of a frame when it is first accessed
+    """
+    field_arrays = [arrays[prefix + field] for field in fields]
+    object_offsets = np.concatenate(([0], np.cumsum(arrays[prefix + 'object_counts'])))
+    frame_offsets = np.concatenate(([0], np.cumsum(arrays[prefix + 'frame_counts']))).tolist()
+    objects = []
+    for seq_idx in range(len(frame_offsets) - 1):
+        objects.append(CachedFrameObjects(field_arrays, object_offsets[frame_offsets[seq_idx]:frame_offsets[seq_idx + 1] + 1], \
+                                          object_class))
+    return objects
+
 def get_clutter_probabilities(det_objects):
     """
     Input:
@@ -1973,6 +1956,42 @@ class Measurement:
         #list of scores for each individual measurement
         self.scores = []
         self.time = time
+        #numpy arrays with the score interval index, target emission probability, and measurement
+        #noise covariance of each individual measurement, see set_score_parameters
+        self.score_indices = None
+        self.emission_probs = None
+        self.meas_noise_covs = None
+        #(score_intervals, target_emission_probs, meas_noise_covs) the parameters above were gathered from
+        self.score_parameter_tables = None
+
+def get_score_indices(score_intervals, scores):
+    """
+    Input:
+    - score_intervals: a sorted list specifying detection score ranges for which parameters have been specified
+    - scores: a list of detection scores
+
+    Output:
+    - score_indices: numpy array of ints, score_indices[i] is the 0 indexed score interval scores[i] falls into,
+        score_intervals[score_indices[i]] < scores[i] <= score_intervals[score_indices[i] + 1]
+    """
+    score_indices = np.searchsorted(score_intervals, np.asarray(scores, dtype=float), side='left') - 1
+    assert((score_indices >= 0).all()), (scores, score_intervals)
+    return score_indices
+
+def set_score_parameters(measurement, score_intervals, target_emission_probs, meas_noise_covs):
+    """
+    Find the score interval of every detection in measurement once and gather the parameters of
+    each detection's score interval
+
+    Input:
+    - measurement: Measurement
+    - target_emission_probs: target_emission_probs[i] is the target emission probability for score_intervals[i]
+    - meas_noise_covs: meas_noise_covs[i] is the measurement noise covariance matrix for score_intervals[i]
+    """
+    measurement.score_indices = get_score_indices(score_intervals, measurement.scores)
+    measurement.emission_probs = np.asarray(target_emission_probs, dtype=float)[measurement.score_indices]
+    measurement.meas_noise_covs = np.asarray(meas_noise_covs, dtype=float).reshape(-1, 2, 2)[measurement.score_indices]
+    measurement.score_parameter_tables = (score_intervals, target_emission_probs, meas_noise_covs)
 
 def doctor_clutter_probabilities(all_clutter_probabilities):
     for i in range(len(all_clutter_probabilities)):
@@ -1981,21 +2000,15 @@ def doctor_clutter_probabilities(all_clutter_probabilities):
         all_clutter_probabilities[i] += [.0000001/20, .0000001/20, .0000001/20, .0000001/20, .0000001/20, .0000001/20, .0000001/20, .0000001/20, .0000001/20, .0000001/20, .0000001/20, .0000001/20, .0000001/20, .0000001/20, .0000001/20, .0000001/20, .0000001/20, .0000001/20, .0000001/20, .0000001/20]
 
 
-def get_meas_target_set(training_sequences, score_intervals, det_method="lsvm", obj_class="car", doctor_clutter_probs=True, doctor_birth_probs=True,\
-    print_info=False, include_ignored_gt = False, include_dontcare_in_gt = False, include_ignored_detections = True):
+def get_measurement_target_sets(det_objects):
     """
     Input:
-    - doctor_clutter_probs: if True, add extend clutter probability list with 20 values of .0000001/20
-        and subtract .0000001 from element 0
-    - doctor_birth_probs: if True then if any birth probability is 0 subtract .0000001 from element 0
-        of its score interval's birth probability list and replacing zero elements with .0000001/(number of
-        zero elements in the score interval's birth probability list)
-    """
-    mail = mailpy.Mail("")
-
-    (gt_objects, det_objects) = evaluate(score_intervals[0], det_method,mail, obj_class="car", include_ignored_gt=include_ignored_gt,\
-        include_dontcare_in_gt=include_dontcare_in_gt, include_ignored_detections=include_ignored_detections)
+    - det_objects: det_objects[i][j] is a list of all detected objects in the jth frame of the ith video sequence
 
+    Output:
+    - measurementTargetSetsBySequence: measurementTargetSetsBySequence[i] is a TargetSet of the detections
+        of sequence i, sorted by score within each frame
+    """
     measurementTargetSetsBySequence = []
 
     for seq_idx in range(len(det_objects)):
@@ -2026,7 +2039,61 @@ def get_meas_target_set(training_sequences, score_intervals, det_method="lsvm",
             cur_seq_meas_target_set.measurements.append(cur_frame_measurements)
 
 
-        measurementTargetSetsBySequence.append(cur_seq_meas_target_set)     
+        measurementTargetSetsBySequence.append(cur_seq_meas_target_set)
+    return measurementTargetSetsBySequence
+
+def load_detections(min_score, det_method, obj_class="car", include_ignored_gt=False, include_dontcare_in_gt=False, \
+    include_ignored_detections=True):
+    """
+    Load the ground truth and detections of every sequence once, so that parameters can be learned
+    from different training sequences without calling evaluate again
+
+    Output:
+    - loaded_detections: dictionary with
+        'arrays': the ground truth and detection objects evaluate returns, stored by objects_to_arrays.
+            Learning parameters stores associations in the ground truth objects, so get_evaluated_objects
+            creates new objects from the arrays for each use
+        'measurement_target_sets': see get_measurement_target_sets
+    """
+    mail = mailpy.Mail("")
+    (gt_objects, det_objects) = evaluate(min_score, det_method, mail, obj_class=obj_class, include_ignored_gt=include_ignored_gt,\
+        include_dontcare_in_gt=include_dontcare_in_gt, include_ignored_detections=include_ignored_detections)
+    arrays = objects_to_arrays(gt_objects, 'gt_', GT_OBJECT_FIELDS)
+    arrays.update(objects_to_arrays(det_objects, 'det_', DET_OBJECT_FIELDS))
+    return {'arrays': arrays, 'measurement_target_sets': get_measurement_target_sets(det_objects)}
+
+def get_evaluated_objects(loaded_detections):
+    """
+    Output:
+    - gt_objects, det_objects: new objects of the ground truth and detections in loaded_detections (see
+        load_detections), as evaluate returns them
+    """
+    arrays = loaded_detections['arrays']
+    return (arrays_to_objects(arrays, 'gt_', GT_OBJECT_FIELDS, gtObject), arrays_to_objects(arrays, 'det_', DET_OBJECT_FIELDS, detObject))
+
+
+def get_meas_target_set(training_sequences, score_intervals, det_method="lsvm", obj_class="car", doctor_clutter_probs=True, doctor_birth_probs=True,\
+    print_info=False, include_ignored_gt = False, include_dontcare_in_gt = False, include_ignored_detections = True, \
+    loaded_detections = None):
+    """
+    Input:
+    - doctor_clutter_probs: if True, add extend clutter probability list with 20 values of .0000001/20
+        and subtract .0000001 from element 0
+    - doctor_birth_probs: if True then if any birth probability is 0 subtract .0000001 from element 0
+        of its score interval's birth probability list and replacing zero elements with .0000001/(number of
+        zero elements in the score interval's birth probability list)
+    - loaded_detections: load_detections(score_intervals[0], det_method, ...) to learn the parameters from
+        instead of calling evaluate, or None
+    """
+    if loaded_detections is None:
+        mail = mailpy.Mail("")
+        (gt_objects, det_objects) = evaluate(score_intervals[0], det_method,mail, obj_class="car", include_ignored_gt=include_ignored_gt,\
+            include_dontcare_in_gt=include_dontcare_in_gt, include_ignored_detections=include_ignored_detections)
+        measurementTargetSetsBySequence = get_measurement_target_sets(det_objects)
+    else:
+        (gt_objects, det_objects) = get_evaluated_objects(loaded_detections)
+        measurementTargetSetsBySequence = loaded_detections['measurement_target_sets']
+
 ############################# now get params ###############################
     all_data = AllData(gt_objects, det_objects, training_sequences)
     target_emission_probs = apply_function_on_intervals(score_intervals, all_data.get_prob_target_emission_by_score_range)
@@ -2051,6 +2118,10 @@ def get_meas_target_set(training_sequences, score_intervals, det_method="lsvm",
     for i in range(len(meas_noise_cov_and_mean)):
         meas_noise_covs.append(meas_noise_cov_and_mean[i][0])
 
+    for cur_seq_meas_target_set in measurementTargetSetsBySequence:
+        for cur_frame_measurements in cur_seq_meas_target_set.measurements:
+            set_score_parameters(cur_frame_measurements, score_intervals, target_emission_probs, meas_noise_covs)
+
     if print_info:
         print "get_meas_target_set() info:"
         num_measurements = apply_function_on_intervals(score_intervals, all_data.count_measurements)
@@ -2092,24 +2163,28 @@ def doctor_birth_probabilities(birth_probabilities):
 
 def get_meas_target_sets_lsvm_and_regionlets(training_sequences, regionlets_score_intervals, lsvm_score_intervals, \
     obj_class = "car", doctor_clutter_probs = True, doctor_birth_probs = True, include_ignored_gt = False, \
-    include_dontcare_in_gt = False, include_ignored_detections = True):
+    include_dontcare_in_gt = False, include_ignored_detections = True, loaded_detections = None):
     """
     Input:
     - doctor_clutter_probs: if True, add extend clutter probability list with 20 values of .0000001/20
         and subtract .0000001 from element 0
+    - loaded_detections: loaded_detections[det_method] is load_detections(<det_method>_score_intervals[0], det_method, ...)
+        for det_method 'regionlets' and 'lsvm', to learn the parameters from instead of calling evaluate, or None
     """
 
     print "HELLO#1"
     (measurementTargetSetsBySequence_regionlets, target_emission_probs_regionlets, clutter_probabilities_regionlets, \
         incorrect_birth_probabilities_regionlets, meas_noise_covs_regionlets) = get_meas_target_set(training_sequences, regionlets_score_intervals, \
         "regionlets", obj_class, doctor_clutter_probs=doctor_clutter_probs, doctor_birth_probs=doctor_birth_probs, include_ignored_gt=include_ignored_gt, \
-        include_dontcare_in_gt=include_dontcare_in_gt, include_ignored_detections=include_ignored_detections)
+        include_dontcare_in_gt=include_dontcare_in_gt, include_ignored_detections=include_ignored_detections, \
+        loaded_detections=None if loaded_detections is None else loaded_detections['regionlets'])
     print "HELLO#2"
 
     (measurementTargetSetsBySequence_lsvm, target_emission_probs_lsvm, clutter_probabilities_lsvm, \
         incorrect_birth_probabilities_lsvm, meas_noise_covs_lsvm) = get_meas_target_set(training_sequences, lsvm_score_intervals, \
         "lsvm", obj_class, doctor_clutter_probs=doctor_clutter_probs, doctor_birth_probs=doctor_birth_probs, include_ignored_gt=include_ignored_gt, \
-        include_dontcare_in_gt=include_dontcare_in_gt, include_ignored_detections=include_ignored_detections)
+        include_dontcare_in_gt=include_dontcare_in_gt, include_ignored_detections=include_ignored_detections, \
+        loaded_detections=None if loaded_detections is None else loaded_detections['lsvm'])
     print "HELLO#3"
 
 
@@ -2126,15 +2201,21 @@ def get_meas_target_sets_lsvm_and_regionlets(training_sequences, regionlets_scor
     meas_noise_covs = [meas_noise_covs_regionlets, meas_noise_covs_lsvm]
     print "HELLO#5"
 
-    mail = mailpy.Mail("") #this is silly and could be cleaned up
-    (gt_objects, regionlets_det_objects) = evaluate(min_score=regionlets_score_intervals[0], \
-        det_method='regionlets', mail=mail, obj_class=obj_class, include_ignored_gt=include_ignored_gt,\
-        include_dontcare_in_gt=include_dontcare_in_gt, include_ignored_detections=include_ignored_detections)
+    if loaded_detections is None:
+        mail = mailpy.Mail("") #this is silly and could be cleaned up
+        (gt_objects, regionlets_det_objects) = evaluate(min_score=regionlets_score_intervals[0], \
+            det_method='regionlets', mail=mail, obj_class=obj_class, include_ignored_gt=include_ignored_gt,\
+            include_dontcare_in_gt=include_dontcare_in_gt, include_ignored_detections=include_ignored_detections)
+    else:
+        (gt_objects, regionlets_det_objects) = get_evaluated_objects(loaded_detections['regionlets'])
     print "HELLO#6"
 
-    (gt_objects, lsvm_det_objects) = evaluate(min_score=lsvm_score_intervals[0], \
-        det_method='lsvm', mail=mail, obj_class=obj_class, include_ignored_gt=include_ignored_gt,\
-        include_dontcare_in_gt=include_dontcare_in_gt, include_ignored_detections=include_ignored_detections)
+    if loaded_detections is None:
+        (gt_objects, lsvm_det_objects) = evaluate(min_score=lsvm_score_intervals[0], \
+            det_method='lsvm', mail=mail, obj_class=obj_class, include_ignored_gt=include_ignored_gt,\
+            include_dontcare_in_gt=include_dontcare_in_gt, include_ignored_detections=include_ignored_detections)
+    else:
+        (gt_objects, lsvm_det_objects) = get_evaluated_objects(loaded_detections['lsvm'])
     multi_detections = MultiDetections(gt_objects, regionlets_det_objects, lsvm_det_objects, training_sequences)
     print "HELLO#7"
 
@@ -2159,18 +2240,21 @@ def get_meas_target_sets_lsvm_and_regionlets(training_sequences, regionlets_scor
 
 def get_meas_target_sets_regionlets_general_format(training_sequences, regionlets_score_intervals, \
     obj_class = "car", doctor_clutter_probs = True, doctor_birth_probs = True, include_ignored_gt = False, \
-    include_dontcare_in_gt = False, include_ignored_detections = True):
+    include_dontcare_in_gt = False, include_ignored_detections = True, loaded_detections = None):
     """
     Input:
     - doctor_clutter_probs: if True, add extend clutter probability list with 20 values of .0000001/20
         and subtract .0000001 from element 0
+    - loaded_detections: loaded_detections[det_method] is load_detections(<det_method>_score_intervals[0], det_method, ...)
+        for det_method 'regionlets', to learn the parameters from instead of calling evaluate, or None
     """
 
     print "HELLO#1"
     (measurementTargetSetsBySequence_regionlets, target_emission_probs_regionlets, clutter_probabilities_regionlets, \
         incorrect_birth_probabilities_regionlets, meas_noise_covs_regionlets) = get_meas_target_set(training_sequences, regionlets_score_intervals, \
         "regionlets", obj_class, doctor_clutter_probs=doctor_clutter_probs, doctor_birth_probs=doctor_birth_probs, include_ignored_gt=include_ignored_gt, \
-        include_dontcare_in_gt=include_dontcare_in_gt, include_ignored_detections=include_ignored_detections)
+        include_dontcare_in_gt=include_dontcare_in_gt, include_ignored_detections=include_ignored_detections, \
+        loaded_detections=None if loaded_detections is None else loaded_detections['regionlets'])
     print "HELLO#2"
 
 
@@ -2184,10 +2268,13 @@ def get_meas_target_sets_regionlets_general_format(training_sequences, regionlet
     meas_noise_covs = [meas_noise_covs_regionlets]
     print "HELLO#5"
 
-    mail = mailpy.Mail("") #this is silly and could be cleaned up
-    (gt_objects, regionlets_det_objects) = evaluate(min_score=regionlets_score_intervals[0], \
-        det_method='regionlets', mail=mail, obj_class=obj_class, include_ignored_gt=include_ignored_gt,\
-        include_dontcare_in_gt=include_dontcare_in_gt, include_ignored_detections=include_ignored_detections)
+    if loaded_detections is None:
+        mail = mailpy.Mail("") #this is silly and could be cleaned up
+        (gt_objects, regionlets_det_objects) = evaluate(min_score=regionlets_score_intervals[0], \
+            det_method='regionlets', mail=mail, obj_class=obj_class, include_ignored_gt=include_ignored_gt,\
+            include_dontcare_in_gt=include_dontcare_in_gt, include_ignored_detections=include_ignored_detections)
+    else:
+        (gt_objects, regionlets_det_objects) = get_evaluated_objects(loaded_detections['regionlets'])
     print "HELLO#6"
 
 ########### CLEAN THIS UP BEGIN
@@ -0,0 +1,188 @@
+#Benchmark Particle.associate_measurements_proposal_distr3 against the original implementation that
+#re-summed every target's likelihoods over all measurements for every (measurement, target) pair.
+#Checks that both sample exactly the same associations with the same proposal probabilities for
+#a fixed seed, then times both on dense frames.
+#
+#usage: python benchmark_proposal_distr3.py [number of trials]
+import numpy as np
+import math
+import sys
+import time
+
+import rbpf_KITTI_det_scores as rbpf
+from rbpf_KITTI_det_scores import get_score_parameters
+from learn_params1 import get_score_indices
+
+REGIONLETS_SCORE_INTERVALS = [i for i in range(2, 20)]
+LSVM_SCORE_INTERVALS = [i/2.0 for i in range(0, 6)]
+
+
+def associate_measurements_proposal_distr3_reference(particle, meas_source_index, measurement_list, total_target_count, \
+	p_target_deaths, measurement_scores):
+	"""
+	associate_measurements_proposal_distr3 before the per target normalizers were hoisted out of the
+	measurement loop, O(measurements^2 * targets)
+	"""
+	list_of_measurement_associations = []
+	log_proposal_probability = 0.0
+	assoc_likelihoods = particle.assoc_likelihoods[meas_source_index]
+
+	score_indices = get_score_indices(rbpf.SCORE_INTERVALS[meas_source_index], measurement_scores)
+
+	birth_count = 0
+	clutter_count = 0
+	remaining_meas_count = len(measurement_list)
+	for (index, cur_meas) in enumerate(measurement_list):
+		score_index = score_indices[index]
+		proposal_distribution_list = []
+		for target_index in range(total_target_count):
+			cur_target_likelihood = assoc_likelihoods[target_index, index]
+			targ_likelihoods_summed_over_meas = 0.0
+			for meas_index in range(len(measurement_list)):
+				targ_likelihoods_summed_over_meas += assoc_likelihoods[target_index, meas_index]
+			if((targ_likelihoods_summed_over_meas != 0.0) and (not target_index in list_of_measurement_associations)\
+				and p_target_deaths[target_index] < 1.0):
+				cur_target_prior = rbpf.TARGET_EMISSION_PROBS[meas_source_index][score_index]*cur_target_likelihood \
+								  /targ_likelihoods_summed_over_meas
+			else:
+				cur_target_prior = 0.0
+
+			proposal_distribution_list.append(cur_target_likelihood*cur_target_prior)
+
+		cur_birth_prior = 0.0
+		for i in range(birth_count+1, min(len(rbpf.BIRTH_PROBABILITIES[meas_source_index][score_index]), remaining_meas_count + birth_count + 1)):
+			cur_birth_prior += rbpf.BIRTH_PROBABILITIES[meas_source_index][score_index][i]*(i - birth_count)/remaining_meas_count
+		proposal_distribution_list.append(cur_birth_prior*rbpf.p_birth_likelihood)
+
+		cur_clutter_prior = 0.0
+		for i in range(clutter_count+1, min(len(rbpf.CLUTTER_PROBABILITIES[meas_source_index][score_index]), remaining_meas_count + clutter_count + 1)):
+			cur_clutter_prior += rbpf.CLUTTER_PROBABILITIES[meas_source_index][score_index][i]*(i - clutter_count)/remaining_meas_count
+		proposal_distribution_list.append(cur_clutter_prior*rbpf.p_clutter_likelihood)
+
+		proposal_distribution = np.asarray(proposal_distribution_list)
+		proposal_distribution /= float(np.sum(proposal_distribution))
+
+		sampled_assoc_idx = np.random.choice(len(proposal_distribution),
+												p=proposal_distribution)
+		if(sampled_assoc_idx <= total_target_count):
+			list_of_measurement_associations.append(sampled_assoc_idx)
+			if(sampled_assoc_idx == total_target_count):
+				birth_count += 1
+		else:
+			list_of_measurement_associations.append(-1)
+			clutter_count += 1
+		log_proposal_probability += math.log(proposal_distribution[sampled_assoc_idx])
+
+		remaining_meas_count -= 1
+	return(list_of_measurement_associations, log_proposal_probability)
+
+
+def set_synthetic_parameters(rng):
+	"""
+	Set the module level parameters rbpf_KITTI_det_scores normally learns in __main__
+
+	Output:
+	- config: TrackerConfig of these parameters
+	"""
+	def count_prior():
+		prior = np.array([.6, .25, .1, .03, .01, .005, .003, .002])
+		return list(prior/np.sum(prior)) + [.0000001/20 for i in range(40)]
+
+	rbpf.N_PARTICLES = 1
+	rbpf.SCORE_INTERVALS = [REGIONLETS_SCORE_INTERVALS, LSVM_SCORE_INTERVALS]
+	rbpf.TARGET_EMISSION_PROBS = []
+	for score_intervals in rbpf.SCORE_INTERVALS:
+		emission_probs = rng.rand(len(score_intervals))
+		rbpf.TARGET_EMISSION_PROBS.append(list(.7*emission_probs/np.sum(emission_probs)))
+	rbpf.CLUTTER_PROBABILITIES = [[count_prior() for i in score_intervals] for score_intervals in rbpf.SCORE_INTERVALS]
+	rbpf.BIRTH_PROBABILITIES = [[count_prior() for i in score_intervals] for score_intervals in rbpf.SCORE_INTERVALS]
+	rbpf.MEAS_NOISE_COVS = [[np.array([[20.0, 1.0], [1.0, 5.0]]) for i in score_intervals] for score_intervals in rbpf.SCORE_INTERVALS]
+	rbpf.BORDER_DEATH_PROBABILITIES = [-99, .3, .5, .5, .5, .6]
+	rbpf.NOT_BORDER_DEATH_PROBABILITIES = [-99, .05, .03, .03, .03, .04]
+	return rbpf.get_module_tracker_config()
+
+
+def make_frame(rng, config, target_count, meas_count):
+	"""
+	Output:
+	- particle: a Particle with target_count living targets and assoc_likelihoods set
+	- measurement_lists, measurement_scores: meas_count detections from each source, sorted by score
+	- score_parameters: score_parameters[i] is (score_indices, emission_probs, meas_noise_covs) for source i
+	- p_target_deaths: death probabilities of the living targets
+	"""
+	particle = rbpf.Particle(0, config, rbpf.IdCounters())
+	for i in range(target_count):
+		particle.create_new_target(rng.uniform([0, 0], [1242, 375]), 60, 40, 0.0)
+	for target in particle.targets.living_targets:
+		target.P = target.P*rng.uniform(1, 3)
+
+	measurement_lists = []
+	measurement_scores = []
+	for score_intervals in rbpf.SCORE_INTERVALS:
+		target_positions = [np.array([target.x[0][0], target.x[2][0]]) for target in particle.targets.living_targets]
+		cur_measurements = []
+		for i in range(meas_count):
+			if i < len(target_positions) and rng.rand() < .8:
+				cur_measurements.append(target_positions[i] + rng.randn(2)*5)
+			else:
+				cur_measurements.append(rng.uniform([0, 0], [1242, 375]))
+		measurement_lists.append(cur_measurements)
+		measurement_scores.append(sorted(rng.uniform(score_intervals[0] + .01, score_intervals[-1] + 2, meas_count), reverse=True))
+
+	score_parameters = []
+	for meas_source_index in range(len(measurement_lists)):
+		measurements = rbpf.Measurement()
+		measurements.scores = measurement_scores[meas_source_index]
+		score_parameters.append(get_score_parameters(meas_source_index, measurements, config))
+	particle.compute_assoc_likelihoods(measurement_lists, [cur_parameters[2] for cur_parameters in score_parameters])
+	p_target_deaths = list(rng.uniform(.01, .3, target_count))
+	return (particle, measurement_lists, measurement_scores, score_parameters, p_target_deaths)
+
+
+def check_same_samples(rng, config, trial_count):
+	"""
+	For many random frames and seeds, the current and reference proposals must sample the same
+	associations with bitwise equal log proposal probabilities
+	"""
+	for trial in range(trial_count):
+		target_count = rng.randint(0, 15)
+		meas_count = rng.randint(0, 30)
+		(particle, measurement_lists, measurement_scores, score_parameters, p_target_deaths) = make_frame(rng, config, target_count, meas_count)
+		for meas_source_index in range(len(measurement_lists)):
+			np.random.seed(trial)
+			reference = associate_measurements_proposal_distr3_reference(particle, meas_source_index, \
+				measurement_lists[meas_source_index], target_count, p_target_deaths, measurement_scores[meas_source_index])
+			np.random.seed(trial)
+			(score_indices, emission_probs, meas_noise_covs) = score_parameters[meas_source_index]
+			current = particle.associate_measurements_proposal_distr3(meas_source_index, \
+				measurement_lists[meas_source_index], target_count, p_target_deaths, score_indices, emission_probs)
+			assert(list(reference[0]) == list(current[0])), (trial, reference, current)
+			assert(reference[1] == current[1]), (trial, reference[1], current[1])
+	print "%d trials: sampled associations and proposal probabilities are identical" % trial_count
+
+
+def time_proposals(rng, config, target_count, meas_count, repeats=20):
+	(particle, measurement_lists, measurement_scores, score_parameters, p_target_deaths) = make_frame(rng, config, target_count, meas_count)
+	(score_indices, emission_probs, meas_noise_covs) = score_parameters[0]
+	t0 = time.time()
+	for i in range(repeats):
+		associate_measurements_proposal_distr3_reference(particle, 0, measurement_lists[0], target_count, \
+			p_target_deaths, measurement_scores[0])
+	t1 = time.time()
+	for i in range(repeats):
+		particle.associate_measurements_proposal_distr3(0, measurement_lists[0], target_count, \
+			p_target_deaths, score_indices, emission_probs)
+	t2 = time.time()
+	print "%2d targets, %2d measurements: reference %.3f ms, current %.3f ms per call" % \
+		(target_count, meas_count, 1000*(t1-t0)/repeats, 1000*(t2-t1)/repeats)
+
+
+if __name__ == "__main__":
+	trial_count = 200
+	if len(sys.argv) > 1:
+		trial_count = int(sys.argv[1])
+	rng = np.random.RandomState(0)
+	config = set_synthetic_parameters(rng)
+	check_same_samples(rng, config, trial_count)
+	for (target_count, meas_count) in [(5, 5), (10, 20), (10, 40), (20, 40)]:
+		time_proposals(rng, config, target_count, meas_count)
@@ -1,7 +1,6 @@
 import numpy as np
 from filterpy.kalman import KalmanFilter
 from filterpy.common import Q_discrete_white_noise
-from filterpy.monte_carlo import stratified_resample
 import filterpy
 #import matplotlib.pyplot as plt
 #import matplotlib.cm as cmx
@@ -9,6 +8,7 @@ import filterpy
 from scipy.stats import multivariate_normal
 from scipy.stats import gamma
 from scipy.special import gdtrc
+from scipy.special import xlogy
 import random
 import copy 
 import math
@@ -17,8 +17,7 @@ import pickle
 import sys
 import resource
 import errno
-from munkres import Munkres
-from collections import deque
+import multiprocessing
 
 #sys.path.insert(0, "/Users/jkuck/rotation3/clearmetrics")
 #import clearmetrics
@@ -28,8 +27,14 @@ from learn_params1 import get_meas_target_sets_lsvm_and_regionlets
 from learn_params1 import get_meas_target_sets_regionlets_general_format
 from learn_params1 import get_meas_target_sets_mscnn_general_format
 from learn_params1 import get_meas_target_sets_mscnn_and_regionlets
+from learn_params1 import set_score_parameters
+from learn_params1 import load_detections as load_method_detections
+from box_assignment import get_box_overlaps
+from box_assignment import solve_gated_assignment
 
 from jdk_helper_evaluate_results import eval_results
+from jdk_helper_evaluate_results import evaluate_runs
+from jdk_helper_evaluate_results import get_run_folders
 
 #from multiple_meas_per_time_assoc_priors import HiddenState
 #from proposal2_helper import possible_measurement_target_associations
@@ -52,13 +57,19 @@ USE_CREATE_CHILD = True #speed up copying during resampling
 RUN_ONLINE = True #save online results 
 #near online mode wait this many frames before picking max weight particle 
 ONLINE_DELAY = 3
+#with RUN_ONLINE, keep only what the online results need: targets keep their last trajectory rows only,
+#no ancestral target histories are kept and dead targets are dropped, so memory stays flat on long
+#streams (see Tracker.step).  There are no offline results
+ONLINE_ONLY = False
 #Write results of the particle with the largest importance
 #weight times current likelihood, double check doing this correctly
 FIND_MAX_IMPRT_TIMES_LIKELIHOOD = False 
 #if true only update a target with at most one measurement
 #(i.e. not regionlets and then lsvm)
 MAX_1_MEAS_UPDATE = True
-
+#number of worker processes the particles of a sequence are sharded across, 
+#0 or 1 runs every particle in this process (see run_rbpf_on_targetset_parallel)
+N_WORKERS = 0
 ######DIRECTORY_OF_ALL_RESULTS = '/atlas/u/jkuck/rbpf_target_tracking'
 ######CUR_EXPERIMENT_BATCH_NAME = 'test_copy_correctness_orig_copy'
 #######run on these sequences
@@ -82,18 +93,43 @@ MAX_1_MEAS_UPDATE = True
 #RBPF algorithmic paramters
 
 RESAMPLE_RATIO = 2.0 #resample when get_eff_num_particles < N_PARTICLES/RESAMPLE_RATIO
+#'stratified', 'systematic' or 'residual', see get_resampling_ancestors
+RESAMPLING_SCHEME = 'stratified'
+#if true, N_PARTICLES is only the initial number of particles and resampling picks the number of
+#particles (between MIN_PARTICLES and MAX_PARTICLES) with KLD-sampling, see get_adaptive_particle_count
+ADAPTIVE_PARTICLE_COUNT = False
+MIN_PARTICLES = 20
+MAX_PARTICLES = 1600
+#KLD-sampling bound: with probability 1-delta the KL divergence between the sampled and true
+#posterior (over the bins of get_posterior_bin) is less than KLD_EPSILON, KLD_Z is the upper
+#1-delta quantile of the standard normal (delta = .01)
+KLD_EPSILON = .05
+KLD_Z = 2.326
+#anytime mode: seconds each time instance may take, None to always update every particle.  Particles
+#are updated with the measurements in the order given by ANYTIME_PRIORITY until the budget is used up,
+#the rest only get the Kalman filter prediction (see update_particles_with_measurements)
+FRAME_TIME_BUDGET = None
+#stages of a time instance, in order, that check whether the budget is used up before they start (see
+#check_deadline).  When it is, 'likelihoods' (and with it every particle update) and 'id_matching' are
+#skipped, the other stages still run.  Stages that started late are reported in RBPFState.get_timing_stats
+FRAME_STAGES = ['predict', 'likelihoods', 'kf_update', 'births_deaths', 'id_matching', 'resampling']
+#'weight' updates particles with the largest importance weights first, 'stratified' first updates the
+#particles picked by stratified sampling of the importance weights (see get_particle_priority_order)
+ANYTIME_PRIORITY = 'weight'
 
 DEBUG = False
 
 USE_PYTHON_GAUSSIAN = False #if False bug, using R_default instead of S, check USE_CONSTANT_R
+#chi-square gating: a measurement can only be associated with a target if the squared Mahalanobis distance
+#of the innovation is within the GATING_PROBABILITY quantile of the chi-square distribution with 2
+#degrees of freedom (e.g. .9999), other pairs get likelihood 0 without being evaluated or stored.  None
+#disables gating (see get_gated_assoc_likelihoods)
+GATING_PROBABILITY = None
 
 #default time between succesive measurement time instances (in seconds)
 default_time_step = .1 
 
 USE_CONSTANT_R = True
-#For testing why score interval for R are slow
-CACHED_LIKELIHOODS = 0
-NOT_CACHED_LIKELIHOODS = 0
 
 
 
@@ -103,28 +139,6 @@ NOT_CACHED_LIKELIHOODS = 0
 #from learn_params1, not counting 'ignored' ground truth
 BIRTH_COUNT_PRIOR = [0.95640802092415, 0.039357329679910326, 0.0027400672561962883, 0.0008718395815170009, 0.00012454851164528583, 0.00012454851164528583, 0, 0.00024909702329057166, 0, 0, 0.00012454851164528583]
 
-def get_score_index(score_intervals, score):
-	"""
-	Inputs:
-	- score_intervals: a list specifying detection score ranges for which parameters have been specified
-	- score: the score of a detection
-
-	Output:
-	- index: output the 0 indexed score interval this score falls into
-	"""
-
-	index = 0
-	for i in range(1, len(score_intervals)):
-		if(score > score_intervals[i]):
-			index += 1
-		else:
-			break
-	assert(score > score_intervals[index]), (score, score_intervals[index], score_intervals[index+1]) 
-	if(index < len(score_intervals) - 1):
-		assert(score <= score_intervals[index+1]), (score, score_intervals[index], score_intervals[index+1])
-	return index
-
-
 #regionlet detection with score > 2.0:
 #from learn_params
 #P_TARGET_EMISSION = 0.813482 
@@ -238,8 +252,34 @@ def get_cmap(N):
 
 
 
-class Target:
-	def __init__(self, cur_time, id_, measurement = None, width=-1, height=-1):
+def get_frame_index(cur_time):
+	"""
+	Output:
+	- frame_idx: the index of the frame (time instance) taken at cur_time
+	"""
+	return int(round(cur_time/default_time_step))
+
+#initial number of rows in a target's trajectory array, the array doubles in size when full
+TRAJECTORY_CAPACITY = 4
+#maximum number of history_parent links of a target, a private copy whose chain would be longer
+#copies its whole history instead (see Target.create_private_copy)
+MAX_HISTORY_DEPTH = 16
+#columns of a target's trajectory array
+TRAJ_FRAME = 0
+TRAJ_X = 1
+TRAJ_VX = 2
+TRAJ_Y = 3
+TRAJ_VY = 4
+TRAJ_WIDTH = 5
+TRAJ_HEIGHT = 6
+
+class Target(object):
+	__slots__ = ['state_store', 'state_row', 'width', 'height', 'birth_time', 'last_measurement_association', 'last_association', 'id_', \
+				 'death_prob', 'trajectory', 'trajectory_len', 'history_parent', 'history_parent_len', 'history_depth', \
+				 'holder_count', 'offscreen', 'updated_this_time_instance', 'keep_history']
+
+	def __init__(self, cur_time, id_, measurement = None, width=-1, height=-1, state_store=None, association=None, \
+				 keep_history=True):
 #		if measurement is None: #for data generation
 #			position = np.random.uniform(min_pos,max_pos)
 #			velocity = np.random.uniform(min_vel,max_vel)
@@ -247,8 +287,11 @@ class Target:
 #			self.P = P_default
 #		else:
 		assert(measurement != None)
-		self.x = np.array([[measurement[0]], [0], [measurement[1]], [0]])
-		self.P = P_default
+		#the Kalman filter mean and covariance live in a row of a TargetStateStore
+		#shared by every target in the particle population, see the x and P properties
+		if state_store is None:
+			state_store = TargetStateStore(capacity=1)
+		state_store.add_target_state(self, np.array([measurement[0], 0, measurement[1], 0]), P_default)
 
 		self.width = width
 		self.height = height
@@ -257,20 +300,225 @@ class Target:
 		self.birth_time = cur_time
 		#Time of the last measurement data association with this target
 		self.last_measurement_association = cur_time
+		#(measurement source index, measurement index) of the measurement associated with this target at
+		#last_measurement_association (the one it was born from until it is updated), or None if unknown
+		self.last_association = association
 		self.id_ = id_ #named id_ to avoid clash with built in id
 		self.death_prob = -1 #calculate at every time instance
 
-		self.all_states = [(self.x, self.width, self.height)]
-		self.all_time_stamps = [round(cur_time, 1)]
-
-		self.measurements = []
-		self.measurement_time_stamps = []
+		#rows trajectory[:trajectory_len] hold this target's history, one [frame, x, vx, y, vy, width, height]
+		#row per time instance (see the TRAJ_* column indices).  The first history_parent_len rows of the
+		#history are not stored here, they are the first history_parent_len rows of history_parent's history
+		#(see create_private_copy and get_trajectory)
+		self.trajectory = np.empty((TRAJECTORY_CAPACITY, 7))
+		self.trajectory_len = 0
+		#if False only the last rows of the history are kept (at most TRAJECTORY_CAPACITY, see ONLINE_ONLY)
+		self.keep_history = keep_history
+		self.append_trajectory_row(get_frame_index(cur_time))
+		self.history_parent = None
+		self.history_parent_len = 0
+		#number of history_parent links from this target to the end of its chain
+		self.history_depth = 0
+		#number of TargetSets with this target in their living_targets (TargetSet.create_child shares
+		#targets, TargetSet.release and TargetSet.get_private_target drop holders).  A target with
+		#several holders is only modified by TargetStateStore.predict, which is the same for every holder,
+		#otherwise TargetSet.get_private_target must be used to get a modifiable copy
+		self.holder_count = 1
 
 		#if target's predicted location is offscreen, set to True and then kill
 		self.offscreen = False
 
 		self.updated_this_time_instance = True
 
+	@property
+	def shared(self):
+		return self.holder_count > 1
+
+	@property
+	def x(self):
+		#(4, 1) view of this target's row in the state store
+		return self.state_store.x[self.state_row].reshape(4, 1)
+
+	@x.setter
+	def x(self, value):
+		self.state_store.x[self.state_row] = np.reshape(value, 4)
+
+	@property
+	def P(self):
+		return self.state_store.P[self.state_row]
+
+	@P.setter
+	def P(self, value):
+		self.state_store.P[self.state_row] = value
+
+	def __deepcopy__(self, memo):
+		"""
+		Copy everything except the shared state store, the copy's state is held in a private
+		store until TargetStateStore.compact adopts it (if the copy is a living target)
+		"""
+		target_copy = Target.__new__(Target)
+		memo[id(self)] = target_copy
+		for attr in Target.__slots__:
+			#the rows read through history_parent are never modified, so history parents are referenced rather than copied
+			if attr == 'history_parent':
+				target_copy.history_parent = self.history_parent
+			elif attr != 'state_store' and attr != 'state_row':
+				setattr(target_copy, attr, copy.deepcopy(getattr(self, attr), memo))
+		#the copy is held by the copied TargetSet only (dead targets are held by none)
+		target_copy.holder_count = min(self.holder_count, 1)
+		TargetStateStore(capacity=1).add_target_state(target_copy, self.state_store.x[self.state_row], self.P)
+		return target_copy
+
+	def create_private_copy(self, state_store):
+		"""
+		Copy on write for a shared target, the copy replaces this target in one of its holders.  The
+		copy references this target's history instead of copying it: only the last trajectory row is
+		copied, because it is replaced by kf_update and removed by TargetSet.kill_target.  If that row
+		is the only one in this target's own array, the copy references this target's history_parent
+		directly, and once the chain would be longer than MAX_HISTORY_DEPTH the copy gets the whole history.
+
+		Input:
+		- state_store: TargetStateStore that will hold the copy's Kalman filter state
+
+		Output:
+		- target_copy: a target that is not shared and equal to this target
+		"""
+		assert(self.shared)
+		target_copy = Target.__new__(Target)
+		for attr in Target.__slots__:
+			if attr != 'state_store' and attr != 'state_row':
+				setattr(target_copy, attr, getattr(self, attr))
+		if self.trajectory_len > 1 and self.keep_history:
+			target_copy.history_parent = self
+			target_copy.history_parent_len = self.history_parent_len + self.trajectory_len - 1
+			target_copy.history_depth = self.history_depth + 1
+		target_copy.trajectory = np.empty((TRAJECTORY_CAPACITY, 7))
+		target_copy.trajectory[0] = self.trajectory[self.trajectory_len - 1]
+		target_copy.trajectory_len = 1
+		if target_copy.history_depth > MAX_HISTORY_DEPTH:
+			target_copy.flatten_history()
+		target_copy.holder_count = 1
+		self.holder_count -= 1
+		state_store.add_target_state(target_copy, self.state_store.x[self.state_row], self.P)
+		return target_copy
+
+	def get_history_view(self, id_, history_len):
+		"""
+		Inputs:
+		- id_: the id this target had when its history had history_len rows
+
+		Output:
+		- target: this target if it still has id id_ and history_len rows, otherwise a copy with id id_
+			and the first history_len rows of this target's history (see TargetHistory), with this
+			target's current Kalman filter state
+		"""
+		if self.id_ == id_ and self.history_parent_len + self.trajectory_len == history_len:
+			return self
+		view = Target.__new__(Target)
+		for attr in Target.__slots__:
+			if attr != 'state_store' and attr != 'state_row':
+				setattr(view, attr, getattr(self, attr))
+		view.id_ = id_
+		view.trajectory = self.get_trajectory()[:history_len]
+		view.trajectory_len = history_len
+		view.history_parent = None
+		view.history_parent_len = 0
+		view.history_depth = 0
+		view.holder_count = 0
+		TargetStateStore(capacity=1).add_target_state(view, self.state_store.x[self.state_row], self.P)
+		return view
+
+	def __getstate__(self):
+		"""
+		Pickle the whole trajectory and the Kalman filter state instead of the history_parent chain
+		and the shared state store (used to move particles between parallel workers)
+		"""
+		state = {}
+		for attr in Target.__slots__:
+			if not attr in ['state_store', 'state_row', 'trajectory', 'trajectory_len', 'history_parent', 'history_parent_len', \
+							'history_depth']:
+				state[attr] = getattr(self, attr)
+		state['trajectory'] = self.get_trajectory()
+		state['x'] = self.state_store.x[self.state_row].copy()
+		state['P'] = self.P
+		return state
+
+	def __setstate__(self, state):
+		for attr in Target.__slots__:
+			if attr in state:
+				setattr(self, attr, state[attr])
+		self.trajectory_len = self.trajectory.shape[0]
+		self.history_parent = None
+		self.history_parent_len = 0
+		self.history_depth = 0
+		TargetStateStore(capacity=1).add_target_state(self, state['x'], state['P'])
+
+	def get_trajectory(self):
+		"""
+		Output:
+		- trajectory: array of shape (life length, 7), this target's whole history of
+			[frame, x, vx, y, vy, width, height] rows, including the rows read through history_parent
+		"""
+		segments = [self.trajectory[:self.trajectory_len]]
+		target = self
+		prefix_len = self.history_parent_len
+		while target.history_parent is not None:
+			target = target.history_parent
+			#the rows of the parent's own array that belong to the requested prefix
+			segments.append(target.trajectory[:prefix_len - target.history_parent_len])
+			prefix_len = target.history_parent_len
+		return np.concatenate(segments[::-1])
+
+	def flatten_history(self):
+		"""
+		Copy the rows read through history_parent into this target's own trajectory and drop its
+		reference to history_parent
+		"""
+		if self.history_parent is not None:
+			self.trajectory = self.get_trajectory()
+			self.trajectory_len = self.trajectory.shape[0]
+			self.history_parent = None
+			self.history_parent_len = 0
+			self.history_depth = 0
+
+	def append_trajectory_row(self, frame_idx):
+		"""
+		Append a row with this target's current state, width and height at frame frame_idx
+		"""
+		if self.trajectory_len == self.trajectory.shape[0]:
+			if self.keep_history:
+				self.trajectory = np.concatenate((self.trajectory, np.empty(self.trajectory.shape)))
+			else:
+				#the last row is kept, TargetSet.kill_target removes the row appended now.  Unpickled
+				#trajectories are only as long as the history, they may not have room for two rows
+				last_row = self.trajectory[self.trajectory_len - 1]
+				if self.trajectory.shape[0] < TRAJECTORY_CAPACITY:
+					self.trajectory = np.empty((TRAJECTORY_CAPACITY, 7))
+				self.trajectory[0] = last_row
+				self.trajectory_len = 1
+		self.trajectory_len += 1
+		self.set_last_trajectory_row(frame_idx)
+
+	def set_last_trajectory_row(self, frame_idx):
+		row = self.trajectory[self.trajectory_len - 1]
+		row[TRAJ_FRAME] = frame_idx
+		row[TRAJ_X:TRAJ_VY+1] = self.state_store.x[self.state_row]
+		row[TRAJ_WIDTH] = self.width
+		row[TRAJ_HEIGHT] = self.height
+
+	def last_trajectory_row(self):
+		return self.trajectory[self.trajectory_len - 1]
+
+	def last_frame(self):
+		return int(self.trajectory[self.trajectory_len - 1, TRAJ_FRAME])
+
+	def detach_state(self):
+		"""
+		Move this target's state out of the shared store into a private store.  Called when the
+		target dies so its row can be reclaimed the next time the shared store is compacted.
+		"""
+		TargetStateStore(capacity=1).add_target_state(self, self.state_store.x[self.state_row], self.P)
+
 	def near_border(self):
 		near_border = False
 		x1 = self.x[0][0] - self.width/2.0
@@ -282,21 +530,20 @@ class Target:
 		return near_border
 
 
-	def kf_update(self, measurement, width, height, cur_time, meas_noise_cov):
+	def kf_update(self, measurement, width, height, cur_time, meas_noise_cov, association=None):
 		""" Perform Kalman filter update step and replace predicted position for the current time step
-		with the updated position in self.all_states
+		with the updated position in self.trajectory
 		Input:
 		- measurement: the measurement (numpy array)
 		- cur_time: time when the measurement was taken (float)
+		- meas_noise_cov: the measurement's noise covariance (R_default with USE_CONSTANT_R, see get_score_parameters)
+		- association: (measurement source index, measurement index) of measurement, see last_association
 !!!!!!!!!PREDICTION HAS BEEN RUN AT THE BEGINNING OF TIME STEP FOR EVERY TARGET!!!!!!!!!
 		"""
 		reformat_meas = np.array([[measurement[0]],
 								  [measurement[1]]])
 		assert(self.x.shape == (4, 1))
-		if USE_CONSTANT_R:
-			S = np.dot(np.dot(H, self.P), H.T) + R_default
-		else:
-			S = np.dot(np.dot(H, self.P), H.T) + meas_noise_cov
+		S = np.dot(np.dot(H, self.P), H.T) + meas_noise_cov
 		K = np.dot(np.dot(self.P, H.T), inv(S))
 		residual = reformat_meas - np.dot(H, self.x)
 		updated_x = self.x + np.dot(K, residual)
@@ -304,14 +551,25 @@ class Target:
 		updated_P = self.P - np.dot(np.dot(K, S), K.T) #not sure if this is numerically stable!!
 		self.x = updated_x
 		self.P = updated_P
+		self.record_update(width, height, cur_time, association)
+
+	def record_update(self, width, height, cur_time, association=None):
+		"""
+		Bookkeeping after this target's row in the state store has been updated with a measurement
+		taken at cur_time (by kf_update or TargetStateStore.kf_update)
+		"""
 		self.width = width
 		self.height = height
-		assert(self.all_time_stamps[-1] == round(cur_time, 1) and self.all_time_stamps[-2] != round(cur_time, 1))
-		assert(self.x.shape == (4, 1)), (self.x.shape, np.dot(K, residual).shape)
+		frame_idx = get_frame_index(cur_time)
+		#only the last row of the trajectory can be from this frame (rows before this target's own
+		#trajectory rows are in its history_parent's)
+		assert(self.last_frame() == frame_idx)
+		assert(self.trajectory_len < 2 or self.trajectory[self.trajectory_len - 2, TRAJ_FRAME] != frame_idx)
 
-		self.all_states[-1] = (self.x, self.width, self.height)
+		self.set_last_trajectory_row(frame_idx)
 		self.updated_this_time_instance = True
 		self.last_measurement_association = cur_time
+		self.last_association = association
 
 	def kf_predict(self, dt, cur_time):
 		"""
@@ -320,7 +578,7 @@ class Target:
 			-dt: time step to run prediction on
 			-cur_time: the time the prediction is made for
 		"""
-		assert(self.all_time_stamps[-1] == round((cur_time - dt), 1))
+		assert(self.last_frame() == get_frame_index(cur_time - dt))
 		F = np.array([[1.0,  dt, 0.0, 0.0],
 		      		  [0.0, 1.0, 0.0, 0.0],
                       [0.0, 0.0, 1.0,  dt],
@@ -329,15 +587,21 @@ class Target:
 		P_predict = np.dot(np.dot(F, self.P), F.T) + Q_default
 		self.x = x_predict
 		self.P = P_predict
-		self.all_states.append((self.x, self.width, self.height))
-		self.all_time_stamps.append(round(cur_time, 1))
+		offscreen = (self.x[0][0]<0 or self.x[0][0]>=CAMERA_PIXEL_WIDTH or \
+					 self.x[2][0]<0 or self.x[2][0]>=CAMERA_PIXEL_HEIGHT)
+		self.record_predicted_state(cur_time, offscreen)
+
+	def record_predicted_state(self, cur_time, offscreen):
+		"""
+		Bookkeeping after this target's row in the state store has been predicted forward to cur_time
+		(by kf_predict or TargetStateStore.predict)
+		"""
+		self.append_trajectory_row(get_frame_index(cur_time))
 
-		if(self.x[0][0]<0 or self.x[0][0]>=CAMERA_PIXEL_WIDTH or \
-		   self.x[2][0]<0 or self.x[2][0]>=CAMERA_PIXEL_HEIGHT):
+		if offscreen:
 #			print '!'*40, "TARGET IS OFFSCREEN", '!'*40
 			self.offscreen = True
 
-		assert(self.x.shape == (4, 1))
 		self.updated_this_time_instance = False
 
 
@@ -372,7 +636,7 @@ class Target:
 ####################				   - gdtrc(theta_death, alpha_death, cur_time - last_assoc + time_step)
 ####################		death_prob /= gdtrc(theta_death, alpha_death, cur_time - last_assoc)
 ####################		return death_prob
-	def target_death_prob(self, cur_time, prev_time):
+	def target_death_prob(self, cur_time, prev_time, config):
 		""" Calculate the target death probability if this was the only target.
 		Actual target death probability will be (return_val/number_of_targets)
 		because we limit ourselves to killing a max of one target per measurement.
@@ -380,6 +644,7 @@ class Target:
 		Input:
 		- cur_time: The current measurement time (float)
 		- prev_time: The previous time step when a measurement was received (float)
+		- config: TrackerConfig holding the border and not border death probabilities
 
 		Return:
 		- death_prob: Probability of target death if this is the only target (float)
@@ -400,21 +665,171 @@ class Target:
 			frames_since_last_assoc = int(round((cur_time - self.last_measurement_association)/default_time_step))
 			assert(abs(float(frames_since_last_assoc) - (cur_time - self.last_measurement_association)/default_time_step) < .00000001)
 			if(self.near_border()):
-				if frames_since_last_assoc < len(BORDER_DEATH_PROBABILITIES):
-					cur_death_prob = BORDER_DEATH_PROBABILITIES[frames_since_last_assoc]
-				else:
-					cur_death_prob = BORDER_DEATH_PROBABILITIES[-1]
-#					cur_death_prob = 1.0
+				death_probabilities = config.border_death_probabilities
 			else:
-				if frames_since_last_assoc < len(NOT_BORDER_DEATH_PROBABILITIES):
-					cur_death_prob = NOT_BORDER_DEATH_PROBABILITIES[frames_since_last_assoc]
-				else:
-					cur_death_prob = NOT_BORDER_DEATH_PROBABILITIES[-1]
+				death_probabilities = config.not_border_death_probabilities
+			if frames_since_last_assoc < len(death_probabilities):
+				cur_death_prob = death_probabilities[frames_since_last_assoc]
+			else:
+				cur_death_prob = death_probabilities[-1]
 #					cur_death_prob = 1.0
 
 		assert(cur_death_prob >= 0.0 and cur_death_prob <= 1.0), cur_death_prob
 		return cur_death_prob
 
+class TargetStateStore(object):
+	"""
+	Kalman filter means and covariances of every target in every particle, kept in contiguous
+	arrays so that operations over the whole particle population are one batched numpy call
+	instead of one small np.dot per (particle, target).
+
+	Values:
+	- x: array of shape (capacity, 4), x[i] is the mean [x, vx, y, vy] stored in row i
+	- P: array of shape (capacity, 4, 4), P[i] is the covariance stored in row i
+	- row_count: the number of rows in use, new rows are appended at row_count
+	- row_targets: row_targets[i] is the target that was given row i
+	- particle_offsets: after compact(particle_set), the living targets of particle_set[i] occupy rows
+		particle_offsets[i]:particle_offsets[i+1] in the order of particle_set[i].targets.living_targets
+	"""
+	def __init__(self, capacity=256):
+		self.x = np.empty((capacity, 4))
+		self.P = np.empty((capacity, 4, 4))
+		self.row_count = 0
+		self.row_targets = []
+		self.particle_offsets = np.zeros(1, dtype=int)
+
+	def __deepcopy__(self, memo):
+		#the store is shared by the whole population, copying a particle or target never copies it
+		return self
+
+	def add_target_state(self, target, x, P):
+		"""
+		Append a row holding mean x (any shape with 4 elements) and covariance P (4x4) and
+		point target's state_store and state_row at it
+		"""
+		if self.row_count == self.x.shape[0]:
+			self.x = np.concatenate((self.x, np.empty(self.x.shape)))
+			self.P = np.concatenate((self.P, np.empty(self.P.shape)))
+		row = self.row_count
+		self.x[row] = np.reshape(x, 4)
+		self.P[row] = P
+		self.row_count += 1
+		self.row_targets.append(target)
+		target.state_store = self
+		target.state_row = row
+
+	def compact(self, particle_set):
+		"""
+		Rewrite the store so that it only holds the living targets of particle_set, with each
+		particle's living targets in one contiguous block (see particle_offsets).  A living target shared
+		by several particles is not copied, the rows of its later occurrences hold copies of the state in
+		its state_row (read only, e.g. for the association likelihoods).  Living targets whose state is held
+		elsewhere (copies made by copy.deepcopy when resampling) are adopted into this store.  Targets
+		that are no longer living in any particle of particle_set (e.g. the targets of particles that
+		were replaced when resampling) keep their last state in a private store and their rows are reclaimed.
+
+		Output:
+		- living_targets: list of the living targets of all particles in row order, living_targets[i] has
+			state_row i unless it occured before row i
+		"""
+		living_targets = []
+		offsets = [0]
+		for particle in particle_set:
+			living_targets.extend(particle.targets.living_targets)
+			offsets.append(len(living_targets))
+
+		kept_target_ids = set([id(target) for target in living_targets])
+		for (row, target) in enumerate(self.row_targets):
+			if target.state_store is self and target.state_row == row and not id(target) in kept_target_ids:
+				target.detach_state()
+
+		capacity = max(self.x.shape[0], len(living_targets))
+		x = np.empty((capacity, 4))
+		P = np.empty((capacity, 4, 4))
+		new_rows = []
+		old_rows = []
+		#rows of the later occurrences of shared targets and the first rows of the same targets
+		duplicate_rows = []
+		first_rows = []
+		target_rows = {}
+		for (new_row, target) in enumerate(living_targets):
+			if id(target) in target_rows:
+				duplicate_rows.append(new_row)
+				first_rows.append(target_rows[id(target)])
+				continue
+			target_rows[id(target)] = new_row
+			if target.state_store is self:
+				new_rows.append(new_row)
+				old_rows.append(target.state_row)
+			else:
+				x[new_row] = target.state_store.x[target.state_row]
+				P[new_row] = target.state_store.P[target.state_row]
+				target.state_store = self
+			target.state_row = new_row
+		x[new_rows] = self.x[old_rows]
+		P[new_rows] = self.P[old_rows]
+		x[duplicate_rows] = x[first_rows]
+		P[duplicate_rows] = P[first_rows]
+
+		self.x = x
+		self.P = P
+		self.row_count = len(living_targets)
+		self.row_targets = list(living_targets)
+		self.particle_offsets = np.array(offsets, dtype=int)
+		return living_targets
+
+	def predict(self, particle_set, dt, cur_time):
+		"""
+		Run Kalman filter prediction for every living target in every particle with one batched
+		matrix product over the store.  Shared targets are predicted in place, once.
+
+		Inputs:
+		- particle_set: list of all particles
+		- dt: time step to run prediction on
+		- cur_time: the time the prediction is made for
+		"""
+		living_targets = self.compact(particle_set)
+		n = len(living_targets)
+		F = np.array([[1.0,  dt, 0.0, 0.0],
+		      		  [0.0, 1.0, 0.0, 0.0],
+                      [0.0, 0.0, 1.0,  dt],
+                      [0.0, 0.0, 0.0, 1.0]])
+		self.x[:n] = np.einsum('ij,nj->ni', F, self.x[:n])
+		self.P[:n] = np.einsum('nij,kj->nik', np.einsum('ij,njk->nik', F, self.P[:n]), F) + Q_default
+
+		offscreen = (self.x[:n, 0] < 0) | (self.x[:n, 0] >= CAMERA_PIXEL_WIDTH) | \
+					(self.x[:n, 2] < 0) | (self.x[:n, 2] >= CAMERA_PIXEL_HEIGHT)
+		for (row, target) in enumerate(living_targets):
+			if target.state_row == row:
+				assert(target.last_frame() == get_frame_index(cur_time - dt))
+				target.record_predicted_state(cur_time, offscreen[row])
+
+	def kf_update(self, rows, measurements, meas_noise_covs):
+		"""
+		Run the Kalman filter update step on many rows at once, using closed form inverses of the
+		2x2 innovation covariances.  Each row may appear at most once.
+
+		Inputs:
+		- rows: integer array of shape (K,), the rows to update
+		- measurements: array of shape (K, 2), measurements[k] is the measured [x, y] for rows[k]
+		- meas_noise_covs: array of shape (K, 2, 2), the measurement noise covariance for rows[k]
+		"""
+		x = self.x[rows]
+		P = self.P[rows]
+		#H selects the x and y position components of the state
+		PHt = P[:, :, [0, 2]]
+		S = PHt[:, [0, 2], :] + meas_noise_covs
+		S_det = S[:, 0, 0]*S[:, 1, 1] - S[:, 0, 1]*S[:, 1, 0]
+		S_inv = np.empty(S.shape)
+		S_inv[:, 0, 0] = S[:, 1, 1]/S_det
+		S_inv[:, 0, 1] = -S[:, 0, 1]/S_det
+		S_inv[:, 1, 0] = -S[:, 1, 0]/S_det
+		S_inv[:, 1, 1] = S[:, 0, 0]/S_det
+		K = np.einsum('nij,njk->nik', PHt, S_inv)
+		residual = measurements - x[:, [0, 2]]
+		self.x[rows] = x + np.einsum('nij,nj->ni', K, residual)
+		self.P[rows] = P - np.einsum('nij,nkj->nik', np.einsum('nij,njk->nik', K, S), K)
+
 class Measurement:
     #a collection of measurements at a single time instance
     def __init__(self, time = -1):
@@ -428,46 +843,271 @@ class Measurement:
         self.scores = []
         self.time = time
 
+def get_detection_measurement(time_stamp, boxes, scores):
+	"""
+	Input:
+	- time_stamp: time of the frame the detections were made in
+	- boxes: array of shape (n, 4), each row a detection's bounding box [left, top, right, bottom]
+	- scores: array of shape (n,), the detections' scores
+
+	Output:
+	- measurement: Measurement of the detections sorted by score, largest first (as the KITTI loader
+		in learn_params1 orders them)
+	"""
+	boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+	scores = np.asarray(scores, dtype=float).reshape(-1)
+	assert(len(boxes) == len(scores)), (boxes.shape, scores.shape)
+	order = np.argsort(-scores, kind='mergesort')
+	boxes = boxes[order]
+	measurement = Measurement(time_stamp)
+	measurement.val = list((boxes[:, 0:2] + boxes[:, 2:4])/2.0)
+	measurement.widths = list(boxes[:, 2] - boxes[:, 0])
+	measurement.heights = list(boxes[:, 3] - boxes[:, 1])
+	measurement.scores = list(scores[order])
+	return measurement
+
+def get_trajectory_rows_by_frame(target):
+	"""
+	Output:
+	- trajectory_rows: dictionary, trajectory_rows[frame_idx] is target's trajectory row for frame frame_idx
+	"""
+	trajectory_rows = {}
+	for row in target.get_trajectory():
+		frame_idx = int(row[TRAJ_FRAME])
+		if not frame_idx in trajectory_rows:
+			trajectory_rows[frame_idx] = row
+	return trajectory_rows
+
+class TargetSnapshot(object):
+	"""
+	The ids and trajectory rows of a TargetSet's living targets at one frame, kept for writing
+	online results ONLINE_DELAY frames later.  Snapshots are never modified after creation, so they
+	are shared by the ring buffers of all TargetSets descended from the one that created them.
+	"""
+	__slots__ = ['frame_idx', 'ids', 'rows']
+
+	def __init__(self, frame_idx, ids, rows):
+		self.frame_idx = frame_idx
+		#ids[i] is the id of the target whose [frame, x, vx, y, vy, width, height] row is rows[i]
+		self.ids = ids
+		self.rows = rows
+
+	def with_ids(self, ids):
+		return TargetSnapshot(self.frame_idx, ids, self.rows)
+
+def snapshot_living_targets(living_targets, frame_idx):
+	"""
+	Input:
+	- living_targets: list of Targets
+	- frame_idx: the frame of the targets' last trajectory rows, or None if the snapshot is only
+		used for matching target boxes and the frame isn't checked
+
+	Output:
+	- snapshot: TargetSnapshot of the last trajectory rows of living_targets
+	"""
+	ids = np.array([target.id_ for target in living_targets], dtype=int)
+	rows = np.empty((len(living_targets), 7))
+	for (i, target) in enumerate(living_targets):
+		rows[i] = target.last_trajectory_row()
+	assert(frame_idx is None or (rows[:, TRAJ_FRAME] == frame_idx).all()), (rows[:, TRAJ_FRAME], frame_idx)
+	return TargetSnapshot(frame_idx, ids, rows)
+
+class SnapshotRingBuffer(object):
+	"""
+	Fixed size ring buffer of the TargetSnapshots from the last ONLINE_DELAY frames, oldest first.
+	Slots that have not been filled yet hold None.
+	"""
+	__slots__ = ['snapshots', 'start']
+
+	def __init__(self, size):
+		self.snapshots = [None for i in range(size)]
+		self.start = 0
+
+	def __len__(self):
+		return len(self.snapshots)
+
+	def __getitem__(self, q_idx):
+		return self.snapshots[(self.start + q_idx) % len(self.snapshots)]
+
+	def __setitem__(self, q_idx, snapshot):
+		self.snapshots[(self.start + q_idx) % len(self.snapshots)] = snapshot
+
+	def push(self, snapshot):
+		"""
+		Replace the oldest snapshot with snapshot, which becomes the newest
+		"""
+		self.snapshots[self.start] = snapshot
+		self.start = (self.start + 1) % len(self.snapshots)
+
+	def copy(self):
+		#the snapshots themselves are never modified, so they are shared with the copy
+		ring_copy = SnapshotRingBuffer(0)
+		ring_copy.snapshots = list(self.snapshots)
+		ring_copy.start = self.start
+		return ring_copy
+
+KITTI_RESULT_FORMAT = "%d %d Car -1 -1 2.57 %d %d %d %d -1 -1 -1 -1000 -1000 -1000 -10 1"
+
+def write_KITTI_rows(f, frame_indices, target_ids, rows):
+	"""
+	Write one KITTI result line per trajectory row with a single np.savetxt call
+
+	Input:
+	- f: open file or filename
+	- frame_indices, target_ids: integer arrays, the frame and target id of each line
+	- rows: array of shape (len(frame_indices), 7) of [frame, x, vx, y, vy, width, height] rows
+	"""
+	x_pos = rows[:, TRAJ_X]
+	y_pos = rows[:, TRAJ_Y]
+	width = rows[:, TRAJ_WIDTH]
+	height = rows[:, TRAJ_HEIGHT]
+	#astype(int) truncates towards zero like formatting a float with %d
+	lines = np.column_stack((frame_indices, target_ids, (x_pos - width/2.0).astype(int), \
+							 (y_pos - height/2.0).astype(int), (x_pos + width/2.0).astype(int), \
+							 (y_pos + height/2.0).astype(int)))
+	np.savetxt(f, lines, fmt=KITTI_RESULT_FORMAT)
+
+def write_online_snapshot(f, snapshot):
+	write_KITTI_rows(f, np.repeat(snapshot.frame_idx, len(snapshot.ids)), snapshot.ids, snapshot.rows)
+
+class TargetHistory(object):
+	"""
+	The all_targets list of an ancestor of a TargetSet when the TargetSet was created, linked to the
+	histories of older ancestors.  Histories are never modified, so a history is shared by every
+	descendant of the TargetSet that created it.  Living targets keep changing after the history is made
+	(they are predicted in place while shared and modified in place by their last holder), so their ids
+	and history lengths at that time are recorded as well (see Target.get_history_view).
+	"""
+	__slots__ = ['targets', 'ids', 'history_lens', 'older_history']
+
+	def __init__(self, targets, older_history):
+		self.targets = targets
+		self.ids = [target.id_ for target in targets]
+		self.history_lens = [target.history_parent_len + target.trajectory_len for target in targets]
+		#TargetHistory of older ancestors, or None
+		self.older_history = older_history
+
+class IdCounters(object):
+	"""
+	Particle and target ID counters shared by every particle of a run of the rbpf (and by the runs of
+	a Tracker), so all targets have unique IDs, even if they are in different particles
+	"""
+	def __init__(self, next_target_id=0, id_stride=1, next_particle_id=0):
+		#particle and target IDs are incremented by id_stride, each parallel worker uses a different
+		#residue so that IDs are unique across workers (see get_worker_id_counters)
+		self.next_particle_id = next_particle_id
+		self.next_target_id = next_target_id
+		self.id_stride = id_stride
+
+	def __deepcopy__(self, memo):
+		#shared by the whole population, copying a particle never copies the counters
+		return self
+
+	def get_particle_id(self):
+		particle_id = self.next_particle_id
+		self.next_particle_id += self.id_stride
+		return particle_id
+
+	def get_target_id(self):
+		target_id = self.next_target_id
+		self.next_target_id += self.id_stride
+		return target_id
+
 class TargetSet:
 	"""
 	Contains ground truth states for all targets.  Also contains all generated measurements.
 	"""
 
-	def __init__(self):
+	def __init__(self, config, ids, state_store=None):
+		#TrackerConfig and IdCounters of the run this TargetSet belongs to
+		self.config = config
+		self.ids = ids
 		self.living_targets = []
 		self.all_targets = [] #alive and dead targets
+		#all_target_indices[i] is the index of living_targets[i] in all_targets
+		self.all_target_indices = []
+
+		#TargetStateStore holding the Kalman filter states of this TargetSet's targets
+		if state_store is None:
+			state_store = TargetStateStore()
+		self.state_store = state_store
 
 		self.living_count = 0 #number of living targets
 		self.total_count = 0 #number of living targets plus number of dead targets
 		self.measurements = [] #generated measurements for a generative TargetSet 
 
-		self.parent_target_set = None 
+		#with USE_CREATE_CHILD, TargetHistory of the ancestors this TargetSet was created from
+		#(see create_child), or None
+		self.target_history = None
+		#TargetHistory given to this TargetSet's children, made by the first call to create_child
+		self.child_target_history = None
 
-		self.living_targets_q = deque([-1 for i in range(ONLINE_DELAY)])
+		#snapshots of the living targets from the last ONLINE_DELAY frames, for writing online results
+		self.living_targets_q = SnapshotRingBuffer(config.online_delay)
 
 	def create_child(self):
-		child_target_set = TargetSet()
-		child_target_set.parent_target_set = self
+		"""
+		Output:
+		- child_target_set: TargetSet sharing this TargetSet's living targets (copy on write).  The child
+			doesn't reference this TargetSet, only its all_targets list is kept for the child in a
+			TargetHistory, so ancestors (and their online snapshot queues) are freed once no living
+			TargetSet references them
+		"""
+		child_target_set = TargetSet(self.config, self.ids, self.state_store)
+		if not self.config.online_only:
+			if self.child_target_history is None:
+				self.child_target_history = TargetHistory(list(self.all_targets), self.target_history)
+			child_target_set.target_history = self.child_target_history
 		child_target_set.total_count = self.total_count
 		child_target_set.living_count = self.living_count
-		child_target_set.all_targets = copy.deepcopy(self.living_targets)
-		for target in child_target_set.all_targets:
-			child_target_set.living_targets.append(target)
-		child_target_set.living_targets_q = copy.deepcopy(self.living_targets_q)
+		#targets are shared with the child and copied when either TargetSet modifies them
+		for target in self.living_targets:
+			target.holder_count += 1
+		child_target_set.all_targets = list(self.living_targets)
+		child_target_set.living_targets = list(self.living_targets)
+		child_target_set.all_target_indices = range(self.living_count)
+		child_target_set.living_targets_q = self.living_targets_q.copy()
 		return child_target_set
 
-	def create_new_target(self, measurement, width, height, cur_time):
-		if RUN_ONLINE:
-			global NEXT_TARGET_ID
-			new_target = Target(cur_time, NEXT_TARGET_ID, np.squeeze(measurement), width, height)
-			NEXT_TARGET_ID += 1
+	def get_private_target(self, living_target_index):
+		"""
+		Copy on write: if self.living_targets[living_target_index] is shared with other TargetSets,
+		replace it (in living_targets and all_targets) with a private copy.
+
+		Output:
+		- target: self.living_targets[living_target_index], which can be modified
+		"""
+		target = self.living_targets[living_target_index]
+		if target.shared:
+			private_target = target.create_private_copy(self.state_store)
+			self.all_targets[self.all_target_indices[living_target_index]] = private_target
+			self.living_targets[living_target_index] = private_target
+			self.child_target_history = None
+			target = private_target
+		return target
+
+	def release(self):
+		"""
+		Called when this TargetSet is no longer used by a particle (e.g. it was not resampled or was
+		replaced by its children), so its living targets have one holder less
+		"""
+		for target in self.living_targets:
+			target.holder_count -= 1
+
+	def create_new_target(self, measurement, width, height, cur_time, association=None):
+		if self.config.run_online:
+			new_target = Target(cur_time, self.ids.get_target_id(), np.squeeze(measurement), width, height, \
+								self.state_store, association, keep_history=not self.config.online_only)
 		else:
-			new_target = Target(cur_time, self.total_count, np.squeeze(measurement), width, height)
+			new_target = Target(cur_time, self.total_count, np.squeeze(measurement), width, height, self.state_store, \
+								association)
 		self.living_targets.append(new_target)
+		self.all_target_indices.append(len(self.all_targets))
 		self.all_targets.append(new_target)
 		self.living_count += 1
 		self.total_count += 1
-		if not USE_CREATE_CHILD:
+		self.child_target_history = None
+		if not self.config.use_create_child and not self.config.online_only:
 			assert(len(self.living_targets) == self.living_count and len(self.all_targets) == self.total_count)
 
 
@@ -478,22 +1118,31 @@ class TargetSet:
 		"""
 
 		#kf predict was run for this time instance, but the target actually died, so remove the predicted state
-		del self.living_targets[living_target_index].all_states[-1]
-		del self.living_targets[living_target_index].all_time_stamps[-1]
+		target = self.get_private_target(living_target_index)
+		target.trajectory_len -= 1
+		#dead targets are only kept for the offline results, don't let them keep their history parents alive
+		target.flatten_history()
 
+		target.detach_state()
+		target.holder_count = 0
 		del self.living_targets[living_target_index]
+		all_target_index = self.all_target_indices.pop(living_target_index)
+		if self.config.online_only:
+			#the target's online results have been written (its rows are in the snapshots), drop it
+			del self.all_targets[all_target_index]
+			self.all_target_indices = [index if index < all_target_index else index - 1 for index in self.all_target_indices]
+		self.child_target_history = None
 
 		self.living_count -= 1
-		if not USE_CREATE_CHILD:
+		if not self.config.use_create_child and not self.config.online_only:
 			assert(len(self.living_targets) == self.living_count and len(self.all_targets) == self.total_count)
 
 	def plot_all_target_locations(self, title):
 		fig = plt.figure()
 		ax = fig.add_subplot(1, 1, 1)
 		for i in range(self.total_count):
-			life = len(self.all_targets[i].all_states) #length of current targets life 
-			locations_1D =  [self.all_targets[i].all_states[j][0] for j in range(life)]
-			ax.plot(self.all_targets[i].all_time_stamps, locations_1D,
+			trajectory = self.all_targets[i].get_trajectory()
+			ax.plot(trajectory[:, TRAJ_FRAME]*default_time_step, trajectory[:, TRAJ_X],
 					'-o', label='Target %d' % i)
 
 		legend = ax.legend(loc='lower left', shadow=True)
@@ -510,174 +1159,111 @@ class TargetSet:
 		ax.plot(time_stamps, locations,'o')
 		plt.title('Generated Measurements') 
 
-	def collect_ancestral_targets(self, descendant_target_ids=[]):
+	def collect_ancestral_targets(self):
 		"""
-		Inputs:
-		- descendant_target_ids: a list of target ids that exist in the calling child's all_targets list
-			(or the all_targets list of a descendant of the calling child)
-
 		Outputs:
-		- every_target: every target in this TargetSet's all_targets list and
-		#every target in any of this TargetSet's ancestors' all_targets lists that does not
-		#appear in the all_targets list of a descendant
+		- every_target: every target in this TargetSet's all_targets list and every target in any of this
+			TargetSet's ancestors' all_targets lists (most recent ancestor first, as they were when the
+			TargetHistory was made), skipping targets whose id was already found
 		"""
 		every_target = []
-		found_target_ids = descendant_target_ids
+		found_target_ids = set()
 		for target in self.all_targets:
-			if(not target.id_ in found_target_ids):
+			if not target.id_ in found_target_ids:
 				every_target.append(target)
-				found_target_ids.append(target.id_)
-		if self.parent_target_set == None:
-			return every_target
-		else:
-			ancestral_targets = self.parent_target_set.collect_ancestral_targets(found_target_ids)
-
-		every_target = every_target + ancestral_targets # + operator used to concatenate lists!
+				found_target_ids.add(target.id_)
+		target_history = self.target_history
+		while target_history is not None:
+			for (target, id_, history_len) in zip(target_history.targets, target_history.ids, target_history.history_lens):
+				if not id_ in found_target_ids:
+					every_target.append(target.get_history_view(id_, history_len))
+					found_target_ids.add(id_)
+			target_history = target_history.older_history
 		return every_target
 
 
+	def get_online_snapshot(self, frame_idx):
+		"""
+		Output:
+		- snapshot: TargetSnapshot of the online results output on frame frame_idx, the living targets
+			ONLINE_DELAY frames ago
+		"""
+		online_delay = self.config.online_delay
+		if online_delay == 0:
+			return snapshot_living_targets(self.living_targets, frame_idx)
+		else:
+			delayed_snapshot = self.living_targets_q[0]
+			assert(delayed_snapshot.frame_idx == frame_idx - online_delay), (delayed_snapshot.frame_idx, frame_idx, online_delay)
+			return delayed_snapshot
+
 	def write_online_results(self, online_results_filename, frame_idx, total_frame_count):
-		if frame_idx == ONLINE_DELAY:
+		online_delay = self.config.online_delay
+		if frame_idx == online_delay:
 			f = open(online_results_filename, "w") #write over old results if first frame
 		else:
 			f = open(online_results_filename, "a") #write at end of file
 
-		if ONLINE_DELAY == 0:
-			for target in self.living_targets:
-				assert(target.all_time_stamps[-1] == round(frame_idx*default_time_step, 1))
-				x_pos = target.all_states[-1][0][0][0]
-				y_pos = target.all_states[-1][0][2][0]
-				width = target.all_states[-1][1]
-				height = target.all_states[-1][2]
-
-				left = x_pos - width/2.0
-				top = y_pos - height/2.0
-				right = x_pos + width/2.0
-				bottom = y_pos + height/2.0		 
-				f.write( "%d %d Car -1 -1 2.57 %d %d %d %d -1 -1 -1 -1000 -1000 -1000 -10 1\n" % \
-					(frame_idx, target.id_, left, top, right, bottom))
-
-		else:
-			print self.living_targets_q
-			(delayed_frame_idx, delayed_liv_targets) = self.living_targets_q[0]
-			print delayed_frame_idx
-			print delayed_liv_targets
-			assert(delayed_frame_idx == frame_idx - ONLINE_DELAY), (delayed_frame_idx, frame_idx, ONLINE_DELAY)
-			for target in delayed_liv_targets:
-				assert(target.all_time_stamps[-1] == round((frame_idx - ONLINE_DELAY)*default_time_step, 1)), (target.all_time_stamps[-1], frame_idx, ONLINE_DELAY, round((frame_idx - ONLINE_DELAY)*default_time_step, 1))
-				x_pos = target.all_states[-1][0][0][0]
-				y_pos = target.all_states[-1][0][2][0]
-				width = target.all_states[-1][1]
-				height = target.all_states[-1][2]
-
-				left = x_pos - width/2.0
-				top = y_pos - height/2.0
-				right = x_pos + width/2.0
-				bottom = y_pos + height/2.0		 
-				f.write( "%d %d Car -1 -1 2.57 %d %d %d %d -1 -1 -1 -1000 -1000 -1000 -10 1\n" % \
-					(frame_idx - ONLINE_DELAY, target.id_, left, top, right, bottom))
-
+		write_online_snapshot(f, self.get_online_snapshot(frame_idx))
+		if online_delay != 0:
 			if frame_idx == total_frame_count - 1:
 				q_idx = 1
-				for cur_frame_idx in range(frame_idx - ONLINE_DELAY + 1, total_frame_count - 1):
-					print '-'*20
-					print cur_frame_idx
-					print frame_idx - ONLINE_DELAY + 1
-					print total_frame_count
-					print q_idx
-					print len(self.living_targets_q)
-					(delayed_frame_idx, delayed_liv_targets) = self.living_targets_q[q_idx]
+				for cur_frame_idx in range(frame_idx - online_delay + 1, total_frame_count - 1):
+					delayed_snapshot = self.living_targets_q[q_idx]
 					q_idx+=1
-					assert(delayed_frame_idx == cur_frame_idx), (delayed_frame_idx, cur_frame_idx, ONLINE_DELAY)
-					for target in delayed_liv_targets:
-						assert(target.all_time_stamps[-1] == round((cur_frame_idx)*default_time_step, 1))
-						x_pos = target.all_states[-1][0][0][0]
-						y_pos = target.all_states[-1][0][2][0]
-						width = target.all_states[-1][1]
-						height = target.all_states[-1][2]
-
-						left = x_pos - width/2.0
-						top = y_pos - height/2.0
-						right = x_pos + width/2.0
-						bottom = y_pos + height/2.0		 
-						f.write( "%d %d Car -1 -1 2.57 %d %d %d %d -1 -1 -1 -1000 -1000 -1000 -10 1\n" % \
-							(cur_frame_idx, target.id_, left, top, right, bottom))
-				for target in self.living_targets:
-					assert(target.all_time_stamps[-1] == round(frame_idx*default_time_step, 1))
-					x_pos = target.all_states[-1][0][0][0]
-					y_pos = target.all_states[-1][0][2][0]
-					width = target.all_states[-1][1]
-					height = target.all_states[-1][2]
-
-					left = x_pos - width/2.0
-					top = y_pos - height/2.0
-					right = x_pos + width/2.0
-					bottom = y_pos + height/2.0		 
-					f.write( "%d %d Car -1 -1 2.57 %d %d %d %d -1 -1 -1 -1000 -1000 -1000 -10 1\n" % \
-						(frame_idx, target.id_, left, top, right, bottom))
+					assert(delayed_snapshot.frame_idx == cur_frame_idx), (delayed_snapshot.frame_idx, cur_frame_idx, online_delay)
+					write_online_snapshot(f, delayed_snapshot)
+				write_online_snapshot(f, snapshot_living_targets(self.living_targets, frame_idx))
+		f.close()
 
 	def write_targets_to_KITTI_format(self, num_frames, filename):
-		if USE_CREATE_CHILD:
+		"""
+		Write every target's trajectory (the first row of each frame, see get_trajectory_rows_by_frame)
+		for frames 0 to num_frames-1 in KITTI format, sorted by frame and then target id (and target order
+		for equal ids), so the rows of a frame don't depend on the order resampling left the targets in
+		"""
+		assert(not self.config.online_only), "there are no offline results with ONLINE_ONLY"
+		if self.config.use_create_child:
 			every_target = self.collect_ancestral_targets()
-			f = open(filename, "w")
-			for frame_idx in range(num_frames):
-				timestamp = round(frame_idx*default_time_step, 1)
-				for target in every_target:
-					if timestamp in target.all_time_stamps:
-						x_pos = target.all_states[target.all_time_stamps.index(timestamp)][0][0][0]
-						y_pos = target.all_states[target.all_time_stamps.index(timestamp)][0][2][0]
-						width = target.all_states[target.all_time_stamps.index(timestamp)][1]
-						height = target.all_states[target.all_time_stamps.index(timestamp)][2]
-
-						left = x_pos - width/2.0
-						top = y_pos - height/2.0
-						right = x_pos + width/2.0
-						bottom = y_pos + height/2.0		 
-						f.write( "%d %d Car -1 -1 2.57 %d %d %d %d -1 -1 -1 -1000 -1000 -1000 -10 1\n" % \
-							(frame_idx, target.id_, left, top, right, bottom))
-	#					left = target.x[0][0] - target.width/2
-	#					top = target.x[2][0] - target.height/2
-	#					right = target.x[0][0] + target.width/2
-	#					bottom = target.x[2][0] + target.height/2		 
-	#					f.write( "%d %d Car -1 -1 2.57 %d %d %d %d -1 -1 -1 -1000 -1000 -1000 -10 1\n" % \
-	#						(frame_idx, target.id_, left, top, right, bottom))
-			f.close()
-
 		else:
-			f = open(filename, "w")
-			for frame_idx in range(num_frames):
-				timestamp = round(frame_idx*default_time_step, 1)
-				for target in self.all_targets:
-					if timestamp in target.all_time_stamps:
-						x_pos = target.all_states[target.all_time_stamps.index(timestamp)][0][0][0]
-						y_pos = target.all_states[target.all_time_stamps.index(timestamp)][0][2][0]
-						width = target.all_states[target.all_time_stamps.index(timestamp)][1]
-						height = target.all_states[target.all_time_stamps.index(timestamp)][2]
-
-						left = x_pos - width/2.0
-						top = y_pos - height/2.0
-						right = x_pos + width/2.0
-						bottom = y_pos + height/2.0		 
-						f.write( "%d %d Car -1 -1 2.57 %d %d %d %d -1 -1 -1 -1000 -1000 -1000 -10 1\n" % \
-							(frame_idx, target.id_, left, top, right, bottom))
-	#					left = target.x[0][0] - target.width/2
-	#					top = target.x[2][0] - target.height/2
-	#					right = target.x[0][0] + target.width/2
-	#					bottom = target.x[2][0] + target.height/2		 
-	#					f.write( "%d %d Car -1 -1 2.57 %d %d %d %d -1 -1 -1 -1000 -1000 -1000 -10 1\n" % \
-	#						(frame_idx, target.id_, left, top, right, bottom))
-			f.close()
+			every_target = self.all_targets
+
+		target_orders = []
+		target_ids = []
+		rows = []
+		for (target_order, target) in enumerate(every_target):
+			trajectory = target.get_trajectory()
+			(frames, first_indices) = np.unique(trajectory[:, TRAJ_FRAME].astype(int), return_index=True)
+			first_indices = first_indices[(frames >= 0) & (frames < num_frames)]
+			target_orders.append(np.repeat(target_order, len(first_indices)))
+			target_ids.append(np.repeat(target.id_, len(first_indices)))
+			rows.append(trajectory[first_indices])
+		if len(rows) > 0:
+			target_orders = np.concatenate(target_orders)
+			target_ids = np.concatenate(target_ids)
+			rows = np.concatenate(rows)
+		else:
+			rows = np.empty((0, 7))
+		order = np.lexsort((target_orders, target_ids, rows[:, TRAJ_FRAME].astype(int)))
+		write_KITTI_rows(filename, rows[order, TRAJ_FRAME].astype(int), np.asarray(target_ids, dtype=int)[order], rows[order])
 
 
 class Particle:
-	def __init__(self, id_):
+	def __init__(self, id_, config, ids, state_store=None):
+		#TrackerConfig and IdCounters of the run this particle belongs to
+		self.config = config
+		self.ids = ids
 		#Targets tracked by this particle
-		self.targets = TargetSet()
-
-		self.importance_weight = 1.0/N_PARTICLES
-		self.likelihood_DOUBLE_CHECK_ME = -1
-		#cache for memoizing association likelihood computation
-		self.assoc_likelihood_cache = {}
+		self.targets = TargetSet(config, ids, state_store)
+
+		#importance weights are held by the ParticleSet this particle belongs to
+		self.log_likelihood_DOUBLE_CHECK_ME = -np.inf
+		#assoc_likelihoods[i] is an array of shape (living target count, measurement count) where
+		#assoc_likelihoods[i][t, j] is the likelihood of measurement j from source i given living target t,
+		#set for the current time instance before sampling associations.  assoc_log_likelihoods[i] holds
+		#the logs of the same likelihoods, computed directly so they do not underflow.  With a gating_probability
+		#both hold the same GatedAssocLikelihoods instead, storing the gated pairs only
+		self.assoc_likelihoods = []
+		self.assoc_log_likelihoods = []
 
 		self.id_ = id_ #will be the same as the parent's id when copying in create_child
 
@@ -691,19 +1277,16 @@ class Particle:
 		self.pi_targets_debug = []
 
 	def create_child(self):
-		global NEXT_PARTICLE_ID
-		child_particle = Particle(NEXT_PARTICLE_ID)
-		NEXT_PARTICLE_ID += 1
-		child_particle.importance_weight = self.importance_weight
+		child_particle = Particle(self.ids.get_particle_id(), self.config, self.ids, self.targets.state_store)
 		child_particle.targets = self.targets.create_child()
 		return child_particle
 
-	def create_new_target(self, measurement, width, height, cur_time):
-		self.targets.create_new_target(measurement, width, height, cur_time)
+	def create_new_target(self, measurement, width, height, cur_time, association=None):
+		self.targets.create_new_target(measurement, width, height, cur_time, association)
 
 	def update_target_death_probabilities(self, cur_time, prev_time):
 		for target in self.targets.living_targets:
-			target.death_prob = target.target_death_prob(cur_time, prev_time)
+			target.death_prob = target.target_death_prob(cur_time, prev_time, self.config)
 
 	def sample_target_deaths(self):
 		"""
@@ -739,14 +1322,16 @@ class Particle:
 
 
 	def sample_data_assoc_and_death_mult_meas_per_time_proposal_distr_1(self, measurement_lists, \
-		cur_time, measurement_scores):
+		cur_time, score_indices, emission_probs):
 		"""
 		Input:
 		- measurement_lists: a list where measurement_lists[i] is a list of all measurements from the current
 			time instance from the ith measurement source (i.e. different object detection algorithms
 			or different sensors)
-		- measurement_scores: a list where measurement_scores[i] is a list containing scores for every measurement in
-			measurement_list[i]
+		- score_indices: a list where score_indices[i] is an array containing the score interval index of every
+			measurement in measurement_list[i]
+		- emission_probs: a list where emission_probs[i] is an array containing the target emission probability
+			of every measurement in measurement_list[i]
 
 		Output:
 		- measurement_associations: A list where measurement_associations[i] is a list of association values
@@ -756,9 +1341,9 @@ class Particle:
 			measurement_associations[i][j] in range [0, self.targets.living_count-1] -> measurement is of
 				particle.targets.living_targets[measurement_associations[i][j]]
 
-		- imprt_re_weight: After processing this measurement the particle's
-			importance weight will be:
-			new_importance_weight = old_importance_weight * imprt_re_weight
+		- log_imprt_re_weight: After processing this measurement the particle's
+			log importance weight will be:
+			new_log_importance_weight = old_log_importance_weight + log_imprt_re_weight
 		- targets_to_kill: a list containing the indices of targets that should be killed, beginning
 			with the smallest index in increasing order, e.g. [0, 4, 6, 33]
 		"""
@@ -771,9 +1356,9 @@ class Particle:
 			assert(p_target_deaths[len(p_target_deaths) - 1] >= 0 and p_target_deaths[len(p_target_deaths) - 1] <= 1)
 
 
-		(targets_to_kill, measurement_associations, proposal_probability, unassociated_target_death_probs) = \
+		(targets_to_kill, measurement_associations, log_proposal_probability, unassociated_target_death_probs) = \
 			self.sample_proposal_distr3(measurement_lists, self.targets.living_count, p_target_deaths, \
-										cur_time, measurement_scores)
+										cur_time, score_indices, emission_probs)
 
 
 		living_target_indices = []
@@ -783,31 +1368,31 @@ class Particle:
 
 #		exact_probability = self.get_exact_prob_hidden_and_data(measurement_list, living_target_indices, self.targets.living_count, 
 #												 measurement_associations, p_target_deaths)
-		exact_probability = 1.0
+		log_exact_probability = 0.0
 		for meas_source_index in range(len(measurement_lists)):
-			cur_assoc_prob = self.get_exact_prob_hidden_and_data(meas_source_index, measurement_lists[meas_source_index], \
+			cur_log_assoc_prob = self.get_exact_log_prob_hidden_and_data(meas_source_index, measurement_lists[meas_source_index], \
 				living_target_indices, self.targets.living_count, measurement_associations[meas_source_index],\
-				unassociated_target_death_probs, measurement_scores[meas_source_index], SCORE_INTERVALS[meas_source_index])
-			exact_probability *= cur_assoc_prob
+				unassociated_target_death_probs, score_indices[meas_source_index], self.config.score_intervals[meas_source_index])
+			log_exact_probability += cur_log_assoc_prob
 
-		exact_death_prob = self.calc_death_prior(living_target_indices, p_target_deaths)
-		exact_probability *= exact_death_prob
+		log_exact_death_prob = self.calc_log_death_prior(living_target_indices, p_target_deaths)
+		log_exact_probability += log_exact_death_prob
 
 		assert(num_targs == self.targets.living_count)
 		#double check targets_to_kill is sorted
 		assert(all([targets_to_kill[i] <= targets_to_kill[i+1] for i in xrange(len(targets_to_kill)-1)]))
 
-		imprt_re_weight = exact_probability/proposal_probability
+		log_imprt_re_weight = log_exact_probability - log_proposal_probability
 
-		assert(imprt_re_weight != 0.0), (exact_probability, proposal_probability)
+		assert(np.isfinite(log_imprt_re_weight)), (log_exact_probability, log_proposal_probability)
 
-		self.likelihood_DOUBLE_CHECK_ME = exact_probability
+		self.log_likelihood_DOUBLE_CHECK_ME = log_exact_probability
 
-		return (measurement_associations, targets_to_kill, imprt_re_weight)
+		return (measurement_associations, targets_to_kill, log_imprt_re_weight)
 
 
 	def associate_measurements_proposal_distr3(self, meas_source_index, measurement_list, total_target_count, \
-		p_target_deaths, measurement_scores):
+		p_target_deaths, score_indices, emission_probs):
 
 		"""
 		Try sampling associations with each measurement sequentially
@@ -817,51 +1402,68 @@ class Particle:
 		- p_target_deaths: a list of length len(total_target_count) where 
 			p_target_deaths[i] = the probability that target i has died between the last
 			time instance and the current time instance
+		- score_indices: array of the score interval index of each measurement
+		- emission_probs: array of the target emission probability of each measurement
 
 		Output:
 		- list_of_measurement_associations: list of associations for each measurement
-		- proposal_probability: proposal probability of the sampled deaths and associations
+		- log_proposal_probability: log of the proposal probability of the sampled associations
 			
 		"""
 		list_of_measurement_associations = []
-		proposal_probability = 1.0
+		log_proposal_probability = 0.0
+		assoc_likelihoods = self.assoc_likelihoods[meas_source_index]
+		assert(assoc_likelihoods.shape == (total_target_count, len(measurement_list)))
+
+		#per target normalizers, computed once for all measurements.  cumsum accumulates in the same
+		#order as summing over measurements one at a time, so proposals are reproducible for a fixed seed
+		gating = self.config.gating_probability is not None
+		if gating:
+			targ_likelihoods_summed_over_meas = assoc_likelihoods.get_target_sums()
+		elif len(measurement_list) > 0:
+			targ_likelihoods_summed_over_meas = np.cumsum(assoc_likelihoods, axis=1)[:, -1]
+		else:
+			targ_likelihoods_summed_over_meas = np.zeros(total_target_count)
+		#targets that may be proposed for a measurement, targets are removed once associated
+		proposable_targets = (targ_likelihoods_summed_over_meas != 0.0) & (np.asarray(p_target_deaths) < 1.0)
+		targ_likelihoods_summed_over_meas[np.logical_not(proposable_targets)] = 1.0
 
 		#sample measurement associations
 		birth_count = 0
 		clutter_count = 0
 		remaining_meas_count = len(measurement_list)
 		for (index, cur_meas) in enumerate(measurement_list):
-			score_index = get_score_index(SCORE_INTERVALS[meas_source_index], measurement_scores[index])
+			score_index = score_indices[index]
 			#create proposal distribution for the current measurement
 			#compute target association proposal probabilities
-			proposal_distribution_list = []
-			for target_index in range(total_target_count):
-				cur_target_likelihood = self.memoized_assoc_likelihood(cur_meas, meas_source_index, target_index, MEAS_NOISE_COVS[meas_source_index][score_index], score_index)
-				targ_likelihoods_summed_over_meas = 0.0
-				for meas_index in range(len(measurement_list)):
-					temp_score_index = get_score_index(SCORE_INTERVALS[meas_source_index], measurement_scores[meas_index]) #score_index for the meas_index in this loop
-					targ_likelihoods_summed_over_meas += self.memoized_assoc_likelihood(measurement_list[meas_index], meas_source_index, target_index,  MEAS_NOISE_COVS[meas_source_index][temp_score_index], temp_score_index)
-				if((targ_likelihoods_summed_over_meas != 0.0) and (not target_index in list_of_measurement_associations)\
-					and p_target_deaths[target_index] < 1.0):
-					cur_target_prior = TARGET_EMISSION_PROBS[meas_source_index][score_index]*cur_target_likelihood \
-									  /targ_likelihoods_summed_over_meas
-#					cur_target_prior = P_TARGET_EMISSION*cur_target_likelihood \
-#									  /targ_likelihoods_summed_over_meas
-				else:
-					cur_target_prior = 0.0
-
-				proposal_distribution_list.append(cur_target_likelihood*cur_target_prior)
+			if not gating:
+				candidate_targets = None
+				cur_target_likelihoods = assoc_likelihoods[:, index]
+				cur_target_priors = emission_probs[index]*cur_target_likelihoods \
+									/targ_likelihoods_summed_over_meas
+				cur_target_priors[np.logical_not(proposable_targets)] = 0.0
+			else:
+				#only the unassociated targets gated with this measurement are proposed
+				(candidate_targets, cur_target_likelihoods) = assoc_likelihoods.get_measurement_candidates(index)
+				cur_target_priors = emission_probs[index]*cur_target_likelihoods \
+									/targ_likelihoods_summed_over_meas[candidate_targets]
+				proposed = proposable_targets[candidate_targets] & (cur_target_priors != 0.0)
+				(candidate_targets, cur_target_likelihoods, cur_target_priors) = \
+					(candidate_targets[proposed], cur_target_likelihoods[proposed], cur_target_priors[proposed])
+			proposal_distribution_list = list(cur_target_likelihoods*cur_target_priors)
 
 			#compute birth association proposal probability
+			birth_probabilities = self.config.birth_probabilities[meas_source_index][score_index]
 			cur_birth_prior = 0.0
-			for i in range(birth_count+1, min(len(BIRTH_PROBABILITIES[meas_source_index][score_index]), remaining_meas_count + birth_count + 1)):
-				cur_birth_prior += BIRTH_PROBABILITIES[meas_source_index][score_index][i]*(i - birth_count)/remaining_meas_count 
+			for i in range(birth_count+1, min(len(birth_probabilities), remaining_meas_count + birth_count + 1)):
+				cur_birth_prior += birth_probabilities[i]*(i - birth_count)/remaining_meas_count 
 			proposal_distribution_list.append(cur_birth_prior*p_birth_likelihood)
 
 			#compute clutter association proposal probability
+			clutter_probabilities = self.config.clutter_probabilities[meas_source_index][score_index]
 			cur_clutter_prior = 0.0
-			for i in range(clutter_count+1, min(len(CLUTTER_PROBABILITIES[meas_source_index][score_index]), remaining_meas_count + clutter_count + 1)):
-				cur_clutter_prior += CLUTTER_PROBABILITIES[meas_source_index][score_index][i]*(i - clutter_count)/remaining_meas_count 
+			for i in range(clutter_count+1, min(len(clutter_probabilities), remaining_meas_count + clutter_count + 1)):
+				cur_clutter_prior += clutter_probabilities[i]*(i - clutter_count)/remaining_meas_count 
 			proposal_distribution_list.append(cur_clutter_prior*p_clutter_likelihood)
 
 			#normalize the proposal distribution
@@ -869,34 +1471,44 @@ class Particle:
 			assert(np.sum(proposal_distribution) != 0.0), (len(proposal_distribution), proposal_distribution, birth_count, clutter_count, len(measurement_list), total_target_count)
 
 			proposal_distribution /= float(np.sum(proposal_distribution))
-			assert(len(proposal_distribution) == total_target_count+2)
 
-			sampled_assoc_idx = np.random.choice(len(proposal_distribution),
+			sampled_proposal_idx = np.random.choice(len(proposal_distribution),
 													p=proposal_distribution)
+			if candidate_targets is None:
+				assert(len(proposal_distribution) == total_target_count+2)
+				sampled_assoc_idx = sampled_proposal_idx
+			elif sampled_proposal_idx < len(candidate_targets):
+				sampled_assoc_idx = candidate_targets[sampled_proposal_idx]
+			else: #birth or clutter
+				sampled_assoc_idx = total_target_count + sampled_proposal_idx - len(candidate_targets)
 			if(sampled_assoc_idx <= total_target_count): #target or birth association
 				list_of_measurement_associations.append(sampled_assoc_idx)
 				if(sampled_assoc_idx == total_target_count):
 					birth_count += 1
+				else:
+					proposable_targets[sampled_assoc_idx] = False
 			else: #clutter association
 				assert(sampled_assoc_idx == total_target_count+1)
 				list_of_measurement_associations.append(-1)
 				clutter_count += 1
-			proposal_probability *= proposal_distribution[sampled_assoc_idx]
+			log_proposal_probability += math.log(proposal_distribution[sampled_proposal_idx])
 
 			remaining_meas_count -= 1
 		assert(remaining_meas_count == 0)
-		return(list_of_measurement_associations, proposal_probability)
+		return(list_of_measurement_associations, log_proposal_probability)
 
 	def sample_proposal_distr3(self, measurement_lists, total_target_count, 
-							   p_target_deaths, cur_time, measurement_scores):
+							   p_target_deaths, cur_time, score_indices, emission_probs):
 		"""
 		Try sampling associations with each measurement sequentially
 		Input:
 		- measurement_lists: type list, measurement_lists[i] is a list of all measurements from the current
 			time instance from the ith measurement source (i.e. different object detection algorithms
 			or different sensors)
-		- measurement_scores: type list, measurement_scores[i] is a list containing scores for every measurement in
-			measurement_list[i]
+		- score_indices: type list, score_indices[i] is an array containing the score interval index of every
+			measurement in measurement_list[i]
+		- emission_probs: type list, emission_probs[i] is an array containing the target emission probability
+			of every measurement in measurement_list[i]
 		- total_target_count: the number of living targets on the previous time instace
 		- p_target_deaths: a list of length len(total_target_count) where 
 			p_target_deaths[i] = the probability that target i has died between the last
@@ -906,18 +1518,18 @@ class Particle:
 		- targets_to_kill: a list of targets that have been sampled to die (not killed yet)
 		- measurement_associations: type list, measurement_associations[i] is a list of associations for  
 			the measurements in measurement_lists[i]
-		- proposal_probability: proposal probability of the sampled deaths and associations
+		- log_proposal_probability: log of the proposal probability of the sampled deaths and associations
 			
 		"""
-		assert(len(measurement_lists) == len(measurement_scores))
+		assert(len(measurement_lists) == len(score_indices))
 		measurement_associations = []
-		proposal_probability = 1.0
+		log_proposal_probability = 0.0
 		for meas_source_index in range(len(measurement_lists)):
-			(cur_associations, cur_proposal_prob) = self.associate_measurements_proposal_distr3\
+			(cur_associations, cur_log_proposal_prob) = self.associate_measurements_proposal_distr3\
 				(meas_source_index, measurement_lists[meas_source_index], total_target_count, \
-				 p_target_deaths, measurement_scores[meas_source_index])
+				 p_target_deaths, score_indices[meas_source_index], emission_probs[meas_source_index])
 			measurement_associations.append(cur_associations)
-			proposal_probability *= cur_proposal_prob
+			log_proposal_probability += cur_log_proposal_prob
 
 		assert(len(measurement_associations) == len(measurement_lists))
 
@@ -939,15 +1551,16 @@ class Particle:
 
 
 		if USE_LEARNED_DEATH_PROBABILITIES:
-			(targets_to_kill, death_probability) =  \
+			(targets_to_kill, log_death_probability) =  \
 				self.sample_target_deaths_proposal3(unassociated_targets, cur_time)
 		else:
 			(targets_to_kill, death_probability) =  \
 				self.sample_target_deaths_proposal2(unassociated_targets, cur_time)
+			log_death_probability = math.log(death_probability)
 
 		#probability of sampling all associations
-		proposal_probability *= death_probability
-		assert(proposal_probability != 0.0)
+		log_proposal_probability += log_death_probability
+		assert(log_proposal_probability > -np.inf)
 
 		#debug
 		for meas_source_index in range(len(measurement_associations)):
@@ -956,7 +1569,7 @@ class Particle:
 					   measurement_associations[meas_source_index].count(i) == 1), (measurement_associations[meas_source_index],  measurement_list, total_target_count, p_target_deaths)
 		#done debug
 
-		return (targets_to_kill, measurement_associations, proposal_probability, unassociated_target_death_probs)
+		return (targets_to_kill, measurement_associations, log_proposal_probability, unassociated_target_death_probs)
 
 
 	def sample_target_deaths_proposal3(self, unassociated_targets, cur_time):
@@ -970,10 +1583,10 @@ class Particle:
 
 		Output:
 		- targets_to_kill: a list of targets that have been sampled to die (not killed yet)
-		- probability_of_deaths: the probability of the sampled deaths
+		- log_probability_of_deaths: log of the probability of the sampled deaths
 		"""
 		targets_to_kill = []
-		probability_of_deaths = 1.0
+		log_probability_of_deaths = 0.0
 
 		for target_idx in range(len(self.targets.living_targets)):
 			#kill offscreen targets with probability 1.0
@@ -983,26 +1596,26 @@ class Particle:
 				cur_death_prob = self.targets.living_targets[target_idx].death_prob
 				if(random.random() < cur_death_prob):
 					targets_to_kill.append(target_idx)
-					probability_of_deaths *= cur_death_prob
+					log_probability_of_deaths += math.log(cur_death_prob)
 				else:
-					probability_of_deaths *= (1 - cur_death_prob)
-		return (targets_to_kill, probability_of_deaths)
+					log_probability_of_deaths += math.log(1 - cur_death_prob)
+		return (targets_to_kill, log_probability_of_deaths)
 
-	def calc_death_prior(self, living_target_indices, p_target_deaths):
-		death_prior = 1.0
+	def calc_log_death_prior(self, living_target_indices, p_target_deaths):
+		log_death_prior = 0.0
 		for (cur_target_index, cur_target_death_prob) in enumerate(p_target_deaths):
 			if cur_target_index in living_target_indices:
-				death_prior *= (1.0 - cur_target_death_prob)
 				assert((1.0 - cur_target_death_prob) != 0.0), cur_target_death_prob
+				log_death_prior += math.log(1.0 - cur_target_death_prob)
 			else:
-				death_prior *= cur_target_death_prob
 				assert((cur_target_death_prob) != 0.0), cur_target_death_prob
+				log_death_prior += math.log(cur_target_death_prob)
 
-		return death_prior
+		return log_death_prior
 
-	def get_prior(self, living_target_indices, total_target_count, number_measurements, 
+	def get_log_prior(self, living_target_indices, total_target_count, number_measurements, 
 				 measurement_associations, p_target_deaths, target_emission_probs, 
-				 birth_count_priors, clutter_count_priors, measurement_scores, score_intervals):
+				 birth_count_priors, clutter_count_priors, score_indices, score_intervals):
 		"""
 DON"T THINK THIS BELONGS IN PARTICLE, OR PARAMETERS COULD BE CLEANED UP
 		REDOCUMENT
@@ -1024,12 +1637,13 @@ DON"T THINK THIS BELONGS IN PARTICLE, OR PARAMETERS COULD BE CLEANED UP
 		-clutter_count_prior: a probability distribution, specified as a list, such that
 			clutter_count_prior[i] = the probability of i clutter measurements during 
 			any time instance
-		"""
+		- score_indices: array of the score interval index of each measurement
 
-		def nCr(n,r):
-		    return math.factorial(n) / math.factorial(r) / math.factorial(n-r)
+		Output:
+		- log_assoc_prior: log of the prior probability of the associations
+		"""
 
-		def count_meas_orderings(M, T, b, c):
+		def log_count_meas_orderings(M, T, b, c):
 			"""
 			We define target observation priors in terms of whether each target was observed and it
 			is irrelevant which measurement the target is associated with.  Likewise, birth count priors
@@ -1057,13 +1671,12 @@ DON"T THINK THIS BELONGS IN PARTICLE, OR PARAMETERS COULD BE CLEANED UP
 			This must be true: M = T+b+c
 
 			Output:
-			- combinations: the number of measurement orderings as a float. The value is:
-				combinations = nCr(M, T)*math.factorial(T)*nCr(M-T, b)
+			- log_combinations: log of the number of measurement orderings.  The number of orderings is:
+				combinations = nCr(M, T)*math.factorial(T)*nCr(M-T, b) = M!/(b!*c!)
 
 			"""
 			assert(M == T + b + c)
-			combinations = nCr(M, T)*math.factorial(T)*nCr(M-T, b)
-			return float(combinations)
+			return math.lgamma(M + 1) - math.lgamma(b + 1) - math.lgamma(c + 1)
 
 
 		assert(len(measurement_associations) == number_measurements)
@@ -1086,7 +1699,7 @@ DON"T THINK THIS BELONGS IN PARTICLE, OR PARAMETERS COULD BE CLEANED UP
 		meas_counts_by_score = [0 for i in range(len(score_intervals))]
 		for i in range(len(measurement_associations)):
 			if measurement_associations[i] != -1 and measurement_associations[i] != total_target_count:
-				index = get_score_index(score_intervals, measurement_scores[i])
+				index = score_indices[i]
 				meas_counts_by_score[index] += 1
 
 		#the number of targets we don't observe on this time instance
@@ -1097,14 +1710,14 @@ DON"T THINK THIS BELONGS IN PARTICLE, OR PARAMETERS COULD BE CLEANED UP
 		birth_counts_by_score = [0 for i in range(len(score_intervals))]
 		for i in range(len(measurement_associations)):
 			if measurement_associations[i] == total_target_count:
-				index = get_score_index(score_intervals, measurement_scores[i])
+				index = score_indices[i]
 				birth_counts_by_score[index] += 1
 		#the number of clutter measurements on this time instance
 		clutter_count = measurement_associations.count(-1)
 		clutter_counts_by_score = [0 for i in range(len(score_intervals))]
 		for i in range(len(measurement_associations)):
 			if measurement_associations[i] == -1:
-				index = get_score_index(score_intervals, measurement_scores[i])
+				index = score_indices[i]
 				clutter_counts_by_score[index] += 1
 
 		assert(observed_target_count + birth_count + clutter_count == number_measurements),\
@@ -1112,7 +1725,7 @@ DON"T THINK THIS BELONGS IN PARTICLE, OR PARAMETERS COULD BE CLEANED UP
 			total_target_count, measurement_associations)
 
 #		assert(len(p_target_deaths) == total_target_count)
-		death_prior = self.calc_death_prior(living_target_indices, p_target_deaths)
+		log_death_prior = self.calc_log_death_prior(living_target_indices, p_target_deaths)
 
 		#the prior probability of this number of measurements with these associations
 		#given these target deaths
@@ -1122,30 +1735,30 @@ DON"T THINK THIS BELONGS IN PARTICLE, OR PARAMETERS COULD BE CLEANED UP
 			assert(0 <= birth_counts_by_score[i] and birth_counts_by_score[i] < len(birth_count_priors[i])), birth_counts_by_score[i]
 
 		p_target_does_not_emit = 1.0 - sum(target_emission_probs)
-		assoc_prior = (p_target_does_not_emit)**(unobserved_target_count) \
-					  /count_meas_orderings(number_measurements, observed_target_count, \
-						  					birth_count, clutter_count)
+		#xlogy(0, 0) = 0, like 0.0**0 = 1.0 in linear space
+		log_assoc_prior = xlogy(unobserved_target_count, p_target_does_not_emit) \
+						  - log_count_meas_orderings(number_measurements, observed_target_count, \
+						  							 birth_count, clutter_count)
 		for i in range(len(score_intervals)):
-			assoc_prior *= target_emission_probs[i]**(meas_counts_by_score[i]) \
-							  *birth_count_priors[i][birth_counts_by_score[i]] \
-							  *clutter_count_priors[i][clutter_counts_by_score[i]] \
-						  
+			log_assoc_prior += xlogy(meas_counts_by_score[i], target_emission_probs[i]) \
+							   + np.log(birth_count_priors[i][birth_counts_by_score[i]]) \
+							   + np.log(clutter_count_priors[i][clutter_counts_by_score[i]])
 
-		total_prior = death_prior * assoc_prior
+		log_total_prior = log_death_prior + log_assoc_prior
 
-		if total_prior == 0:
+		if log_total_prior == -np.inf:
 			for i in range(len(score_intervals)):
 				print "for score interval beginning at", score_intervals[i]
 				print "target emmission prob =", target_emission_probs[i]**(meas_counts_by_score[i])
 				print "birth prior=", birth_count_priors[i][birth_counts_by_score[i]] 
 				print "clutter prior=", clutter_count_priors[i][clutter_counts_by_score[i]] 
 
-		assert(total_prior != 0.0), (death_prior, assoc_prior, target_emission_probs, birth_count_priors, clutter_count_priors)
-#		return total_prior
-		return assoc_prior
+		assert(log_total_prior != -np.inf), (log_death_prior, log_assoc_prior, target_emission_probs, birth_count_priors, clutter_count_priors)
+#		return log_total_prior
+		return log_assoc_prior
 
-	def get_exact_prob_hidden_and_data(self, meas_source_index, measurement_list, living_target_indices, total_target_count,
-									   measurement_associations, p_target_deaths, measurement_scores, score_intervals):
+	def get_exact_log_prob_hidden_and_data(self, meas_source_index, measurement_list, living_target_indices, total_target_count,
+									   measurement_associations, p_target_deaths, score_indices, score_intervals):
 		"""
 		REDOCUMENT, BELOW INCORRECT, not including death probability now
 		Calculate p(data, associations, #measurements, deaths) as:
@@ -1163,7 +1776,7 @@ DON"T THINK THIS BELONGS IN PARTICLE, OR PARAMETERS COULD BE CLEANED UP
 			time instance and the current time instance
 
 		Return:
-		- p(data, associations, #measurements, deaths)
+		- log p(data, associations, #measurements, deaths)
 
 
 		*note* p(data|deaths, associations, #measurements) is referred to as the likelihood and
@@ -1171,9 +1784,10 @@ DON"T THINK THIS BELONGS IN PARTICLE, OR PARAMETERS COULD BE CLEANED UP
 		is part of the data (or an observed variable)
 		"""
 
-		prior = self.get_prior(living_target_indices, total_target_count, len(measurement_list), 
-				 				   measurement_associations, p_target_deaths, TARGET_EMISSION_PROBS[meas_source_index], 
-								   BIRTH_PROBABILITIES[meas_source_index], CLUTTER_PROBABILITIES[meas_source_index], measurement_scores, score_intervals)
+		log_prior = self.get_log_prior(living_target_indices, total_target_count, len(measurement_list), 
+				 				   measurement_associations, p_target_deaths, self.config.target_emission_probs[meas_source_index], 
+								   self.config.birth_probabilities[meas_source_index], self.config.clutter_probabilities[meas_source_index], \
+								   score_indices, score_intervals)
 
 #		hidden_state = HiddenState(living_target_indices, total_target_count, len(measurement_list), 
 #				 				   measurement_associations, p_target_deaths, P_TARGET_EMISSION, 
@@ -1182,178 +1796,139 @@ DON"T THINK THIS BELONGS IN PARTICLE, OR PARAMETERS COULD BE CLEANED UP
 #
 #		assert(priorA == prior), (priorA, prior)
 
-		likelihood = 1.0
+		log_likelihood = 0.0
 		assert(len(measurement_associations) == len(measurement_list))
 		for meas_index, meas_association in enumerate(measurement_associations):
 			if(meas_association == total_target_count): #birth
-				likelihood *= p_birth_likelihood
+				log_likelihood += math.log(p_birth_likelihood)
 			elif(meas_association == -1): #clutter
-				likelihood *= p_clutter_likelihood
+				log_likelihood += math.log(p_clutter_likelihood)
 			else:
 				assert(meas_association >= 0 and meas_association < total_target_count), (meas_association, total_target_count)
-				score_index = get_score_index(score_intervals, measurement_scores[meas_index])
-				likelihood *= self.memoized_assoc_likelihood(measurement_list[meas_index], meas_source_index, \
-											   				 meas_association, MEAS_NOISE_COVS[meas_source_index][score_index], score_index)
+				log_likelihood += self.assoc_log_likelihoods[meas_source_index][meas_association, meas_index]
 
-		assert(prior*likelihood != 0.0), (prior, likelihood)
+		assert(log_prior + log_likelihood > -np.inf), (log_prior, log_likelihood)
 
-		return prior*likelihood
+		return log_prior + log_likelihood
 
-	def memoized_assoc_likelihood(self, measurement, meas_source_index, target_index, meas_noise_cov, score_index):
+	def compute_assoc_likelihoods(self, measurement_lists, meas_noise_covs):
 		"""
-			LSVM and regionlets produced two measurements with the same locations (centers), so using the 
-			meas_source_index as part of the key is (sort of) necessary.  Currently also using the score_index, 
-			could possibly be removed (not sure if this would improve speed).
-
-			Currently saving more in the value than necessary (from debugging), can eliminate to improve
-			performance (possibly noticable)
+		Set self.assoc_likelihoods and self.assoc_log_likelihoods for this particle's living targets and the measurements of
+		the current time instance (update_particles_with_measurements does this for every particle
+		at once from the population's TargetStateStore instead)
 		"""
+		x = np.array([np.reshape(target.x, 4) for target in self.targets.living_targets]).reshape(-1, 4)
+		P = np.array([target.P for target in self.targets.living_targets]).reshape(-1, 4, 4)
+		self.assoc_likelihoods = []
+		self.assoc_log_likelihoods = []
+		for meas_source_index in range(len(measurement_lists)):
+			(likelihoods, log_likelihoods) = get_assoc_likelihoods(x, P, \
+				np.array(measurement_lists[meas_source_index]).reshape(-1, 2), meas_noise_covs[meas_source_index], self.config)
+			self.assoc_likelihoods.append(likelihoods)
+			self.assoc_log_likelihoods.append(log_likelihoods)
 
-
-		global CACHED_LIKELIHOODS
-		global NOT_CACHED_LIKELIHOODS
-		if USE_CONSTANT_R:
-			if((measurement[0], measurement[1], target_index, meas_source_index, score_index) in self.assoc_likelihood_cache):
-				CACHED_LIKELIHOODS = CACHED_LIKELIHOODS + 1
-				return self.assoc_likelihood_cache[(measurement[0], measurement[1], target_index, meas_source_index, score_index)]
-			else:
-				NOT_CACHED_LIKELIHOODS = NOT_CACHED_LIKELIHOODS + 1
-				target = self.targets.living_targets[target_index]
-				S = np.dot(np.dot(H, target.P), H.T) + R_default
-				assert(target.x.shape == (4, 1))
-		
-				state_mean_meas_space = np.dot(H, target.x)
-				#print type(state_mean_meas_space)
-				#print state_mean_meas_space
-				state_mean_meas_space = np.squeeze(state_mean_meas_space)
-
-				if USE_PYTHON_GAUSSIAN:
-					distribution = multivariate_normal(mean=state_mean_meas_space, cov=S)
-					assoc_likelihood = distribution.pdf(measurement)
-				else:
-
-#					S_det = np.linalg.det(S)
-					S_det = S[0][0]*S[1][1] - S[0][1]*S[1][0] # a little faster
-					S_inv = inv(S)
-					LIKELIHOOD_DISTR_NORM = 1.0/math.sqrt((2*math.pi)**2*S_det)
-
-					offset = measurement - state_mean_meas_space
-					a = -.5*np.dot(np.dot(offset, S_inv), offset)
-					assoc_likelihood = LIKELIHOOD_DISTR_NORM*math.exp(a)
-
-
-
-				self.assoc_likelihood_cache[(measurement[0], measurement[1], target_index, meas_source_index, score_index)] = assoc_likelihood
-				return assoc_likelihood
-
-		else:
-			if((measurement[0], measurement[1], target_index, meas_source_index, score_index) in self.assoc_likelihood_cache):
-#			if((measurement[0], measurement[1], target_index, score_index) in self.assoc_likelihood_cache):
-				CACHED_LIKELIHOODS = CACHED_LIKELIHOODS + 1
-#				return self.assoc_likelihood_cache[(measurement[0], measurement[1], target_index, score_index)]
-#				(assoc_likelihood, cached_score_index)	= self.assoc_likelihood_cache[(measurement[0], measurement[1], target_index, score_index)]
-				(assoc_likelihood, cached_score_index, cached_measurement, cached_meas_source_index) = self.assoc_likelihood_cache[(measurement[0], measurement[1], target_index, meas_source_index, score_index)]
-				assert(cached_score_index == score_index), (cached_score_index, score_index, measurement, cached_measurement, target_index, meas_noise_cov, cached_meas_source_index, meas_source_index)
-				assert(cached_meas_source_index == meas_source_index), (cached_score_index, score_index, measurement, cached_measurement, target_index, meas_noise_cov, cached_meas_source_index, meas_source_index)
-#				if(cached_score_index != score_index):
-#					print (cached_score_index, score_index, measurement, cached_measurement, target_index, meas_noise_cov)
-#					time.sleep(2)
-				return assoc_likelihood
-			else:
-				NOT_CACHED_LIKELIHOODS = NOT_CACHED_LIKELIHOODS + 1
-				target = self.targets.living_targets[target_index]
-				S = np.dot(np.dot(H, target.P), H.T) + meas_noise_cov
-				assert(target.x.shape == (4, 1))
-		
-				state_mean_meas_space = np.dot(H, target.x)
-				#print type(state_mean_meas_space)
-				#print state_mean_meas_space
-				state_mean_meas_space = np.squeeze(state_mean_meas_space)
-				if USE_PYTHON_GAUSSIAN:
-					distribution = multivariate_normal(mean=state_mean_meas_space, cov=S)
-					assoc_likelihood = distribution.pdf(measurement)
-				else:
-
-##					S_det = np.linalg.det(S)
-
-					S_det = S[0][0]*S[1][1] - S[0][1]*S[1][0] # a little faster
-					S_inv = inv(S)
-					LIKELIHOOD_DISTR_NORM = 1.0/math.sqrt((2*math.pi)**2*S_det)
-
-					offset = measurement - state_mean_meas_space
-					a = -.5*np.dot(np.dot(offset, S_inv), offset)
-					assoc_likelihood = LIKELIHOOD_DISTR_NORM*math.exp(a)
-
-#				self.assoc_likelihood_cache[(measurement[0], measurement[1], target_index, score_index)] = assoc_likelihood
-				self.assoc_likelihood_cache[(measurement[0], measurement[1], target_index, meas_source_index, score_index)] = (assoc_likelihood, score_index, measurement, meas_source_index)
-				return assoc_likelihood
-
-	def debug_target_creation(self):
+	def debug_target_creation(self, importance_weight):
 		print
 		print "Particle ", self.id_, "importance distribution:"
 		print "pi_birth = ", self.pi_birth_debug, "pi_clutter = ", self.pi_clutter_debug, \
 			"pi_targets = ", self.pi_targets_debug
 		print "sampled association c = ", self.c_debug, "importance reweighting factor = ", self.imprt_re_weight_debug
-		self.plot_all_target_locations()
+		self.plot_all_target_locations(importance_weight)
 
 	def process_meas_assoc(self, birth_value, meas_source_index, measurement_associations, measurements, \
-		widths, heights, measurement_scores, cur_time):
+		widths, heights, meas_noise_covs, cur_time):
 		"""
-		- meas_source_index: the index of the measurement source being processed (i.e. in SCORE_INTERVALS)
+		- meas_source_index: the index of the measurement source being processed (i.e. in score_intervals)
+		- meas_noise_covs: array of shape (len(measurements), 2, 2), the noise covariance of each measurement
 
 		"""
 		for meas_index, meas_assoc in enumerate(measurement_associations):
 			#create new target
 			if(meas_assoc == birth_value):
-				self.create_new_target(measurements[meas_index], widths[meas_index], heights[meas_index], cur_time)
+				self.create_new_target(measurements[meas_index], widths[meas_index], heights[meas_index], cur_time, \
+									   (meas_source_index, meas_index))
 				new_target = True 
 			#update the target corresponding to the association we have sampled
 			elif((meas_assoc >= 0) and (meas_assoc < birth_value)):
-				assert(meas_source_index >= 0 and meas_source_index < len(SCORE_INTERVALS)), (meas_source_index, len(SCORE_INTERVALS), SCORE_INTERVALS)
-				assert(meas_index >= 0 and meas_index < len(measurement_scores)), (meas_index, len(measurement_scores), measurement_scores)
-				if not (MAX_1_MEAS_UPDATE and self.targets.living_targets[meas_assoc].updated_this_time_instance):
-					score_index = get_score_index(SCORE_INTERVALS[meas_source_index], measurement_scores[meas_index])
-					self.targets.living_targets[meas_assoc].kf_update(measurements[meas_index], widths[meas_index], \
-									heights[meas_index], cur_time, MEAS_NOISE_COVS[meas_source_index][score_index])
+				assert(meas_source_index >= 0 and meas_source_index < len(self.config.score_intervals)), \
+					(meas_source_index, len(self.config.score_intervals))
+				assert(meas_index >= 0 and meas_index < len(meas_noise_covs)), (meas_index, len(meas_noise_covs))
+				if not (self.config.max_1_meas_update and self.targets.living_targets[meas_assoc].updated_this_time_instance):
+					self.targets.get_private_target(meas_assoc).kf_update(measurements[meas_index], widths[meas_index], \
+									heights[meas_index], cur_time, meas_noise_covs[meas_index], (meas_source_index, meas_index))
 			else:
 				#otherwise the measurement was associated with clutter
 				assert(meas_assoc == -1), ("meas_assoc = ", meas_assoc)
 
 	#@profile
-	def update_particle_with_measurement(self, cur_time, measurement_lists, widths, heights, measurement_scores):
+	def update_particle_with_measurement(self, cur_time, measurement_lists, widths, heights, score_indices, \
+		emission_probs, meas_noise_covs):
 		"""
 		Input:
 		- measurement_lists: a list where measurement_lists[i] is a list of all measurements from the current
 			time instance from the ith measurement source (i.e. different object detection algorithms
 			or different sensors)
-		- measurement_scores: a list where measurement_scores[i] is a list containing scores for every measurement in
-			measurement_list[i]
+		- score_indices, emission_probs, meas_noise_covs: lists where element i contains the score interval
+			index, target emission probability, and noise covariance of every measurement in measurement_list[i],
+			see get_score_parameters
 		
 		-widths: a list where widths[i] is a list of bounding box widths for the corresponding measurements
 		-heights: a list where heights[i] is a list of bounding box heights for the corresponding measurements
 
-		Debugging output:
-		- new_target: True if a new target was created
+		Output:
+		- log_imprt_re_weight: the amount to add to this particle's log importance weight (in its ParticleSet)
 		"""
-		new_target = False #debugging
-
 		birth_value = self.targets.living_count
 
-		(measurement_associations, dead_target_indices, imprt_re_weight) = \
+		self.compute_assoc_likelihoods(measurement_lists, meas_noise_covs)
+		(measurement_associations, dead_target_indices, log_imprt_re_weight) = self.sample_associations_and_reweight(cur_time, \
+			measurement_lists, widths, heights, score_indices, emission_probs)
+		#process measurement associations
+		for meas_source_index in range(len(measurement_associations)):
+			self.process_meas_assoc(birth_value, meas_source_index, measurement_associations[meas_source_index], \
+				measurement_lists[meas_source_index], widths[meas_source_index], heights[meas_source_index], \
+				meas_noise_covs[meas_source_index], cur_time)
+
+		self.process_target_deaths(birth_value, measurement_associations, dead_target_indices)
+		return log_imprt_re_weight
+
+	def sample_associations_and_reweight(self, cur_time, measurement_lists, widths, heights, score_indices, emission_probs):
+		"""
+		Sample measurement associations and target deaths for this time instance and compute the
+		importance reweighting.  Targets are not updated, created, or killed.
+
+		Output:
+		- measurement_associations: measurement_associations[i] is a list of association values for
+			measurement_lists[i], see sample_data_assoc_and_death_mult_meas_per_time_proposal_distr_1
+		- dead_target_indices: sorted list of the indices of living targets that should be killed
+		- log_imprt_re_weight: the amount to add to this particle's log importance weight
+		"""
+		(measurement_associations, dead_target_indices, log_imprt_re_weight) = \
 			self.sample_data_assoc_and_death_mult_meas_per_time_proposal_distr_1(measurement_lists, \
-				cur_time, measurement_scores)
+				cur_time, score_indices, emission_probs)
 		assert(len(measurement_associations) == len(measurement_lists))
-		assert(imprt_re_weight != 0.0), imprt_re_weight
-		self.importance_weight *= imprt_re_weight #update particle's importance weight
-		#process measurement associations
+		assert(np.isfinite(log_imprt_re_weight)), log_imprt_re_weight
 		for meas_source_index in range(len(measurement_associations)):
 			assert(len(measurement_associations[meas_source_index]) == len(measurement_lists[meas_source_index]) and
 				   len(measurement_associations[meas_source_index]) == len(widths[meas_source_index]) and
 				   len(measurement_associations[meas_source_index]) == len(heights[meas_source_index]))
-			self.process_meas_assoc(birth_value, meas_source_index, measurement_associations[meas_source_index], \
-				measurement_lists[meas_source_index], widths[meas_source_index], heights[meas_source_index], \
-				measurement_scores[meas_source_index], cur_time)
+		return (measurement_associations, dead_target_indices, log_imprt_re_weight)
+
+	def create_born_targets(self, birth_value, measurement_associations, measurement_lists, widths, heights, cur_time):
+		"""
+		Create a new target for every measurement associated with a birth (in the same order as
+		process_meas_assoc, so target ids match)
+		"""
+		for meas_source_index in range(len(measurement_associations)):
+			for (meas_index, meas_assoc) in enumerate(measurement_associations[meas_source_index]):
+				if(meas_assoc == birth_value):
+					self.create_new_target(measurement_lists[meas_source_index][meas_index], widths[meas_source_index][meas_index], \
+										   heights[meas_source_index][meas_index], cur_time, (meas_source_index, meas_index))
 
+	def process_target_deaths(self, birth_value, measurement_associations, dead_target_indices):
+		"""
+		Kill the targets sampled to die, after births and updates for this time instance have been processed
+		"""
 		#process target deaths
 		#double check dead_target_indices is sorted
 		assert(all([dead_target_indices[i] <= dead_target_indices[i+1] for i in xrange(len(dead_target_indices)-1)]))
@@ -1370,23 +1945,47 @@ DON"T THINK THIS BELONGS IN PARTICLE, OR PARAMETERS COULD BE CLEANED UP
 		assert(self.targets.living_count == original_num_targets + num_targets_born - num_targets_killed)
 		#done checking if something funny is happening
 
-		return new_target
-
-	def plot_all_target_locations(self):
+	def plot_all_target_locations(self, importance_weight):
 		fig = plt.figure()
 		ax = fig.add_subplot(1, 1, 1)
 		for i in range(self.targets.total_count):
-			life = len(self.targets.all_targets[i].all_states) #length of current targets life 
-			locations_1D =  [self.targets.all_targets[i].all_states[j][0] for j in range(life)]
-			ax.plot(self.targets.all_targets[i].all_time_stamps, locations_1D,
+			trajectory = self.targets.all_targets[i].get_trajectory()
+			ax.plot(trajectory[:, TRAJ_FRAME]*default_time_step, trajectory[:, TRAJ_X],
 					'-o', label='Target %d' % i)
 
 		legend = ax.legend(loc='lower left', shadow=True)
 		plt.title('Particle %d, Importance Weight = %f, unique targets = %d, #targets alive = %d' % \
-			(self.id_, self.importance_weight, self.targets.total_count, self.targets.living_count)) # subplot 211 title
+			(self.id_, importance_weight, self.targets.total_count, self.targets.living_count)) # subplot 211 title
 #		plt.show()
 
 
+class ParticleSet(list):
+	"""
+	A list of Particles that also holds their importance weights, log_importance_weights[i] and
+	importance_weights[i] are the weights of self[i].  Weights are accumulated in log space,
+	importance_weights is exp(log_importance_weights) and is only set when the weights are normalized
+	(or reset by set_particles).  Change the particles with set_particles so the weights stay aligned.
+	"""
+	def __init__(self, particles=[], population_size=None):
+		list.__init__(self)
+		self.set_particles(particles, population_size)
+
+	def set_particles(self, particles, population_size=None):
+		"""
+		Replace the particles, every particle gets weight 1/population_size (len(particles) if None)
+		"""
+		self[:] = particles
+		if population_size == None:
+			population_size = max(len(particles), 1)
+		self.log_importance_weights = np.empty(len(particles))
+		self.log_importance_weights.fill(-math.log(population_size))
+		self.importance_weights = np.empty(len(particles))
+		self.importance_weights.fill(1.0/population_size)
+
+	def get_log_likelihoods(self):
+		return np.array([particle.log_likelihood_DOUBLE_CHECK_ME for particle in self])
+
+
 
 
 ###########assumed that the Kalman filter prediction step has already been run for this
@@ -1402,323 +2001,1512 @@ DON"T THINK THIS BELONGS IN PARTICLE, OR PARAMETERS COULD BE CLEANED UP
 ##########	distribution = multivariate_normal(mean=state_mean_meas_space, cov=S)
 ##########	return distribution.pdf(measurement)
 
-def normalize_importance_weights(particle_set):
-	normalization_constant = 0.0
-	for particle in particle_set:
-		normalization_constant += particle.importance_weight
-	assert(normalization_constant != 0.0), normalization_constant
-	for particle in particle_set:
-		particle.importance_weight /= normalization_constant
-
-
-def perform_resampling(particle_set):
-	print "memory used before resampling: %d" % resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
-	assert(len(particle_set) == N_PARTICLES)
-	weights = []
-	for particle in particle_set:
-		weights.append(particle.importance_weight)
-	assert(abs(sum(weights) - 1.0) < .0000001)
-
-	new_particles = stratified_resample(weights)
-	new_particle_set = []
-	for index in new_particles:
-		if USE_CREATE_CHILD:
-			new_particle_set.append(particle_set[index].create_child())
-		else:
-			new_particle_set.append(copy.deepcopy(particle_set[index]))
-	del particle_set[:]
-	for particle in new_particle_set:
-		particle.importance_weight = 1.0/N_PARTICLES
-		particle_set.append(particle)
-	assert(len(particle_set) == N_PARTICLES)
-	#testing
-	weights = []
-	for particle in particle_set:
-		weights.append(particle.importance_weight)
-		assert(particle.importance_weight == 1.0/N_PARTICLES)
-	assert(abs(sum(weights) - 1.0) < .01), sum(weights)
-	print "memory used after resampling: %d" % resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
-	#done testing
-
-def display_target_counts(particle_set, cur_time):
-	target_counts = []
-	for particle in particle_set:
-		target_counts.append(particle.targets.living_count)
-	print target_counts
-
-	target_counts = []
-	importance_weights = []
-	for particle in particle_set:
-		cur_target_count = 0
-		for target in particle.targets.living_targets:
-			if (cur_time - target.birth_time) > min_target_age:
-				cur_target_count += 1
-		target_counts.append(cur_target_count)
-		importance_weights.append(particle.importance_weight)
-	print "targets older than ", min_target_age, "seconds: ", target_counts
-	print "importance weights ", min_target_age, "filler :", importance_weights
+def get_score_parameters(meas_source_index, measurements, config):
+	"""
+	Input:
+	- measurements: Measurement from the source with index meas_source_index.  Score interval indices and
+		parameters are set once when loading with get_meas_target_set*, otherwise they are set here
+	- config: TrackerConfig
 
+	Output:
+	- score_indices: array, score_indices[j] is the score interval index of measurement j
+	- emission_probs: array, emission_probs[j] is the target emission probability of measurement j
+	- meas_noise_covs: array of shape (len(measurements.scores), 2, 2), the measurement noise covariance
+		of each measurement (R_default for every measurement if use_constant_r)
+	"""
+	#measurements can be shared by Trackers with different parameters, parameters are recomputed when
+	#they were set (by the loader or another Tracker) from other tables, or it is unknown from which
+	score_parameter_tables = (config.score_intervals[meas_source_index], config.target_emission_probs[meas_source_index], \
+							  config.meas_noise_covs[meas_source_index])
+	cached_tables = getattr(measurements, 'score_parameter_tables', None)
+	if getattr(measurements, 'score_indices', None) is None or cached_tables is None or \
+		not all([cached is table or np.array_equal(cached, table) for (cached, table) in zip(cached_tables, score_parameter_tables)]):
+		set_score_parameters(measurements, *score_parameter_tables)
+	if config.use_constant_r:
+		meas_noise_covs = np.tile(R_default, (len(measurements.score_indices), 1, 1))
+	else:
+		meas_noise_covs = measurements.meas_noise_covs
+	return (measurements.score_indices, measurements.emission_probs, meas_noise_covs)
 
-def get_eff_num_particles(particle_set):
-	n_eff = 0
-	weight_sum = 0
-	for particle in particle_set:
-		n_eff += particle.importance_weight**2
-		weight_sum += particle.importance_weight
+def get_assoc_likelihoods(x, P, measurements, meas_noise_covs, config):
+	"""
+	Inputs: see get_assoc_log_likelihood_matrix
+	- config: TrackerConfig
 
-	assert(abs(weight_sum - 1.0) < .000001), (weight_sum, n_eff)
-	return 1.0/n_eff
+	Output:
+	- assoc_likelihoods: without a gating_probability, array of shape (T, M) of the likelihoods of every
+		measurement given every target, with a gating_probability the GatedAssocLikelihoods of the pairs
+		within the gate
+	- assoc_log_likelihoods: without a gating_probability, array of shape (T, M) of the log likelihoods,
+		with a gating_probability the same GatedAssocLikelihoods (indexing it gives log likelihoods)
+	"""
+	if config.gating_probability is None:
+		assoc_log_likelihoods = get_assoc_log_likelihood_matrix(x, P, measurements, meas_noise_covs, config.use_python_gaussian)
+		return (np.exp(assoc_log_likelihoods), assoc_log_likelihoods)
+	gated_likelihoods = get_gated_assoc_likelihoods(x, P, measurements, meas_noise_covs, config.gating_probability)
+	return (gated_likelihoods, gated_likelihoods)
 
+def get_assoc_log_likelihood_matrix(x, P, measurements, meas_noise_covs, use_python_gaussian=False):
+	"""
+	Gaussian log likelihood of every measurement given every target, with batched Mahalanobis distances
+	and closed form determinants of the 2x2 innovation covariances
 
+	Inputs:
+	- x: array of shape (T, 4), target means
+	- P: array of shape (T, 4, 4), target covariances
+	- measurements: array of shape (M, 2), measurement x, y locations
+	- meas_noise_covs: array of shape (M, 2, 2), meas_noise_covs[j] is the noise covariance of measurements[j]
+	- use_python_gaussian: evaluate every pair with scipy's multivariate_normal instead
 
-def run_rbpf_on_targetset(target_sets, online_results_filename):
+	Output:
+	- assoc_log_likelihoods: array of shape (T, M), assoc_log_likelihoods[t, j] is the log density of
+		measurements[j] under N(H*x[t], H*P[t]*H^T + meas_noise_covs[j])
+	"""
+	if use_python_gaussian:
+		assoc_log_likelihoods = np.empty((x.shape[0], measurements.shape[0]))
+		for t in range(x.shape[0]):
+			for j in range(measurements.shape[0]):
+				S = np.dot(np.dot(H, P[t]), H.T) + meas_noise_covs[j]
+				assoc_log_likelihoods[t, j] = multivariate_normal(mean=np.dot(H, x[t]), cov=S).logpdf(measurements[j])
+		return assoc_log_likelihoods
+
+	#S[t, j] = H*P[t]*H^T + meas_noise_covs[j]
+	(mahalanobis, log_likelihoods) = get_innovation_log_likelihoods(P[:, [0, 2]][:, :, [0, 2]][:, np.newaxis, :, :], \
+		meas_noise_covs[np.newaxis, :, :, :], measurements[np.newaxis, :, :] - x[:, [0, 2]][:, np.newaxis, :])
+	return log_likelihoods
+
+class GatedAssocLikelihoods(object):
+	"""
+	Likelihoods of the (target, measurement) pairs within the gate, stored sparsely by target (compressed
+	sparse rows), pairs outside the gate have likelihood 0 and are never stored.
+
+	Values:
+	- shape: (T, M), the number of targets and measurements
+	- row_offsets: array of length T + 1, the pairs of target t are pairs row_offsets[t]:row_offsets[t+1]
+	- meas_indices: array, the measurement index of every pair, increasing within a target
+	- log_likelihoods: array, the log likelihood of every pair
+	- likelihoods: array, the likelihood of every pair
+	"""
+	def __init__(self, shape, row_offsets, meas_indices, log_likelihoods, likelihoods=None):
+		self.shape = shape
+		self.row_offsets = row_offsets
+		self.meas_indices = meas_indices
+		self.log_likelihoods = log_likelihoods
+		if likelihoods is None:
+			likelihoods = np.exp(log_likelihoods)
+		self.likelihoods = likelihoods
+		#pairs grouped by measurement, built on the first get_measurement_candidates call
+		self.meas_offsets = None
+		self.meas_order = None
+
+	def get_rows(self, first_row, last_row):
+		"""
+		Output:
+		- gated_likelihoods: GatedAssocLikelihoods of targets first_row:last_row, sharing this one's arrays
+		"""
+		(first, last) = (self.row_offsets[first_row], self.row_offsets[last_row])
+		return GatedAssocLikelihoods((last_row - first_row, self.shape[1]), self.row_offsets[first_row:last_row+1] - first, \
+									 self.meas_indices[first:last], self.log_likelihoods[first:last], self.likelihoods[first:last])
+
+	def get_target_indices(self):
+		return np.repeat(np.arange(self.shape[0]), np.diff(self.row_offsets))
+
+	def get_target_sums(self):
+		"""
+		Output:
+		- target_sums: array of length T, the likelihoods of every target summed over measurements (in
+			increasing measurement order, as a cumulative sum over a dense row)
+		"""
+		if self.shape[0] == 0: #bincount needs a positive minlength
+			return np.zeros(0)
+		return np.bincount(self.get_target_indices(), weights=self.likelihoods, minlength=self.shape[0]).astype(float)
+
+	def get_measurement_candidates(self, meas_index):
+		"""
+		Output:
+		- target_indices: array of the targets within the gate of measurement meas_index, increasing
+		- likelihoods: array of their likelihoods
+		"""
+		if self.meas_offsets is None:
+			self.meas_order = np.argsort(self.meas_indices, kind='mergesort')
+			self.meas_offsets = np.concatenate(([0], np.cumsum(np.bincount(self.meas_indices, minlength=self.shape[1]))))
+		pairs = self.meas_order[self.meas_offsets[meas_index]:self.meas_offsets[meas_index+1]]
+		return (self.get_target_indices()[pairs], self.likelihoods[pairs])
+
+	def __getitem__(self, target_and_meas_index):
+		"""
+		Output:
+		- log_likelihood: log likelihood of (target, measurement) pair target_and_meas_index, -inf if it is
+			outside the gate
+		"""
+		(target_index, meas_index) = target_and_meas_index
+		(first, last) = (self.row_offsets[target_index], self.row_offsets[target_index+1])
+		pair = first + np.searchsorted(self.meas_indices[first:last], meas_index)
+		if pair == last or self.meas_indices[pair] != meas_index:
+			return -np.inf
+		return self.log_likelihoods[pair]
+
+def get_gated_assoc_likelihoods(x, P, measurements, meas_noise_covs, gating_probability):
+	"""
+	Gaussian likelihoods of the (target, measurement) pairs within the gate, see get_gating_candidates.
+	Only the candidate pairs are evaluated and only the gated pairs are stored and exponentiated
+
+	Inputs: see get_assoc_log_likelihood_matrix
+	- gating_probability: see GATING_PROBABILITY
+
+	Output:
+	- gated_likelihoods: GatedAssocLikelihoods of shape (T, M)
+	"""
+	(target_count, meas_count) = (x.shape[0], measurements.shape[0])
+	if target_count == 0 or meas_count == 0:
+		return GatedAssocLikelihoods((target_count, meas_count), np.zeros(target_count + 1, dtype=int), \
+									 np.zeros(0, dtype=int), np.zeros(0))
+	gate_threshold = get_gate_threshold(gating_probability)
+	(target_indices, meas_indices) = get_gating_candidates(x, P, measurements, meas_noise_covs, gate_threshold)
+	(mahalanobis, log_likelihoods) = get_innovation_log_likelihoods(P[target_indices][:, [0, 2]][:, :, [0, 2]], \
+		meas_noise_covs[meas_indices], measurements[meas_indices] - x[target_indices][:, [0, 2]])
+	gated = mahalanobis <= gate_threshold
+	row_offsets = np.concatenate(([0], np.cumsum(np.bincount(target_indices[gated], minlength=target_count))))
+	return GatedAssocLikelihoods((target_count, meas_count), row_offsets, meas_indices[gated], log_likelihoods[gated])
+
+def get_innovation_log_likelihoods(target_position_covs, meas_noise_covs, offset):
+	"""
+	Inputs (broadcast against each other):
+	- target_position_covs: array of shape (..., 2, 2), H*P*H^T of the targets
+	- meas_noise_covs: array of shape (..., 2, 2), noise covariances of the measurements
+	- offset: array of shape (..., 2), the innovations (measurement - H*x)
+
+	Output:
+	- mahalanobis: array, squared Mahalanobis distances offset^T * S^-1 * offset of the innovations,
+		S = target_position_covs + meas_noise_covs
+	- log_likelihoods: array, log densities of the innovations under N(0, S)
+	"""
+	S = target_position_covs + meas_noise_covs
+	S_det = S[..., 0, 0]*S[..., 1, 1] - S[..., 0, 1]*S[..., 1, 0]
+	#offset^T * S^-1 * offset
+	mahalanobis = (S[..., 1, 1]*offset[..., 0]**2 - (S[..., 0, 1] + S[..., 1, 0])*offset[..., 0]*offset[..., 1] \
+				   + S[..., 0, 0]*offset[..., 1]**2)/S_det
+	return (mahalanobis, -.5*mahalanobis - .5*np.log((2*math.pi)**2*S_det))
+
+def get_gate_threshold(gating_probability):
+	"""
+	Output:
+	- gate_threshold: the gating_probability quantile of the chi-square distribution with 2 degrees of
+		freedom, whose CDF is 1 - exp(-d/2)
+	"""
+	return -2.0*math.log(1.0 - gating_probability)
+
+def get_gating_candidates(x, P, measurements, meas_noise_covs, gate_threshold):
+	"""
+	Find the (target, measurement) pairs that may be within the gate from the sorted x coordinates of the
+	measurements, without evaluating the other pairs.  For a 2x2 innovation covariance S,
+	offset^T * S^-1 * offset >= dx^2/S[0, 0], so target t can only be within the gate of a measurement if
+	their x coordinates are within sqrt(gate_threshold*(P[t, 0, 0] + max meas_noise_cov[0, 0])), each
+	target is searched within its own window.
+
+	Inputs: see get_assoc_log_likelihood_matrix
+	- gate_threshold: squared Mahalanobis distance of the gate, see get_gate_threshold
+
+	Output:
+	- target_indices: array of target indices of the candidate pairs, sorted
+	- meas_indices: array of measurement indices of the candidate pairs, increasing for every target
+	"""
+	meas_order = np.argsort(measurements[:, 0], kind='mergesort')
+	sorted_meas_x = measurements[meas_order, 0]
+	half_widths = np.sqrt(gate_threshold*(P[:, 0, 0] + np.max(meas_noise_covs[:, 0, 0])))
+	first = np.searchsorted(sorted_meas_x, x[:, 0] - half_widths, side='left')
+	last = np.searchsorted(sorted_meas_x, x[:, 0] + half_widths, side='right')
+	candidate_counts = last - first
+	target_indices = np.repeat(np.arange(x.shape[0]), candidate_counts)
+	#the candidates of target t are sorted_meas_x[first[t]:last[t]]
+	sorted_positions = np.arange(np.sum(candidate_counts)) + np.repeat(first - (np.cumsum(candidate_counts) - candidate_counts), \
+																	   candidate_counts)
+	meas_indices = meas_order[sorted_positions]
+	pair_order = np.lexsort((meas_indices, target_indices))
+	return (target_indices[pair_order], meas_indices[pair_order])
+
+def update_particles_with_measurements(particle_set, target_state_store, config, cur_time, measurement_lists, \
+									   widths, heights, score_indices, emission_probs, meas_noise_covs, deadline=None, \
+									   overrun_stages=None):
+	"""
+	Same as calling update_particle_with_measurement on every particle, but the Kalman filter updates
+	for every (particle, target, measurement) association sampled on this time instance are gathered
+	and run as one batched update per measurement source.  Kalman filter prediction must have been run
+	with target_state_store.predict on this time instance.
+
+	With a deadline, particles are updated in the order of get_particle_priority_order until time.time()
+	passes the deadline (at least one particle is updated, unless the deadline passed before the
+	likelihoods are computed, then none is).  The particles that are not reached keep their predicted
+	targets, without births, deaths or Kalman filter updates, and their log importance weights are
+	re-weighted by the log of the average re-weighting of the updated particles (weighted by their
+	importance weights), so they keep their relative weight.  The Kalman filter updates, births and deaths
+	of the updated particles are run even if the deadline passes before them.
+
+	Inputs: see Particle.update_particle_with_measurement, particle_set is a ParticleSet whose log
+	importance weights are updated
+	- config: TrackerConfig of the particles
+	- deadline: time.time() after which no more particles are updated, None to update every particle
+	- overrun_stages: see check_deadline
+
+	Output:
+	- updated_count: the number of particles that were updated with the measurements
+	"""
+	if check_deadline(deadline, 'likelihoods', overrun_stages):
+		return 0
+	#likelihoods of every measurement given every living target of every particle, one matrix per source
+	assert(len(target_state_store.particle_offsets) == len(particle_set) + 1)
+	living_row_count = target_state_store.particle_offsets[-1]
+	meas_arrays = []
+	population_assoc_likelihoods = []
+	population_assoc_log_likelihoods = []
+	for meas_source_index in range(len(measurement_lists)):
+		meas_arrays.append(np.array(measurement_lists[meas_source_index]).reshape(-1, 2))
+		(likelihoods, log_likelihoods) = get_assoc_likelihoods(target_state_store.x[:living_row_count], \
+			target_state_store.P[:living_row_count], meas_arrays[-1], meas_noise_covs[meas_source_index], config)
+		population_assoc_likelihoods.append(likelihoods)
+		population_assoc_log_likelihoods.append(log_likelihoods)
+
+	if deadline is None:
+		particle_order = range(len(particle_set))
+	else:
+		particle_order = get_particle_priority_order(particle_set, config.anytime_priority)
+	updated = np.zeros(len(particle_set), dtype=bool)
+	birth_values = [None for particle in particle_set]
+	sampled_associations = [None for particle in particle_set]
+	sampled_deaths = [None for particle in particle_set]
+	log_imprt_re_weights = np.zeros(len(particle_set))
+	for particle_index in particle_order:
+		if deadline != None and updated.any() and time.time() > deadline:
+			break
+		particle = particle_set[particle_index]
+		first_row = target_state_store.particle_offsets[particle_index]
+		last_row = target_state_store.particle_offsets[particle_index + 1]
+		assert(last_row - first_row == particle.targets.living_count)
+		if config.gating_probability is None:
+			particle.assoc_likelihoods = [likelihoods[first_row:last_row] for likelihoods in population_assoc_likelihoods]
+			particle.assoc_log_likelihoods = [log_likelihoods[first_row:last_row] for log_likelihoods in population_assoc_log_likelihoods]
+		else:
+			particle.assoc_likelihoods = [likelihoods.get_rows(first_row, last_row) for likelihoods in population_assoc_likelihoods]
+			particle.assoc_log_likelihoods = particle.assoc_likelihoods
+		birth_values[particle_index] = particle.targets.living_count
+		(sampled_associations[particle_index], sampled_deaths[particle_index], log_imprt_re_weights[particle_index]) = \
+			particle.sample_associations_and_reweight(cur_time, measurement_lists, widths, heights, score_indices, emission_probs)
+		updated[particle_index] = True
+	if not updated.all():
+		updated_log_weights = particle_set.log_importance_weights[updated]
+		log_imprt_re_weights[~updated] = get_log_normalization_constant(updated_log_weights + log_imprt_re_weights[updated]) \
+										 - get_log_normalization_constant(updated_log_weights)
+	particle_set.log_importance_weights += log_imprt_re_weights
+
+	check_deadline(deadline, 'kf_update', overrun_stages)
+	#one batch per measurement source so that a target associated with measurements from several
+	#sources is updated sequentially (or only once with MAX_1_MEAS_UPDATE), as in process_meas_assoc
+	for meas_source_index in range(len(measurement_lists)):
+		updated_targets = []
+		updated_meas_indices = []
+		for (particle_index, particle) in enumerate(particle_set):
+			if not updated[particle_index]:
+				continue
+			birth_value = birth_values[particle_index]
+			for (meas_index, meas_assoc) in enumerate(sampled_associations[particle_index][meas_source_index]):
+				if((meas_assoc >= 0) and (meas_assoc < birth_value)):
+					target = particle.targets.living_targets[meas_assoc]
+					if not (config.max_1_meas_update and target.updated_this_time_instance):
+						#copy on write, a private copy gets a new row at the end of the store
+						target = particle.targets.get_private_target(meas_assoc)
+						assert(target.state_store is target_state_store)
+						updated_targets.append(target)
+						updated_meas_indices.append(meas_index)
+		if len(updated_targets) == 0:
+			continue
+
+		rows = np.array([target.state_row for target in updated_targets], dtype=int)
+		target_state_store.kf_update(rows, meas_arrays[meas_source_index][updated_meas_indices], \
+									 meas_noise_covs[meas_source_index][updated_meas_indices])
+		for (target, meas_index) in zip(updated_targets, updated_meas_indices):
+			target.record_update(widths[meas_source_index][meas_index], heights[meas_source_index][meas_index], cur_time, \
+								 (meas_source_index, meas_index))
+
+	check_deadline(deadline, 'births_deaths', overrun_stages)
+	for (particle_index, particle) in enumerate(particle_set):
+		if not updated[particle_index]:
+			continue
+		particle.create_born_targets(birth_values[particle_index], sampled_associations[particle_index], \
+									 measurement_lists, widths, heights, cur_time)
+		particle.process_target_deaths(birth_values[particle_index], sampled_associations[particle_index], \
+									   sampled_deaths[particle_index])
+	return np.sum(updated)
+
+def check_deadline(deadline, stage, overrun_stages):
+	"""
+	Inputs:
+	- deadline: time.time() by which the time instance should be processed, or None
+	- stage: name of the stage that is about to start, in FRAME_STAGES
+	- overrun_stages: list the stage is appended to if the deadline has passed, or None
+
+	Output:
+	- passed: True if the deadline has passed
+	"""
+	if deadline is None or time.time() <= deadline:
+		return False
+	if overrun_stages != None:
+		overrun_stages.append(stage)
+	return True
+
+def get_particle_priority_order(particle_set, anytime_priority):
+	"""
+	Input:
+	- anytime_priority: see ANYTIME_PRIORITY
+
+	Output:
+	- particle_order: array of the indices of every particle in particle_set in the order anytime mode
+		updates them
+	"""
+	#particles with equal weights (e.g. every particle after resampling) are taken in random order, so the
+	#particles that are not reached aren't always the same ones (and their offspring after resampling)
+	permutation = np.random.permutation(len(particle_set))
+	weight_order = permutation[np.argsort(-particle_set.importance_weights[permutation], kind='mergesort')]
+	if anytime_priority == 'weight':
+		return weight_order
+	assert(anytime_priority == 'stratified'), anytime_priority
+	#every particle picked by stratified sampling (over the randomly permuted particles) in the order it
+	#was first picked, then the rest by weight
+	picked = permutation[stratified_resample_indices(particle_set.importance_weights[permutation], len(particle_set))]
+	(unique_picked, first_pick) = np.unique(picked, return_index=True)
+	picked_order = unique_picked[np.argsort(first_pick)]
+	return np.concatenate((picked_order, weight_order[~np.in1d(weight_order, picked_order)]))
+
+def get_log_normalization_constant(log_weights):
+	"""
+	Output:
+	- log_normalization_constant: log of the sum of exp(log_weights), computed with log-sum-exp
+	"""
+	log_weights = np.array(log_weights)
+	max_log_weight = np.max(log_weights)
+	assert(np.isfinite(max_log_weight)), log_weights
+	return max_log_weight + math.log(np.sum(np.exp(log_weights - max_log_weight)))
+
+def normalize_importance_weights(particle_set):
+	"""
+	Normalize the ParticleSet's log importance weights with log-sum-exp and set its importance_weights
+	to the normalized weights in linear space
+	"""
+	particle_set.log_importance_weights -= get_log_normalization_constant(particle_set.log_importance_weights)
+	particle_set.importance_weights = np.exp(particle_set.log_importance_weights)
+
+
+def copy_resampled_particle(particle):
+	"""
+	Output:
+	- new_particle: a copy of particle for the resampled particle set
+	"""
+	if particle.config.use_create_child:
+		return particle.create_child()
+	else:
+		return copy.deepcopy(particle)
+
+def search_cumulative_weights(weights, positions):
+	"""
+	Output:
+	- indices: indices[i] is the smallest j with positions[i] < sum(weights[:j+1])
+	"""
+	cumulative_sum = np.cumsum(weights)
+	#positions are below 1, don't let round off in the sum push the last particle below them
+	cumulative_sum[-1] = 1.0
+	return np.searchsorted(cumulative_sum, positions, side='right')
+
+def stratified_resample_indices(weights, num_samples):
+	"""
+	Same samples as filterpy.monte_carlo.stratified_resample (for the same random state), one
+	uniform position in each of N equal divisions of [0, 1)
+	"""
+	N = num_samples
+	positions = (np.random.random(N) + np.arange(N)) / N
+	return search_cumulative_weights(weights, positions)
+
+def systematic_resample_indices(weights, num_samples):
+	"""
+	The same uniform offset in each of N equal divisions of [0, 1)
+	"""
+	N = num_samples
+	positions = (np.random.random() + np.arange(N)) / N
+	return search_cumulative_weights(weights, positions)
+
+def residual_resample_indices(weights, num_samples):
+	"""
+	floor(N*weights[i]) copies of particle i, the remaining particles are sampled multinomially
+	from the residual weights
+	"""
+	N = num_samples
+	copy_counts = np.floor(N*weights).astype(int)
+	indices = np.repeat(np.arange(len(weights)), copy_counts)
+	remaining_count = N - len(indices)
+	if remaining_count > 0:
+		residual_weights = N*weights - copy_counts
+		residual_weights /= np.sum(residual_weights)
+		remaining_indices = search_cumulative_weights(residual_weights, np.random.random(remaining_count))
+		indices = np.sort(np.concatenate((indices, remaining_indices)))
+	return indices
+
+def get_resampling_ancestors(weights, resampling_scheme, num_samples=None):
+	"""
+	Input:
+	- weights: array of normalized importance weights
+	- resampling_scheme: see RESAMPLING_SCHEME
+	- num_samples: number of resampled particles, len(weights) if None
+
+	Output:
+	- ancestors: sorted array of num_samples particle indices, ancestors[i] is the index of
+		the particle that resampled particle i is a copy of (sampled with resampling_scheme)
+	"""
+	weights = np.asarray(weights, dtype=float)
+	if num_samples == None:
+		num_samples = len(weights)
+	if resampling_scheme == 'stratified':
+		return stratified_resample_indices(weights, num_samples)
+	elif resampling_scheme == 'systematic':
+		return systematic_resample_indices(weights, num_samples)
+	else:
+		assert(resampling_scheme == 'residual'), resampling_scheme
+		return residual_resample_indices(weights, num_samples)
+
+def get_posterior_bin(particle):
+	"""
+	Output:
+	- bin: hashable signature of the particle's data association hypothesis on the current time
+		instance, the sorted (measurement source index, measurement index) of the measurement each living
+		target was associated with or born from (None for targets without a measurement).  Targets are
+		not binned by id (ids of targets born from the same measurement differ between particles) or
+		Kalman filter state (which moves across any grid as measurements arrive, even when the targets
+		don't move), so particles with the same number of living targets that made the same associations
+		(including births from the same measurement) fall in the same bin.
+	"""
+	signature = []
+	for target in particle.targets.living_targets:
+		if get_frame_index(target.last_measurement_association) == target.last_frame():
+			signature.append(target.last_association)
+		else:
+			signature.append(None)
+	signature.sort()
+	return tuple(signature)
+
+def get_kld_particle_count(occupied_bin_count, config):
+	"""
+	Output:
+	- particle_count: number of samples needed so that the KL divergence between the sample based
+		and true posterior is less than config.kld_epsilon with probability 1-delta (config.kld_z), when
+		the posterior occupies occupied_bin_count bins (Fox, KLD-sampling), clipped to
+		[config.min_particles, config.max_particles]
+	"""
+	if occupied_bin_count <= 1:
+		return config.min_particles
+	k = occupied_bin_count - 1
+	a = 2.0/(9.0*k)
+	particle_count = int(math.ceil(k/(2.0*config.kld_epsilon)*(1.0 - a + math.sqrt(a)*config.kld_z)**3))
+	return min(max(particle_count, config.min_particles), config.max_particles)
+
+def get_adaptive_particle_count(particle_set, ancestors, config):
+	"""
+	Input:
+	- particle_set: list of particles
+	- ancestors: resampled ancestors of the current number of particles
+	- config: TrackerConfig
+
+	Output:
+	- particle_count: get_kld_particle_count of the number of distinct get_posterior_bin's among
+		the resampled particles
+	"""
+	occupied_bins = set()
+	for ancestor in np.unique(ancestors):
+		occupied_bins.add(get_posterior_bin(particle_set[ancestor]))
+	return get_kld_particle_count(len(occupied_bins), config)
+
+def resample_particles(particle_set, ancestors):
+	"""
+	Input:
+	- particle_set: list of particles
+	- ancestors: see get_resampling_ancestors
+
+	Output:
+	- new_particle_set: new_particle_set[i] is a copy of particle_set[ancestors[i]].  The first
+		copy of each ancestor is the ancestor itself, only extra offspring are copied with
+		copy_resampled_particle.  When an ancestor has extra offspring its TargetSet becomes their
+		parent (see TargetSet.create_child), so the ancestor moves to a child TargetSet as well.
+	"""
+	offspring_counts = np.bincount(ancestors, minlength=len(particle_set))
+	offspring = {}
+	for ancestor in np.flatnonzero(offspring_counts):
+		particle = particle_set[ancestor]
+		offspring[ancestor] = [copy_resampled_particle(particle) for i in range(offspring_counts[ancestor] - 1)]
+		if particle.config.use_create_child and offspring_counts[ancestor] > 1:
+			parent_targets = particle.targets
+			particle.targets = parent_targets.create_child()
+			parent_targets.release()
+		offspring[ancestor].insert(0, particle)
+	for index in np.flatnonzero(offspring_counts == 0):
+		particle_set[index].targets.release()
+	#offspring are popped from the end in reverse order, so the ancestor itself is its first offspring
+	return [offspring[ancestor].pop() for ancestor in ancestors[::-1]][::-1]
+
+def perform_resampling(particle_set, config):
+	"""
+	Resample the ParticleSet particle_set in place.  With config.adaptive_particle_count the resampled set
+	can have a different number of particles, otherwise it has config.n_particles
+	"""
+	print "memory used before resampling: %d" % resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	if not config.adaptive_particle_count:
+		assert(len(particle_set) == config.n_particles)
+	weights = particle_set.importance_weights
+	assert(abs(np.sum(weights) - 1.0) < .0000001)
+
+	ancestors = get_resampling_ancestors(weights, config.resampling_scheme)
+	if config.adaptive_particle_count:
+		particle_count = get_adaptive_particle_count(particle_set, ancestors, config)
+		print "resampling %d particles to %d particles" % (len(particle_set), particle_count)
+		if particle_count != len(particle_set):
+			ancestors = get_resampling_ancestors(weights, config.resampling_scheme, particle_count)
+	particle_set.set_particles(resample_particles(particle_set, ancestors))
+	particle_count = len(particle_set)
+	#testing
+	assert(np.all(particle_set.importance_weights == 1.0/particle_count))
+	assert(abs(np.sum(particle_set.importance_weights) - 1.0) < .01), np.sum(particle_set.importance_weights)
+	print "memory used after resampling: %d" % resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	#done testing
+
+def display_target_counts(particle_set, cur_time):
+	target_counts = []
+	for particle in particle_set:
+		target_counts.append(particle.targets.living_count)
+	print target_counts
+
+	target_counts = []
+	for particle in particle_set:
+		cur_target_count = 0
+		for target in particle.targets.living_targets:
+			if (cur_time - target.birth_time) > min_target_age:
+				cur_target_count += 1
+		target_counts.append(cur_target_count)
+	print "targets older than ", min_target_age, "seconds: ", target_counts
+	print "importance weights ", min_target_age, "filler :", list(particle_set.importance_weights)
+
+
+def get_eff_num_particles(particle_set):
+	weight_sum = np.sum(particle_set.importance_weights)
+	n_eff = np.dot(particle_set.importance_weights, particle_set.importance_weights)
+
+	assert(abs(weight_sum - 1.0) < .000001), (weight_sum, n_eff)
+	return 1.0/n_eff
+
+
+
+def get_frame_measurements(target_sets, time_instance_index, config):
+	"""
+	Input:
+	- target_sets: a list where target_sets[i] is a TargetSet containing measurements from
+		the ith measurement source
+	- time_instance_index: the index of the time instance
+	- config: TrackerConfig the score parameters are taken from
+
+	Output:
+	- frame_measurements: tuple (time_stamp, measurement_lists, widths, heights, score_indices, emission_probs,
+		meas_noise_covs) where every element but time_stamp is a list with one entry per measurement source
+		(see Particle.update_particle_with_measurement)
+	"""
+	return collect_frame_measurements([target_set.measurements[time_instance_index] for target_set in target_sets], config)
+
+def collect_frame_measurements(measurements, config):
+	"""
+	Input:
+	- measurements: a list where measurements[i] is the Measurement from the ith measurement source
+		at one time instance
+	- config: see get_frame_measurements
+
+	Output:
+	- frame_measurements: see get_frame_measurements
+	"""
+	time_stamp = measurements[0].time
+	for cur_measurements in measurements:
+		assert(cur_measurements.time == time_stamp)
+
+	measurement_lists = []
+	widths = []
+	heights = []
+	score_indices = []
+	emission_probs = []
+	meas_noise_covs = []
+	for (meas_source_index, cur_measurements) in enumerate(measurements):
+		measurement_lists.append(cur_measurements.val)
+		widths.append(cur_measurements.widths)
+		heights.append(cur_measurements.heights)
+		(cur_score_indices, cur_emission_probs, cur_meas_noise_covs) = \
+			get_score_parameters(meas_source_index, cur_measurements, config)
+		score_indices.append(cur_score_indices)
+		emission_probs.append(cur_emission_probs)
+		meas_noise_covs.append(cur_meas_noise_covs)
+	return (time_stamp, measurement_lists, widths, heights, score_indices, emission_probs, meas_noise_covs)
+
+def propagate_particles(particle_set, target_state_store, config, frame_measurements, prev_time_stamp, deadline=None, \
+						overrun_stages=None):
+	"""
+	Move every particle in particle_set forward one time instance: Kalman filter prediction, target
+	death probabilities, then sampling associations and deaths and reweighting.  The log importance
+	weights are not normalized.
+
+	Input:
+	- particle_set: ParticleSet whose targets' states are held in target_state_store
+	- config: TrackerConfig of the particles
+	- frame_measurements: see get_frame_measurements
+	- prev_time_stamp: the time stamp of the previous time instance, -1 on the first time instance
+	- deadline: see update_particles_with_measurements
+	- overrun_stages: see check_deadline
+
+	Output:
+	- updated_count: the number of particles that were updated with the measurements
+	"""
+	(time_stamp, measurement_lists, widths, heights, score_indices, emission_probs, meas_noise_covs) = frame_measurements
+	check_deadline(deadline, 'predict', overrun_stages)
+	if(prev_time_stamp != -1):
+		dt = time_stamp - prev_time_stamp
+		assert(abs(dt - default_time_step) < .00000001), (dt, default_time_step)
+		#Run Kalman filter prediction for all living targets in all particles as one batched operation
+		target_state_store.predict(particle_set, dt, time_stamp)
+	else:
+		target_state_store.compact(particle_set)
+	for particle in particle_set:
+		#update particle death probabilities
+		if(prev_time_stamp != -1):
+			#update particle death probabilities AFTER kf_predict so that targets that moved
+			#off screen this time instance will be killed
+			particle.update_target_death_probabilities(time_stamp, prev_time_stamp)
+
+	return update_particles_with_measurements(particle_set, target_state_store, config, time_stamp, measurement_lists, \
+											  widths, heights, score_indices, emission_probs, meas_noise_covs, deadline, \
+											  overrun_stages)
+
+def get_last_max_index(values):
+	"""
+	Output:
+	- index: index of the last occurrence of the maximum of the array values
+	"""
+	return len(values) - 1 - np.argmax(values[::-1])
+
+def find_online_max_weight_index(importance_weights, log_importance_weights, log_likelihoods):
+	"""
+	Find the particle whose targets are written as online results: the (last, if several are tied)
+	particle with the largest normalized importance weight, or the largest importance weight times
+	current likelihood if log_likelihoods are given (FIND_MAX_IMPRT_TIMES_LIKELIHOOD)
+
+	Input:
+	- importance_weights, log_importance_weights: arrays with one entry per particle
+	- log_likelihoods: array with one entry per particle, or None
+
+	Output:
+	- max_weight_index: index of the particle
+	"""
+	if log_likelihoods is not None:
+		return get_last_max_index(log_importance_weights + log_likelihoods)
+	else:
+		return get_last_max_index(importance_weights)
+
+def get_online_match_snapshot(target_set):
+	"""
+	Output:
+	- snapshot: TargetSnapshot of target_set's targets that are next written as online results and
+		matched against the previous maximum importance weight particle's
+	"""
+	if target_set.config.online_delay == 0:
+		return snapshot_living_targets(target_set.living_targets, None)
+	else:
+		return target_set.living_targets_q[0]
+
+def replace_online_target_ids(target_set, target_associations, duplicate_ids):
+	"""
+	Replace target IDs in target_set's living targets and online snapshots with the IDs returned by
+	match_target_ids.  The snapshots and targets may be shared with other particles, so the queue gets
+	new snapshots with the replaced IDs and targets are made private before their IDs change.
+	"""
+	for q_idx in range(target_set.config.online_delay):
+		delayed_snapshot = target_set.living_targets_q[q_idx]
+		new_ids = delayed_snapshot.ids.copy()
+		for (i, cur_target_id) in enumerate(new_ids):
+			if cur_target_id in duplicate_ids:
+				cur_target_id = duplicate_ids[cur_target_id]
+			if cur_target_id in target_associations:
+				cur_target_id = target_associations[cur_target_id]
+			new_ids[i] = cur_target_id
+		target_set.living_targets_q[q_idx] = delayed_snapshot.with_ids(new_ids)
+	for (living_target_index, cur_target) in enumerate(target_set.living_targets):
+		if cur_target.id_ in duplicate_ids:
+			cur_target = target_set.get_private_target(living_target_index)
+			cur_target.id_ = duplicate_ids[cur_target.id_]
+		if cur_target.id_ in target_associations:
+			cur_target = target_set.get_private_target(living_target_index)
+			cur_target.id_ = target_associations[cur_target.id_]
+
+class RBPFState(object):
+	"""
+	The particles of a run of the rbpf and what is carried from one time instance to the next
+	"""
+	def __init__(self, config, ids):
+		"""
+		Input:
+		- config: TrackerConfig of the run
+		- ids: IdCounters the particles and targets of the run take their IDs from
+		"""
+		self.config = config
+		self.ids = ids
+		#Kalman filter states of every target in every particle
+		self.target_state_store = TargetStateStore()
+		particles = []
+		for i in range(0, config.n_particles):
+			particles.append(Particle(ids.get_particle_id(), config, ids, self.target_state_store))
+		self.particle_set = ParticleSet(particles)
+		self.prev_time_stamp = -1
+		#number of time instances processed so far, the index of the next time instance
+		self.time_instance_count = 0
+		self.number_resamplings = 0
+		#the particle with the maximum importance weight on the previous time instance 
+		self.prv_max_weight_particle = None
+		#if prv_max_weight_particle was not resampled, its get_online_match_snapshot from before resampling
+		#(the targets it shared with other particles may be modified by them afterwards), otherwise None
+		self.prv_max_weight_snapshot = None
+		#timing statistics are running totals over the time instances processed so far, so they don't
+		#grow with the length of a stream: total and maximum number of seconds process_time_instance took,
+		#the number of time instances that took longer than the frame_time_budget and the sum of the
+		#fractions of the particles updated with the measurements
+		self.total_frame_time = 0.0
+		self.max_frame_time = 0.0
+		self.over_budget_count = 0
+		self.total_updated_fraction = 0.0
+		#number of time instances on which the frame_time_budget ran out before every particle was updated
+		self.budget_exhausted_count = 0
+		#overrun_stage_counts[stage] is the number of time instances on which stage (one of FRAME_STAGES)
+		#started after the frame_time_budget was used up
+		self.overrun_stage_counts = dict([(stage, 0) for stage in FRAME_STAGES])
+
+	def get_timing_stats(self):
+		"""
+		Output:
+		- timing_stats: dictionary of per time instance timing statistics: 'frame_count', 'mean_time' and
+			'max_time' (seconds), 'budget_exhausted_count' (time instances on which not every particle was
+			updated), 'over_budget_count' (time instances that took longer than the frame_time_budget, always 0
+			without a budget), 'mean_updated_fraction' (of the particles) and 'overrun_stage_counts' (dictionary,
+			the number of time instances on which each of FRAME_STAGES started after the budget was used up)
+		"""
+		frame_count = self.time_instance_count
+		return {'frame_count': frame_count,
+				'mean_time': self.total_frame_time/frame_count if frame_count > 0 else 0.0,
+				'max_time': self.max_frame_time,
+				'budget_exhausted_count': self.budget_exhausted_count,
+				'over_budget_count': self.over_budget_count,
+				'mean_updated_fraction': self.total_updated_fraction/frame_count if frame_count > 0 else 1.0,
+				'overrun_stage_counts': dict(self.overrun_stage_counts)}
+
+	def get_max_weight_target_set(self):
+		"""
+		Output:
+		- max_weight_target_set: TargetSet from a (could be multiple with equal weight) maximum
+			importance weight particle
+		"""
+		return self.particle_set[get_last_max_index(self.particle_set.importance_weights)].targets
+
+def process_time_instance(state, time_instance_index, frame_measurements, write_online_results):
+	"""
+	Move the rbpf in state forward one time instance: propagate and reweight the particles, output the
+	online results and resample
+
+	Input:
+	- state: RBPFState, updated in place
+	- time_instance_index: the index of the time instance, state.time_instance_count
+	- frame_measurements: the measurements of the time instance, see get_frame_measurements
+	- write_online_results: function(target_set, time_instance_index) called with the TargetSet of the
+		maximum importance weight particle when run_online and time_instance_index >= online_delay,
+		before the time instance's snapshots are pushed on the living_targets_q's
+	"""
+	assert(time_instance_index == state.time_instance_count), (time_instance_index, state.time_instance_count)
+	frame_start_time = time.time()
+	config = state.config
+	online_delay = config.online_delay
+	if config.frame_time_budget is None:
+		deadline = None
+	else:
+		deadline = frame_start_time + config.frame_time_budget
+	particle_set = state.particle_set
+	print
+	print "time_instance_index = ", time_instance_index, "!!!!!!"
+	time_stamp = frame_measurements[0]
+
+	print "time_stamp = ", time_stamp, "living target count in first particle = ",\
+	particle_set[0].targets.living_count
+	#FRAME_STAGES that start after the deadline
+	overrun_stages = []
+	updated_count = propagate_particles(particle_set, state.target_state_store, config, frame_measurements, state.prev_time_stamp, \
+										deadline, overrun_stages)
+	if updated_count < len(particle_set):
+		print "time budget used up after updating %d of %d particles" % (updated_count, len(particle_set))
+		state.budget_exhausted_count += 1
+	state.total_updated_fraction += float(updated_count)/len(particle_set)
+	normalize_importance_weights(particle_set)
+
+#	if iter%100 == 0:
+#		print iter
+#		display_target_counts(particle_set, time_stamp)
+
+
+	if config.run_online:
+		if time_instance_index >= online_delay:
+			#find the particle that currently has the largest importance weight
+			max_weight_index = find_online_max_weight_index(particle_set.importance_weights, \
+				particle_set.log_importance_weights, \
+				particle_set.get_log_likelihoods() if config.find_max_imprt_times_likelihood else None)
+			cur_max_weight_particle = particle_set[max_weight_index]
+			cur_max_weight_target_set = cur_max_weight_particle.targets
+			print "max weight particle id = ", cur_max_weight_particle.id_
+
+
+		if state.prv_max_weight_particle != None and state.prv_max_weight_particle != cur_max_weight_particle:
+#			print '-'*10
+#			print "Previous max weight particle:"
+#			print "q[0]target IDs before matching:",
+#			for cur_target in state.prv_max_weight_particle.targets.living_targets_q[0][1]:
+#				print cur_target.id_,
+#			print
+#			print "q[1]target IDs before matching:",
+#			for cur_target in state.prv_max_weight_particle.targets.living_targets_q[1][1]:
+#				print cur_target.id_,
+#			print
+#			print "q[2]target IDs before matching:",
+#			for cur_target in state.prv_max_weight_particle.targets.living_targets_q[2][1]:
+#				print cur_target.id_,
+#			print
+			print "cur target IDs before matching:",
+			for cur_target in state.prv_max_weight_particle.targets.living_targets:
+				print cur_target.id_,
+			print
+
+
+#			print "Current max weight particle:"
+#			print "q[0]target IDs before matching:",
+#			for cur_target in cur_max_weight_target_set.living_targets_q[0][1]:
+#				print cur_target.id_,
+#			print
+#			print "q[1]target IDs before matching:",
+#			for cur_target in cur_max_weight_target_set.living_targets_q[1][1]:
+#				print cur_target.id_,
+#			print
+#			print "q[2]target IDs before matching:",
+#			for cur_target in cur_max_weight_target_set.living_targets_q[2][1]:
+#				print cur_target.id_,
+#			print
+			print "cur target IDs before matching:",
+			for cur_target in cur_max_weight_target_set.living_targets:
+				print cur_target.id_,
+			print
+
+
+			#matching is skipped when the time budget is used up, IDs are then kept as they are
+			(target_associations, duplicate_ids) = ({}, {})
+			if (online_delay == 0 or time_instance_index >= online_delay) and \
+			   not check_deadline(deadline, 'id_matching', overrun_stages):
+				if state.prv_max_weight_snapshot is None:
+					prv_max_weight_snapshot = get_online_match_snapshot(state.prv_max_weight_particle.targets)
+				else:
+					prv_max_weight_snapshot = state.prv_max_weight_snapshot
+				(target_associations, duplicate_ids) = match_target_ids(get_online_match_snapshot(cur_max_weight_target_set),\
+													   prv_max_weight_snapshot, state.ids)
+				#replace associated target IDs with the IDs from the previous maximum importance weight
+				#particle for ID conistency in the online results we output
+				replace_online_target_ids(cur_max_weight_target_set, target_associations, duplicate_ids)
+
+
+#			print "q[0]target IDs after matching:",
+#			for cur_target in cur_max_weight_target_set.living_targets_q[0][1]:
+#				print cur_target.id_,
+#			print
+#			print "q[1]target IDs after matching:",
+#			for cur_target in cur_max_weight_target_set.living_targets_q[1][1]:
+#				print cur_target.id_,
+#			print
+#			print "q[2]target IDs after matching:",
+#			for cur_target in cur_max_weight_target_set.living_targets_q[2][1]:
+#				print cur_target.id_,
+#			print
+			print "cur target IDs after matching:",
+			for cur_target in cur_max_weight_target_set.living_targets:
+				print cur_target.id_,
+			print
+
+			print "duplicate IDs:"
+			print duplicate_ids
+			print "target_associations:"
+			print target_associations
+
+		if time_instance_index >= online_delay:
+			state.prv_max_weight_particle = cur_max_weight_particle
+			state.prv_max_weight_snapshot = None
+
+		#write current time step's results to results file
+		if time_instance_index >= online_delay:
+			write_online_results(cur_max_weight_target_set, time_instance_index)
+
+
+		if online_delay != 0:
+			for particle in particle_set:
+				particle.targets.living_targets_q.push(snapshot_living_targets(particle.targets.living_targets, \
+					time_instance_index))
+	
+	if (get_eff_num_particles(particle_set) < len(particle_set)/config.resample_ratio):
+		check_deadline(deadline, 'resampling', overrun_stages)
+		if state.prv_max_weight_particle != None:
+			prv_max_weight_snapshot = get_online_match_snapshot(state.prv_max_weight_particle.targets)
+		perform_resampling(particle_set, config)
+		if state.prv_max_weight_particle != None and not state.prv_max_weight_particle in particle_set:
+			state.prv_max_weight_snapshot = prv_max_weight_snapshot
+		print "resampled on iter: ", time_instance_index
+		state.number_resamplings += 1
+	state.prev_time_stamp = time_stamp
+	state.time_instance_count += 1
+	frame_time = time.time() - frame_start_time
+	state.total_frame_time += frame_time
+	state.max_frame_time = max(state.max_frame_time, frame_time)
+	if config.frame_time_budget is not None and frame_time > config.frame_time_budget:
+		state.over_budget_count += 1
+	for stage in set(overrun_stages):
+		state.overrun_stage_counts[stage] += 1
+
+def print_timing_stats(timing_stats, frame_time_budget):
+	print "time budget of %s seconds used up on %d of %d time instances, exceeded on %d" % (frame_time_budget, \
+		timing_stats['budget_exhausted_count'], timing_stats['frame_count'], timing_stats['over_budget_count'])
+	print "seconds per time instance: mean %f, max %f, mean fraction of particles updated %f" % \
+		(timing_stats['mean_time'], timing_stats['max_time'], timing_stats['mean_updated_fraction'])
+	print "time instances on which a stage started after the time budget was used up:", \
+		", ".join(["%s %d" % (stage, timing_stats['overrun_stage_counts'][stage]) for stage in FRAME_STAGES])
+
+def run_rbpf_on_targetset(target_sets, online_results_filename, config=None, ids=None):
 	"""
 	Measurement class designed to only have 1 measurement/time instance
 	Input:
 	- target_sets: a list where target_sets[i] is a TargetSet containing measurements from
 		the ith measurement source
+	- config: TrackerConfig, None for get_module_tracker_config (the parameters main sets)
+	- ids: IdCounters the particles and targets take their IDs from, None to start from 0
 	Output:
 	- max_weight_target_set: TargetSet from a (could be multiple with equal weight) maximum
 		importance weight particle after processing all measurements
 	- number_resamplings: the number of times resampling was performed
 	"""
-	particle_set = []
-	global NEXT_PARTICLE_ID
-	for i in range(0, N_PARTICLES):
-		particle_set.append(Particle(NEXT_PARTICLE_ID))
-		NEXT_PARTICLE_ID += 1
-	prev_time_stamp = -1
+	if config is None:
+		config = get_module_tracker_config()
+	if ids is None:
+		ids = IdCounters()
+	if config.n_workers > 1:
+		return run_rbpf_on_targetset_parallel(target_sets, online_results_filename, config, ids)
+
+	#sanity check
+	number_time_instances = len(target_sets[0].measurements)
+	for target_set in target_sets:
+		assert(len(target_set.measurements) == number_time_instances)
 
+	def write_online_results(target_set, time_instance_index):
+		target_set.write_online_results(online_results_filename, time_instance_index, number_time_instances)
 
-	#for displaying results
-	time_stamps = []
-	positions = []
+	state = RBPFState(config, ids)
+	for time_instance_index in range(number_time_instances):
+		process_time_instance(state, time_instance_index, get_frame_measurements(target_sets, time_instance_index, config), \
+			write_online_results)
 
-	iter = 0 # for plotting only occasionally
-	number_resamplings = 0
+	max_weight_target_set = state.get_max_weight_target_set()
+	if config.frame_time_budget != None:
+		print_timing_stats(state.get_timing_stats(), config.frame_time_budget)
+
+	run_info = [state.number_resamplings]
+	return (max_weight_target_set, run_info, state.number_resamplings)
+
+
+
+
+def export_particle(particle):
+	"""
+	Output:
+	- exported: a shallow copy of particle that can be pickled and sent to another worker process.
+		The TargetSet's ancestry is flattened into its all_targets list, the shared state store, config
+		and ID counters are not included (each Target pickles its own state, see Target.__getstate__),
+		use import_particle to attach the unpickled particle to a worker's
+	"""
+	exported = copy.copy(particle)
+	exported.config = None
+	exported.ids = None
+	exported.assoc_likelihoods = []
+	exported.assoc_log_likelihoods = []
+	exported.targets = copy.copy(particle.targets)
+	if particle.targets.target_history != None:
+		exported.targets.all_targets = particle.targets.collect_ancestral_targets()
+		all_target_indices = dict([(id(target), index) for (index, target) in enumerate(exported.targets.all_targets)])
+		exported.targets.all_target_indices = [all_target_indices[id(target)] for target in particle.targets.living_targets]
+		exported.targets.target_history = None
+	exported.targets.child_target_history = None
+	exported.targets.state_store = None
+	exported.targets.config = None
+	exported.targets.ids = None
+	return exported
+
+def import_target_set(target_set, target_state_store, config, ids):
+	target_set.state_store = target_state_store
+	target_set.config = config
+	target_set.ids = ids
+	return target_set
+
+def import_particle(particle, target_state_store, config, ids):
+	particle.config = config
+	particle.ids = ids
+	import_target_set(particle.targets, target_state_store, config, ids)
+	return particle
+
+def run_particle_shard_worker(connection, worker_index, shard_size, target_sets, seed, config, ids):
+	"""
+	Worker process of run_rbpf_on_targetset_parallel.  Keeps a shard of the particle set and its
+	TargetStateStore resident for the whole sequence and runs the commands received on connection
+	until it receives ('stop',).
+
+	Inputs:
+	- connection: multiprocessing Connection to the main process
+	- worker_index: index of this worker, its targets get IDs that are unique across workers
+	- shard_size: number of particles in this worker's shard
+	- target_sets: see run_rbpf_on_targetset
+	- seed: seed for this worker's random number generators
+	- config: TrackerConfig
+	- ids: IdCounters of this worker (see get_worker_id_counters), its counters are sent back on stop
+	"""
+	np.random.seed(seed)
+	random.seed(seed)
+
+	target_state_store = TargetStateStore()
+	particles = []
+	for i in range(shard_size):
+		particles.append(Particle(ids.get_particle_id(), config, ids, target_state_store))
+	#weights are normalized over the whole population
+	particle_set = ParticleSet(particles, config.n_particles)
+	#the particle that wrote the last online results, see run_rbpf_on_targetset_parallel, and its
+	#get_online_match_snapshot from before resampling if it was not resampled (see RBPFState)
+	held_particle = None
+	held_snapshot = None
+
+	while True:
+		command = connection.recv()
+		if command[0] == 'propagate':
+			(time_instance_index, prev_time_stamp) = command[1:]
+			propagate_particles(particle_set, target_state_store, config, \
+								get_frame_measurements(target_sets, time_instance_index, config), prev_time_stamp)
+			connection.send((particle_set.log_importance_weights, \
+							 particle_set.get_log_likelihoods() if config.find_max_imprt_times_likelihood else None))
+		elif command[0] == 'normalize':
+			particle_set.log_importance_weights -= command[1]
+			particle_set.importance_weights = np.exp(particle_set.log_importance_weights)
+		elif command[0] == 'is_held':
+			connection.send(particle_set[command[1]] is held_particle)
+		elif command[0] == 'match_snapshot':
+			connection.send(get_online_match_snapshot(particle_set[command[1]].targets))
+		elif command[0] == 'held_match_snapshot':
+			if held_snapshot is None:
+				connection.send(get_online_match_snapshot(held_particle.targets))
+			else:
+				connection.send(held_snapshot)
+		elif command[0] == 'replace_ids':
+			(local_index, target_associations, duplicate_ids) = command[1:]
+			replace_online_target_ids(particle_set[local_index].targets, target_associations, duplicate_ids)
+		elif command[0] == 'write_online':
+			(local_index, online_results_filename, time_instance_index, number_time_instances) = command[1:]
+			held_particle = particle_set[local_index]
+			held_snapshot = None
+			held_particle.targets.write_online_results(online_results_filename, time_instance_index, number_time_instances)
+			connection.send(True)
+		elif command[0] == 'release':
+			held_particle = None
+			held_snapshot = None
+		elif command[0] == 'push_snapshots':
+			for particle in particle_set:
+				particle.targets.living_targets_q.push(snapshot_living_targets(particle.targets.living_targets, command[1]))
+		elif command[0] == 'export':
+			connection.send([export_particle(particle_set[local_index]) for local_index in command[1]])
+		elif command[0] == 'resample':
+			#sources[i] is ('local', index into particle_set) or ('import', index into imported_particles)
+			(sources, imported_particles) = command[1:]
+			imported_particles = [import_particle(particle, target_state_store, config, ids) for particle in imported_particles]
+			ancestors = []
+			for (source, index) in sources:
+				if source == 'local':
+					ancestors.append(index)
+				else:
+					ancestors.append(len(particle_set) + index)
+			if held_particle != None:
+				resampled_held_snapshot = get_online_match_snapshot(held_particle.targets)
+			particle_set.set_particles(resample_particles(particle_set + imported_particles, np.array(ancestors, dtype=int)), \
+									   config.n_particles)
+			if held_particle != None and not held_particle in particle_set:
+				held_snapshot = resampled_held_snapshot
+		elif command[0] == 'export_targets':
+			connection.send(export_particle(particle_set[command[1]]).targets)
+		elif command[0] == 'stop':
+			connection.send((ids.next_particle_id, ids.next_target_id))
+			connection.close()
+			return
+		else:
+			assert(False), command
+
+def get_worker_id_counters(ids, worker_index, n_workers):
+	"""
+	Output:
+	- worker_ids: IdCounters of worker worker_index of run_rbpf_on_targetset_parallel, starting after the
+		IDs given by ids.  The main process uses residue 0 (for duplicate IDs in match_target_ids), worker
+		w uses residue w + 1, so particle and target IDs are unique across processes
+	"""
+	return IdCounters(ids.next_target_id + worker_index + 1, n_workers + 1, ids.next_particle_id + worker_index + 1)
+
+def assign_resampled_particles(ancestors, particle_owners, shard_sizes):
+	"""
+	Assign the resampled particles to workers, keeping as many as possible in the worker that holds
+	their ancestor so that they don't have to be moved between processes
+
+	Inputs:
+	- ancestors: ancestors[i] is the (global) index of the ancestor of resampled particle i
+	- particle_owners: particle_owners[j] is the index of the worker holding particle j
+	- shard_sizes: shard_sizes[w] is the number of particles worker w holds
+
+	Output:
+	- assigned_ancestors: assigned_ancestors[w] is the list of ancestors of worker w's new particles
+	"""
+	assigned_ancestors = [[] for shard_size in shard_sizes]
+	overflow = []
+	for ancestor in ancestors:
+		owner = particle_owners[ancestor]
+		if len(assigned_ancestors[owner]) < shard_sizes[owner]:
+			assigned_ancestors[owner].append(ancestor)
+		else:
+			overflow.append(ancestor)
+	for (worker_index, shard_size) in enumerate(shard_sizes):
+		free_count = shard_size - len(assigned_ancestors[worker_index])
+		assigned_ancestors[worker_index].extend(overflow[:free_count])
+		overflow = overflow[free_count:]
+	assert(len(overflow) == 0)
+	return assigned_ancestors
+
+def run_rbpf_on_targetset_parallel(target_sets, online_results_filename, config, ids):
+	"""
+	Same as run_rbpf_on_targetset, but the particle set is split into config.n_workers shards that are
+	propagated by persistent worker processes.
+	Each frame the workers send their particles' log importance weights, normalization, online result
+	selection and resampling are done here and workers only receive the normalization constant and the
+	ancestors of their resampled particles.  Particles are only sent between processes when a worker
+	gets more offspring than it has room for.  Random numbers come from a different stream per worker,
+	so results are not identical to run_rbpf_on_targetset.
+
+	Inputs and Outputs: see run_rbpf_on_targetset
+	"""
+	assert(not config.adaptive_particle_count), "ADAPTIVE_PARTICLE_COUNT is not supported with N_WORKERS > 1"
+	assert(config.frame_time_budget is None), "FRAME_TIME_BUDGET is not supported with N_WORKERS > 1"
+	(n_particles, n_workers, online_delay) = (config.n_particles, config.n_workers, config.online_delay)
 
-	#sanity check
 	number_time_instances = len(target_sets[0].measurements)
 	for target_set in target_sets:
 		assert(len(target_set.measurements) == number_time_instances)
 
+	shard_sizes = [n_particles//n_workers + (worker_index < n_particles%n_workers) for worker_index in range(n_workers)]
+	#particle j (in the order of the concatenated shards) is particle_local_indices[j] in worker particle_owners[j]
+	particle_owners = []
+	particle_local_indices = []
+	for (worker_index, shard_size) in enumerate(shard_sizes):
+		particle_owners.extend([worker_index for i in range(shard_size)])
+		particle_local_indices.extend(range(shard_size))
+
+	#this process uses residue 0 for duplicate IDs in match_target_ids, see get_worker_id_counters
+	match_ids = IdCounters(ids.next_target_id, n_workers + 1, ids.next_particle_id)
+	seeds = np.random.randint(2**31 - 1, size=n_workers)
+	connections = []
+	workers = []
+	for worker_index in range(n_workers):
+		worker_ids = get_worker_id_counters(ids, worker_index, n_workers)
+		(connection, worker_connection) = multiprocessing.Pipe()
+		worker = multiprocessing.Process(target=run_particle_shard_worker, \
+			args=(worker_connection, worker_index, shard_sizes[worker_index], target_sets, seeds[worker_index], config, \
+				  worker_ids))
+		worker.start()
+		connections.append(connection)
+		workers.append(worker)
 
-	#the particle with the maximum importance weight on the previous time instance 
-	prv_max_weight_particle = None
-
+	number_resamplings = 0
+	prev_time_stamp = -1
+	#the worker holding the particle with the maximum importance weight on the previous time instance
+	prv_max_weight_worker = None
 	for time_instance_index in range(number_time_instances):
-		print
-		print "time_instance_index = ", time_instance_index, "!!!!!!"
 		time_stamp = target_sets[0].measurements[time_instance_index].time
-		for target_set in target_sets:
-			assert(target_set.measurements[time_instance_index].time == time_stamp)
-#		measurements = measurement_set.val
-
-		measurement_lists = []
-		widths = []
-		heights = []
-		measurement_scores = []
-		for target_set in target_sets:
-			measurement_lists.append(target_set.measurements[time_instance_index].val)
-			widths.append(target_set.measurements[time_instance_index].widths)
-			heights.append(target_set.measurements[time_instance_index].heights)
-			measurement_scores.append(target_set.measurements[time_instance_index].scores)
-
-		print "time_stamp = ", time_stamp, "living target count in first particle = ",\
-		particle_set[0].targets.living_count
-		for particle in particle_set:
-			#update particle death probabilities
-			if(prev_time_stamp != -1):
-				particle.assoc_likelihood_cache = {} #clear likelihood cache
-				#Run Kalman filter prediction for all living targets
-				for target in particle.targets.living_targets:
-					dt = time_stamp - prev_time_stamp
-					assert(abs(dt - default_time_step) < .00000001), (dt, default_time_step)
-					target.kf_predict(dt, time_stamp)
-				#update particle death probabilities AFTER kf_predict so that targets that moved
-				#off screen this time instance will be killed
-				particle.update_target_death_probabilities(time_stamp, prev_time_stamp)
-
-		new_target_list = [] #for debugging, list of booleans whether each particle created a new target
-		for particle in particle_set:
-			new_target = particle.update_particle_with_measurement(time_stamp, measurement_lists, widths, heights, measurement_scores)
-			new_target_list.append(new_target)
-		normalize_importance_weights(particle_set)
-		#debugging
-		if DEBUG:
-			assert(len(new_target_list) == N_PARTICLES)
-			for (particle_number, new_target) in enumerate(new_target_list):
-				if new_target:
-					print "\n\n -------Particle %d created a new target-------" % particle_number
-					for particle in particle_set:
-						particle.debug_target_creation()
-					plt.show()
-					break
-		#done debugging
-
-#		if iter%100 == 0:
-#			print iter
-#			display_target_counts(particle_set, time_stamp)
-
-
-		if RUN_ONLINE:
-			if time_instance_index >= ONLINE_DELAY:
-				#find the particle that currently has the largest importance weight
-
-				if FIND_MAX_IMPRT_TIMES_LIKELIHOOD:
-					max_weight = -1
-					for particle in particle_set:
-						if(particle.importance_weight*particle.likelihood_DOUBLE_CHECK_ME > max_weight):
-							max_weight = particle.importance_weight*particle.likelihood_DOUBLE_CHECK_ME
-					cur_max_weight_target_set = None
-					cur_max_weight_particle = None
-					for particle in particle_set:
-						if(particle.importance_weight*particle.likelihood_DOUBLE_CHECK_ME == max_weight):
-							cur_max_weight_target_set = particle.targets		
-							cur_max_weight_particle = particle
-					print "max weight particle id = ", cur_max_weight_particle.id_
-
-				else:
-					max_imprt_weight = -1
-					for particle in particle_set:
-						if(particle.importance_weight > max_imprt_weight):
-							max_imprt_weight = particle.importance_weight
-					cur_max_weight_target_set = None
-					cur_max_weight_particle = None
-					for particle in particle_set:
-						if(particle.importance_weight == max_imprt_weight):
-							cur_max_weight_target_set = particle.targets		
-							cur_max_weight_particle = particle
-					print "max weight particle id = ", cur_max_weight_particle.id_
-
-
-			if prv_max_weight_particle != None and prv_max_weight_particle != cur_max_weight_particle:
-#				print '-'*10
-#				print "Previous max weight particle:"
-#				print "q[0]target IDs before matching:",
-#				for cur_target in prv_max_weight_particle.targets.living_targets_q[0][1]:
-#					print cur_target.id_,
-#				print
-#				print "q[1]target IDs before matching:",
-#				for cur_target in prv_max_weight_particle.targets.living_targets_q[1][1]:
-#					print cur_target.id_,
-#				print
-#				print "q[2]target IDs before matching:",
-#				for cur_target in prv_max_weight_particle.targets.living_targets_q[2][1]:
-#					print cur_target.id_,
-#				print
-				print "cur target IDs before matching:",
-				for cur_target in prv_max_weight_particle.targets.living_targets:
-					print cur_target.id_,
-				print
-
-
-#				print "Current max weight particle:"
-#				print "q[0]target IDs before matching:",
-#				for cur_target in cur_max_weight_target_set.living_targets_q[0][1]:
-#					print cur_target.id_,
-#				print
-#				print "q[1]target IDs before matching:",
-#				for cur_target in cur_max_weight_target_set.living_targets_q[1][1]:
-#					print cur_target.id_,
-#				print
-#				print "q[2]target IDs before matching:",
-#				for cur_target in cur_max_weight_target_set.living_targets_q[2][1]:
-#					print cur_target.id_,
-#				print
-				print "cur target IDs before matching:",
-				for cur_target in cur_max_weight_target_set.living_targets:
-					print cur_target.id_,
-				print
-
-
-				if ONLINE_DELAY == 0:
-					(target_associations, duplicate_ids) = match_target_ids(cur_max_weight_target_set.living_targets,\
-														   prv_max_weight_particle.targets.living_targets)
-					#replace associated target IDs with the IDs from the previous maximum importance weight
-					#particle for ID conistency in the online results we output
-					for cur_target in cur_max_weight_target_set.living_targets:
-						if cur_target.id_ in target_associations:
-							cur_target.id_ = target_associations[cur_target.id_]
-				elif time_instance_index >= ONLINE_DELAY:
-					#print time_instance_index
-					#print cur_max_weight_target_set.living_targets_q
-					#print prv_max_weight_particle.targets.living_targets_q
-					(target_associations, duplicate_ids) = match_target_ids(cur_max_weight_target_set.living_targets_q[0][1],\
-														   prv_max_weight_particle.targets.living_targets_q[0][1])
-					#replace associated target IDs with the IDs from the previous maximum importance weight
-					#particle for ID conistency in the online results we output
-					for q_idx in range(ONLINE_DELAY):
-						for cur_target in cur_max_weight_target_set.living_targets_q[q_idx][1]:
-							if cur_target.id_ in duplicate_ids:
-								cur_target.id_ = duplicate_ids[cur_target.id_]
-							if cur_target.id_ in target_associations:
-								cur_target.id_ = target_associations[cur_target.id_]
-					for cur_target in cur_max_weight_target_set.living_targets:
-						if cur_target.id_ in duplicate_ids:
-							cur_target.id_ = duplicate_ids[cur_target.id_]						
-						if cur_target.id_ in target_associations:
-							cur_target.id_ = target_associations[cur_target.id_]
-
-
-#				print "q[0]target IDs after matching:",
-#				for cur_target in cur_max_weight_target_set.living_targets_q[0][1]:
-#					print cur_target.id_,
-#				print
-#				print "q[1]target IDs after matching:",
-#				for cur_target in cur_max_weight_target_set.living_targets_q[1][1]:
-#					print cur_target.id_,
-#				print
-#				print "q[2]target IDs after matching:",
-#				for cur_target in cur_max_weight_target_set.living_targets_q[2][1]:
-#					print cur_target.id_,
-#				print
-				print "cur target IDs after matching:",
-				for cur_target in cur_max_weight_target_set.living_targets:
-					print cur_target.id_,
-				print
-
-				print "duplicate IDs:"
-				print duplicate_ids
-				print "target_associations:"
-				print target_associations
-
-			if time_instance_index >= ONLINE_DELAY:
-				prv_max_weight_particle = cur_max_weight_particle
-
-			#write current time step's results to results file
-			if time_instance_index >= ONLINE_DELAY:
-				cur_max_weight_target_set.write_online_results(online_results_filename, time_instance_index, number_time_instances)
-
-
-			if ONLINE_DELAY != 0:
-				print "popped on time_instance_index", time_instance_index
-				for particle in particle_set:
-					particle.targets.living_targets_q.popleft()
-
-				for particle in particle_set:
-					particle.targets.living_targets_q.append((time_instance_index, copy.deepcopy(particle.targets.living_targets)))
-		
-		if (get_eff_num_particles(particle_set) < N_PARTICLES/RESAMPLE_RATIO):
-			perform_resampling(particle_set)
-			print "resampled on iter: ", iter
+		for connection in connections:
+			connection.send(('propagate', time_instance_index, prev_time_stamp))
+		log_weights = []
+		log_likelihoods = []
+		for connection in connections:
+			(cur_log_weights, cur_log_likelihoods) = connection.recv()
+			log_weights.append(cur_log_weights)
+			log_likelihoods.append(cur_log_likelihoods)
+		log_weights = np.concatenate(log_weights)
+		if config.find_max_imprt_times_likelihood:
+			log_likelihoods = np.concatenate(log_likelihoods)
+		else:
+			log_likelihoods = None
+
+		log_normalization_constant = get_log_normalization_constant(log_weights)
+		for connection in connections:
+			connection.send(('normalize', log_normalization_constant))
+		log_weights -= log_normalization_constant
+		weights = np.exp(log_weights)
+
+		if config.run_online:
+			if time_instance_index >= online_delay:
+				max_weight_index = find_online_max_weight_index(weights, log_weights, log_likelihoods)
+				cur_max_weight_worker = particle_owners[max_weight_index]
+				cur_local_index = particle_local_indices[max_weight_index]
+
+				if prv_max_weight_worker != None:
+					if prv_max_weight_worker == cur_max_weight_worker:
+						connections[cur_max_weight_worker].send(('is_held', cur_local_index))
+						same_particle = connections[cur_max_weight_worker].recv()
+					else:
+						same_particle = False
+					if not same_particle:
+						connections[cur_max_weight_worker].send(('match_snapshot', cur_local_index))
+						connections[prv_max_weight_worker].send(('held_match_snapshot',))
+						(target_associations, duplicate_ids) = match_target_ids(connections[cur_max_weight_worker].recv(), \
+															   connections[prv_max_weight_worker].recv(), match_ids)
+						connections[cur_max_weight_worker].send(('replace_ids', cur_local_index, target_associations, duplicate_ids))
+					if prv_max_weight_worker != cur_max_weight_worker:
+						connections[prv_max_weight_worker].send(('release',))
+				prv_max_weight_worker = cur_max_weight_worker
+
+				connections[cur_max_weight_worker].send(('write_online', cur_local_index, online_results_filename, \
+														time_instance_index, number_time_instances))
+				connections[cur_max_weight_worker].recv()
+
+			if online_delay != 0:
+				for connection in connections:
+					connection.send(('push_snapshots', time_instance_index))
+
+		if (1.0/np.dot(weights, weights) < n_particles/config.resample_ratio):
+			ancestors = get_resampling_ancestors(weights, config.resampling_scheme)
+			assigned_ancestors = assign_resampled_particles(ancestors, particle_owners, shard_sizes)
+			#export the ancestors that are assigned to a different worker than their own
+			exported_indices = [[] for connection in connections]
+			for (worker_index, cur_ancestors) in enumerate(assigned_ancestors):
+				for ancestor in cur_ancestors:
+					owner = particle_owners[ancestor]
+					if owner != worker_index and not particle_local_indices[ancestor] in exported_indices[owner]:
+						exported_indices[owner].append(particle_local_indices[ancestor])
+			exported_particles = {}
+			for (owner, connection) in enumerate(connections):
+				if len(exported_indices[owner]) > 0:
+					connection.send(('export', exported_indices[owner]))
+					for (local_index, particle) in zip(exported_indices[owner], connection.recv()):
+						exported_particles[(owner, local_index)] = particle
+
+			for (worker_index, cur_ancestors) in enumerate(assigned_ancestors):
+				sources = []
+				imported_particles = []
+				imported_ancestors = {}
+				for ancestor in cur_ancestors:
+					owner = particle_owners[ancestor]
+					local_index = particle_local_indices[ancestor]
+					if owner == worker_index:
+						sources.append(('local', local_index))
+					else:
+						if not ancestor in imported_ancestors:
+							imported_ancestors[ancestor] = len(imported_particles)
+							imported_particles.append(exported_particles[(owner, local_index)])
+						sources.append(('import', imported_ancestors[ancestor]))
+				connections[worker_index].send(('resample', sources, imported_particles))
+			weights = np.empty(n_particles)
+			weights.fill(1.0/n_particles)
+			print "resampled on time instance: ", time_instance_index
 			number_resamplings += 1
 		prev_time_stamp = time_stamp
 
-		iter+=1
+	max_weight_index = get_last_max_index(weights)
+	connections[particle_owners[max_weight_index]].send(('export_targets', particle_local_indices[max_weight_index]))
+	max_weight_target_set = import_target_set(connections[particle_owners[max_weight_index]].recv(), None, config, ids)
 
-	max_imprt_weight = -1
-	for particle in particle_set:
-		if(particle.importance_weight > max_imprt_weight):
-			max_imprt_weight = particle.importance_weight
-	max_weight_target_set = None
-	for particle in particle_set:
-		if(particle.importance_weight == max_imprt_weight):
-			max_weight_target_set = particle.targets
+	#the workers counted with copies of ids, later runs start after the largest ID any process gave
+	next_ids = [(match_ids.next_particle_id, match_ids.next_target_id)]
+	for (connection, worker) in zip(connections, workers):
+		connection.send(('stop',))
+		next_ids.append(connection.recv())
+		worker.join()
+	ids.next_particle_id = max([next_particle_id for (next_particle_id, next_target_id) in next_ids])
+	ids.next_target_id = max([next_target_id for (next_particle_id, next_target_id) in next_ids])
 
 	run_info = [number_resamplings]
 	return (max_weight_target_set, run_info, number_resamplings)
 
+#names of the module globals holding the parameters returned by learn_parameters, in order (set by main,
+#see get_module_tracker_config)
+LEARNED_PARAMETER_NAMES = ['SCORE_INTERVALS', 'TARGET_EMISSION_PROBS', 'CLUTTER_PROBABILITIES', 'BIRTH_PROBABILITIES', \
+						   'MEAS_NOISE_COVS', 'BORDER_DEATH_PROBABILITIES', 'NOT_BORDER_DEATH_PROBABILITIES']
+#names of the module globals that are the defaults of the settings of a TrackerConfig
+TRACKER_SETTING_NAMES = ['USE_CREATE_CHILD', 'RUN_ONLINE', 'ONLINE_DELAY', 'ONLINE_ONLY', 'FIND_MAX_IMPRT_TIMES_LIKELIHOOD', \
+						 'MAX_1_MEAS_UPDATE', 'N_WORKERS', 'RESAMPLE_RATIO', 'RESAMPLING_SCHEME', 'ADAPTIVE_PARTICLE_COUNT', \
+						 'MIN_PARTICLES', 'MAX_PARTICLES', 'KLD_EPSILON', 'KLD_Z', 'FRAME_TIME_BUDGET', \
+						 'ANYTIME_PRIORITY', 'USE_PYTHON_GAUSSIAN', 'GATING_PROBABILITY', 'USE_CONSTANT_R']
+
+def get_probability_table(rows):
+	"""
+	Output:
+	- table: rows as a 2d array, or a list of 1d arrays if the rows have different lengths
+	"""
+	if len(set([len(row) for row in rows])) == 1:
+		return np.array(rows, dtype=float)
+	else:
+		return [np.array(row, dtype=float) for row in rows]
+
+class TrackerConfig(object):
+	"""
+	Parameters of a Tracker: the learned parameters (see learn_parameters), stored as NumPy arrays, the
+	number of particles and settings (named like the module globals in TRACKER_SETTING_NAMES, with the
+	current values of those globals as defaults).  Every setting is also an attribute named in lower
+	case (e.g. config.online_delay for ONLINE_DELAY), which is what the rbpf reads.
+	"""
+	def __init__(self, learned_parameters, n_particles, **settings):
+		(score_intervals, target_emission_probs, clutter_probabilities, birth_probabilities, meas_noise_covs, \
+			border_death_probabilities, not_border_death_probabilities) = learned_parameters
+		#learned_parameters[i] for measurement source i
+		self.score_intervals = [np.asarray(cur_score_intervals) for cur_score_intervals in score_intervals]
+		self.target_emission_probs = [np.asarray(emission_probs, dtype=float) for emission_probs in target_emission_probs]
+		self.clutter_probabilities = [get_probability_table(probabilities) for probabilities in clutter_probabilities]
+		self.birth_probabilities = [get_probability_table(probabilities) for probabilities in birth_probabilities]
+		self.meas_noise_covs = [np.asarray(covs, dtype=float).reshape(-1, 2, 2) for covs in meas_noise_covs]
+		self.border_death_probabilities = np.asarray(border_death_probabilities, dtype=float)
+		self.not_border_death_probabilities = np.asarray(not_border_death_probabilities, dtype=float)
+
+		self.n_particles = n_particles
+		for name in settings:
+			assert(name in TRACKER_SETTING_NAMES), name
+		self.settings = dict([(name, settings.get(name, globals()[name])) for name in TRACKER_SETTING_NAMES])
+		for (name, value) in self.settings.items():
+			setattr(self, name.lower(), value)
+		assert(self.run_online or not self.online_only), "ONLINE_ONLY requires RUN_ONLINE"
+
+	def __deepcopy__(self, memo):
+		#never modified, copying a particle never copies its config
+		return self
+
+	def get_learned_parameters(self):
+		return (self.score_intervals, self.target_emission_probs, self.clutter_probabilities, self.birth_probabilities, \
+				self.meas_noise_covs, self.border_death_probabilities, self.not_border_death_probabilities)
+
+def get_module_tracker_config():
+	"""
+	Output:
+	- config: TrackerConfig of the learned parameters, N_PARTICLES and settings in the module globals (as
+		set by main)
+	"""
+	module_globals = globals()
+	return TrackerConfig([module_globals[name] for name in LEARNED_PARAMETER_NAMES], N_PARTICLES)
+
+class Tracker(object):
+	"""
+	Runs the rbpf with its own TrackerConfig and target and particle ID counters, so trackers with different
+	configurations (and the detections they were loaded with) can be used in one process.  The configuration
+	and counters are passed to the rbpf, which doesn't read or change module globals.
+	"""
+	def __init__(self, config):
+		self.config = config
+		#all targets have unique IDs, even if they are in different particles or sequences
+		self.ids = IdCounters()
+		#RBPFState of the sequence being streamed with step, None before its first frame
+		self.rbpf_state = None
+		#TargetSet the online results of the last frame given to step were taken from
+		self.online_target_set = None
+		#RBPFState.get_timing_stats of the last sequence flush ended
+		self.last_timing_stats = None
+
+	def run(self, target_sets, online_results_filename):
+		"""
+		run_rbpf_on_targetset with this tracker's configuration, see run_rbpf_on_targetset
+		"""
+		return run_rbpf_on_targetset(target_sets, online_results_filename, self.config, self.ids)
+
+	def step(self, frame_idx, detections_by_source):
+		"""
+		Process one frame of a sequence whose detections arrive a frame at a time.  Frames are numbered
+		from 0 and must be given in order, call flush after the last frame of the sequence.  With
+		ONLINE_ONLY the memory held doesn't grow with the number of frames (e.g. for live detector output).
+
+		Input:
+		- frame_idx: index of the frame in the sequence
+		- detections_by_source: a list where detections_by_source[i] is (boxes, scores), the detections
+			from the ith measurement source in this frame (see get_detection_measurement)
+
+		Output:
+		- confirmed_tracks: TargetSnapshot of the online results for frame frame_idx - ONLINE_DELAY (the
+			rows run writes to its online results file for that frame), None for the first ONLINE_DELAY
+			frames or if RUN_ONLINE is False
+		"""
+		assert(self.config.n_workers <= 1), "step runs the rbpf in this process"
+		if self.rbpf_state is None:
+			self.rbpf_state = RBPFState(self.config, self.ids)
+		time_stamp = frame_idx*default_time_step
+		measurements = [get_detection_measurement(time_stamp, boxes, scores) for (boxes, scores) in detections_by_source]
+
+		#(target_set, snapshot) of the online results if they are output this frame
+		online_results = []
+		def write_online_results(target_set, time_instance_index):
+			online_results.append((target_set, target_set.get_online_snapshot(time_instance_index)))
+		process_time_instance(self.rbpf_state, frame_idx, collect_frame_measurements(measurements, self.config), \
+							  write_online_results)
+		if len(online_results) == 0:
+			return None
+		(self.online_target_set, confirmed_tracks) = online_results[0]
+		return confirmed_tracks
+
+	def flush(self):
+		"""
+		End the sequence given to step, the next call to step starts a new sequence from frame 0.
+
+		Output:
+		- confirmed_tracks: list of TargetSnapshots of the online results for the frames after the last
+			snapshot step returned, in order (the rows run writes to its online results file after the
+			last frame)
+		- max_weight_target_set: TargetSet from a maximum importance weight particle, the offline results
+			(see write_targets_to_KITTI_format), None if no frame was given to step or with ONLINE_ONLY
+		"""
+		online_delay = self.config.online_delay
+		confirmed_tracks = []
+		if self.online_target_set != None and online_delay != 0:
+			last_frame_idx = self.rbpf_state.time_instance_count - 1
+			for q_idx in range(online_delay):
+				delayed_snapshot = self.online_target_set.living_targets_q[q_idx]
+				assert(delayed_snapshot.frame_idx == last_frame_idx - online_delay + 1 + q_idx), \
+					(delayed_snapshot.frame_idx, last_frame_idx, online_delay)
+				confirmed_tracks.append(delayed_snapshot)
+		max_weight_target_set = None
+		if self.rbpf_state != None:
+			if not self.config.online_only:
+				max_weight_target_set = self.rbpf_state.get_max_weight_target_set()
+			self.last_timing_stats = self.rbpf_state.get_timing_stats()
+		self.rbpf_state = None
+		self.online_target_set = None
+		return (confirmed_tracks, max_weight_target_set)
+
+	def get_timing_stats(self):
+		"""
+		Output:
+		- timing_stats: RBPFState.get_timing_stats of the sequence being streamed with step, or of the
+			last sequence flush ended if step hasn't been called since
+		"""
+		if self.rbpf_state != None:
+			return self.rbpf_state.get_timing_stats()
+		return self.last_timing_stats
+
+	def write_targets_to_KITTI_format(self, target_set, num_frames, filename):
+		"""
+		Write the offline results target_set (returned by run or flush) in KITTI format
+		"""
+		target_set.write_targets_to_KITTI_format(num_frames, filename)
 
 def test_read_write_data_KITTI(target_set):
 	"""
@@ -1729,7 +3517,7 @@ def test_read_write_data_KITTI(target_set):
 	- max_weight_target_set: TargetSet from a (could be multiple with equal weight) maximum
 		importance weight particle after processing all measurements
 	"""
-	output_target_set = TargetSet()
+	output_target_set = TargetSet(get_module_tracker_config(), IdCounters())
 
 	for measurement_set in target_set.measurements:
 		time_stamp = measurement_set.time
@@ -1756,15 +3544,16 @@ def convert_to_clearmetrics_dictionary(target_set, all_time_stamps):
 	"""
 	target_dict = {}
 	for target in target_set.all_targets:
+		trajectory_rows = get_trajectory_rows_by_frame(target)
 		for t in all_time_stamps:
 			if target == target_set.all_targets[0]: #this is the first target
-				if t in target.all_time_stamps: #target exists at this time
-					target_dict[t] = [target.all_states[target.all_time_stamps.index(t)]]
+				if get_frame_index(t) in trajectory_rows: #target exists at this time
+					target_dict[t] = [trajectory_rows[get_frame_index(t)]]
 				else: #target doesn't exit at this time
 					target_dict[t] = [None]
 			else: #this isn't the first target
-				if t in target.all_time_stamps: #target exists at this time
-					target_dict[t].append(target.all_states[target.all_time_stamps.index(t)])
+				if get_frame_index(t) in trajectory_rows: #target exists at this time
+					target_dict[t].append(trajectory_rows[get_frame_index(t)])
 				else: #target doesn't exit at this time
 					target_dict[t].append(None)
 	return target_dict
@@ -1804,128 +3593,248 @@ def calc_tracking_performance(ground_truth_ts, estimated_ts):
 	estimated_ts.plot_all_target_locations("Estimated Tracks")      
 	plt.show()
 
-class KittiTarget:
+def get_snapshot_boxes(snapshot):
+	"""
+	Output:
+	- boxes: array of shape (n, 4), the bounding boxes [left, top, right, bottom] of the targets in the
+		TargetSnapshot snapshot
 	"""
-	Used for computing target associations when outputing online results and the particle with
-	the largest importance weight changes
+	rows = snapshot.rows
+	half_widths = rows[:, TRAJ_WIDTH]/2.0
+	half_heights = rows[:, TRAJ_HEIGHT]/2.0
+	return np.column_stack((rows[:, TRAJ_X] - half_widths, rows[:, TRAJ_Y] - half_heights, \
+							rows[:, TRAJ_X] + half_widths, rows[:, TRAJ_Y] + half_heights))
 
-	Values:
-	- x1: smaller x coordinate of bounding box
-	- x2: larger x coordinate of bounding box
-	- y1: smaller y coordinate of bounding box
-	- y2: larger y coordinate of bounding box
-	"""
-	def __init__(self, x1, x2, y1, y2):
-		self.x1 = x1
-		self.x2 = x2
-		self.y1 = y1
-		self.y2 = y2
-
-def boxoverlap(a,b):
-    """
-    	Copied from  KITTI devkit_tracking/python/evaluate_tracking.py
-
-        boxoverlap computes intersection over union for bbox a and b in KITTI format.
-        If the criterion is 'union', overlap = (a inter b) / a union b).
-        If the criterion is 'a', overlap = (a inter b) / a, where b should be a dontcare area.
-    """
-    x1 = max(a.x1, b.x1)
-    y1 = max(a.y1, b.y1)
-    x2 = min(a.x2, b.x2)
-    y2 = min(a.y2, b.y2)
-    
-    w = x2-x1
-    h = y2-y1
-
-    if w<=0. or h<=0.:
-        return 0.
-    inter = w*h
-    aarea = (a.x2-a.x1) * (a.y2-a.y1)
-    barea = (b.x2-b.x1) * (b.y2-b.y1)
-    # intersection over union overlap
-    o = inter / float(aarea+barea-inter)
-    return o
-
-def convert_targets(input_targets):
-	kitti_format_targets = []
-	for cur_target in input_targets:
-		x_pos = cur_target.x[0][0]
-		y_pos = cur_target.x[2][0]
-		width = cur_target.width
-		height = cur_target.height
-
-		left = x_pos - width/2.0
-		top = y_pos - height/2.0
-		right = x_pos + width/2.0
-		bottom = y_pos + height/2.0		
-
-		kitti_format_targets.append(KittiTarget(left, right, top, bottom))
-	return kitti_format_targets
-
-def match_target_ids(particle1_targets, particle2_targets):
+def match_target_ids(particle1_targets, particle2_targets, ids):
 	"""
 	Use the same association as in  KITTI devkit_tracking/python/evaluate_tracking.py
 
 	Inputs:
-	- particle1_targets: a list of targets from particle1
-	- particle2_targets: a list of targets from particle2
+	- particle1_targets: TargetSnapshot of targets from particle1
+	- particle2_targets: TargetSnapshot of targets from particle2
+	- ids: IdCounters the new IDs of duplicate targets are taken from
 
 	Output:
 	- associations: a dictionary of associations between targets in particle1 and particle2.  
 		associations[particle1_targetID] = particle2_targetID where particle1_targetID and
-		particle2_targetID are IDs of associated targets
+		particle2_targetID are IDs of associated targets.  particle1_targetID is the ID after
+		replacing duplicate IDs
+	- duplicate_ids: a dictionary of new IDs for targets in particle1 that have the same ID as a
+		target in particle2.  duplicate_ids[old_ID] = new_ID, the caller replaces the IDs
 	"""
-	kitti_targets1 = convert_targets(particle1_targets)
-	kitti_targets2 = convert_targets(particle2_targets)
-
 	#if any targets in particle1 have the same ID as a target in particle2,
 	#assign the particle1 target a new ID
 	duplicate_ids = {}
-	global NEXT_TARGET_ID
-	p2_target_ids = []
-	for cur_t2 in particle2_targets:
-		p2_target_ids.append(cur_t2.id_)
-	for cur_t1 in particle1_targets:
-		if cur_t1.id_ in p2_target_ids:
-			duplicate_ids[cur_t1.id_] = NEXT_TARGET_ID
-			cur_t1.id_ = NEXT_TARGET_ID
-			NEXT_TARGET_ID += 1
-
-	hm = Munkres()
-	max_cost = 1e9
-	cost_matrix = []
-	for cur_t1 in kitti_targets1:
-		cost_row = []
-		for cur_t2 in kitti_targets2:
-			# overlap == 1 is cost ==0
-			c = 1-boxoverlap(cur_t1,cur_t2)
-			# gating for boxoverlap
-			if c<=.5:
-				cost_row.append(c)
-			else:
-				cost_row.append(max_cost)
-		cost_matrix.append(cost_row)
-
-	if len(kitti_targets1) is 0:
-		cost_matrix=[[]]
-
-	# associate
-	association_matrix = hm.compute(cost_matrix)
+	p2_target_ids = list(particle2_targets.ids)
+	particle1_ids = []
+	for cur_t1_id in particle1_targets.ids:
+		if cur_t1_id in p2_target_ids:
+			new_id = ids.get_target_id()
+			duplicate_ids[cur_t1_id] = new_id
+			cur_t1_id = new_id
+		particle1_ids.append(cur_t1_id)
+
+	# overlap == 1 is cost ==0, gating for boxoverlap at cost .5
+	cost_matrix = 1 - get_box_overlaps(get_snapshot_boxes(particle1_targets), get_snapshot_boxes(particle2_targets))
 	associations = {}
-	for row,col in association_matrix:
-		c = cost_matrix[row][col]
-		if c < max_cost:
-			associations[particle1_targets[row].id_] = particle2_targets[col].id_
+	for (row, col) in solve_gated_assignment(cost_matrix, .5):
+		associations[particle1_ids[row]] = particle2_targets.ids[col]
 
 	return (associations, duplicate_ids)
 
 
+def get_sequence_names_and_frame_counts():
+	"""
+	Output:
+	- sequence_name: sequence_name[i] is the name of KITTI training sequence i
+	- n_frames: n_frames[i] is the number of frames in sequence i
+	"""
+	filename_mapping = "./KITTI_helpers/data/evaluate_tracking.seqmap"
+	n_frames         = []
+	sequence_name    = []
+	with open(filename_mapping, "r") as fh:
+	    for i,l in enumerate(fh):
+	        fields = l.split(" ")
+	        sequence_name.append("%04d" % int(fields[0]))
+	        n_frames.append(int(fields[3]) - int(fields[2]))
+	fh.close() 
+	assert(len(n_frames) == len(sequence_name))
+	return (sequence_name, n_frames)
+
+def get_results_folder(num_particles, include_ignored_gt, include_dontcare_in_gt, use_regionlets_and_lsvm, \
+					   sort_dets_on_intervals, use_regionlets=None):
+	description_of_run = get_description_of_run(include_ignored_gt, include_dontcare_in_gt, 
+						   use_regionlets_and_lsvm, sort_dets_on_intervals, use_regionlets)
+	results_folder_name = '%s/%d_particles' % (description_of_run, num_particles)
+	return '%s/%s/%s' % (DIRECTORY_OF_ALL_RESULTS, CUR_EXPERIMENT_BATCH_NAME, results_folder_name)
+
+#False doesn't really make sense because when actually running without ground truth information we don't know
+#whether or not a detection is ignored, but debugging. (An ignored detection is a detection not associated with
+#a ground truth object that would be associated with a don't care ground truth object if they were included.  It 
+#can also be a neighobring object type, e.g. "van" instead of "car", but this never seems to occur in the data.
+#If this occured, it would make sense to try excluding these detections.)
+INCLUDE_IGNORED_DETECTIONS = True
+
+def get_detection_score_intervals(sort_dets_on_intervals):
+	"""
+	Output:
+	- REGIONLETS_SCORE_INTERVALS, LSVM_SCORE_INTERVALS: score intervals of the regionlets and lsvm detections
+	"""
+	if sort_dets_on_intervals:
+		REGIONLETS_SCORE_INTERVALS = [i for i in range(2, 20)]
+		LSVM_SCORE_INTERVALS = [i/2.0 for i in range(0, 6)]
+	else:
+		REGIONLETS_SCORE_INTERVALS = [2]
+		LSVM_SCORE_INTERVALS = [0]
+	return (REGIONLETS_SCORE_INTERVALS, LSVM_SCORE_INTERVALS)
+
+def load_detections(include_ignored_gt, include_dontcare_in_gt, use_regionlets_and_lsvm, sort_dets_on_intervals):
+	"""
+	Load the ground truth and detections of every sequence, so learn_parameters can learn the parameters
+	of every sequence from them without loading them again
+
+	Output:
+	- detections: tuple (measurementTargetSetsBySequence, loaded_detections)
+		measurementTargetSetsBySequence: see learn_parameters
+		loaded_detections: loaded_detections[det_method] is learn_params1.load_detections of det_method
+	"""
+	(REGIONLETS_SCORE_INTERVALS, LSVM_SCORE_INTERVALS) = get_detection_score_intervals(sort_dets_on_intervals)
+	if use_regionlets_and_lsvm:
+		det_methods = [('regionlets', REGIONLETS_SCORE_INTERVALS), ('lsvm', LSVM_SCORE_INTERVALS)]
+	else:
+		det_methods = [('regionlets', REGIONLETS_SCORE_INTERVALS)]
+	loaded_detections = {}
+	for (det_method, score_intervals) in det_methods:
+		loaded_detections[det_method] = load_method_detections(score_intervals[0], det_method, obj_class = "car", \
+			include_ignored_gt = include_ignored_gt, include_dontcare_in_gt = include_dontcare_in_gt, \
+			include_ignored_detections = INCLUDE_IGNORED_DETECTIONS)
+	measurementTargetSetsBySequence = [list(seq_target_sets) for seq_target_sets in \
+		zip(*[loaded_detections[det_method]['measurement_target_sets'] for (det_method, score_intervals) in det_methods])]
+	return (measurementTargetSetsBySequence, loaded_detections)
+
+def learn_parameters(seq_idx, include_ignored_gt, include_dontcare_in_gt, use_regionlets_and_lsvm, sort_dets_on_intervals, \
+					 detections=None):
+	"""
+	Learn the model parameters from every training sequence except seq_idx
+
+	Input:
+	- detections: load_detections(include_ignored_gt, include_dontcare_in_gt, use_regionlets_and_lsvm,
+		sort_dets_on_intervals) to learn from, or None to load the detections of every sequence
+
+	Output:
+	- measurementTargetSetsBySequence: measurementTargetSetsBySequence[i] is the list of TargetSets
+		(one per measurement source) holding the detections of sequence i
+	- learned_parameters: tuple of the learned parameters, pass to TrackerConfig before
+		running the rbpf
+	"""
+	include_ignored_detections = INCLUDE_IGNORED_DETECTIONS
+	(REGIONLETS_SCORE_INTERVALS, LSVM_SCORE_INTERVALS) = get_detection_score_intervals(sort_dets_on_intervals)
+	loaded_detections = None if detections is None else detections[1]
+
+	#train on all training sequences, except the current sequence we are testing on
+	training_sequences = [i for i in [i for i in range(21)] if i != seq_idx]
+
+	#use regionlets and lsvm detections
+	if use_regionlets_and_lsvm:
+		score_intervals = [REGIONLETS_SCORE_INTERVALS, LSVM_SCORE_INTERVALS]
+		(measurementTargetSetsBySequence, target_emission_probs, clutter_probabilities, birth_probabilities,\
+			meas_noise_covs, border_death_probabilities, not_border_death_probabilities) = \
+				get_meas_target_sets_lsvm_and_regionlets(training_sequences, REGIONLETS_SCORE_INTERVALS, \
+				LSVM_SCORE_INTERVALS, obj_class = "car", doctor_clutter_probs = True, doctor_birth_probs = True,\
+				include_ignored_gt = include_ignored_gt, include_dontcare_in_gt = include_dontcare_in_gt, \
+				include_ignored_detections = include_ignored_detections, loaded_detections = loaded_detections)
+
+	#only use regionlets detections
+	else: 
+		score_intervals = [REGIONLETS_SCORE_INTERVALS]
+		(measurementTargetSetsBySequence, target_emission_probs, clutter_probabilities, birth_probabilities,\
+			meas_noise_covs, border_death_probabilities, not_border_death_probabilities) = \
+			get_meas_target_sets_regionlets_general_format(training_sequences, REGIONLETS_SCORE_INTERVALS, \
+			obj_class = "car", doctor_clutter_probs = True, doctor_birth_probs = True, \
+			include_ignored_gt = include_ignored_gt, include_dontcare_in_gt = include_dontcare_in_gt, \
+			include_ignored_detections = include_ignored_detections, loaded_detections = loaded_detections)
+
+	learned_parameters = (score_intervals, target_emission_probs, clutter_probabilities, birth_probabilities, \
+						  meas_noise_covs, border_death_probabilities, not_border_death_probabilities)
+	return (measurementTargetSetsBySequence, learned_parameters)
+
+#run indices are smaller than this, see get_run_seed
+MAX_RUNS_PER_SEQUENCE = 10000
+
+def get_run_seed(run_idx, seq_idx):
+	"""
+	Output:
+	- seed: seed of the random number generators for run run_idx of sequence seq_idx, different for every
+		(run, sequence) so runs are independent and the same on every machine so a run can be repeated
+	"""
+	assert(0 <= run_idx and run_idx < MAX_RUNS_PER_SEQUENCE), run_idx
+	return seq_idx*MAX_RUNS_PER_SEQUENCE + run_idx
+
+def run_sequence(config, measurementTargetSetsBySequence, results_folder, run_idx, seq_idx, sequence_name, n_frames, \
+				 seed=None):
+	"""
+	Run the rbpf on sequence seq_idx with a new Tracker, write the results to
+	results_folder/results_by_run/run_<run_idx>/<sequence name>.txt and then write the
+	seq_<seq_idx>_done.txt file that marks the run as complete
+
+	Inputs:
+	- config: TrackerConfig
+	- measurementTargetSetsBySequence: see learn_parameters
+	- sequence_name, n_frames: see get_sequence_names_and_frame_counts
+	- seed: if not None, np.random and random are seeded with it before the run (see get_run_seed) and it
+		is written to the seq_<seq_idx>_done.txt file
+	"""
+	if seed is not None:
+		np.random.seed(seed)
+		random.seed(seed)
+	tracker = Tracker(config)
+
+#debug
+	indicate_run_started_filename = '%s/results_by_run/run_%d/seq_%d_started.txt' % (results_folder, run_idx, seq_idx)
+	run_started_f = open(indicate_run_started_filename, 'w')
+	run_started_f.write("This run was started\n")
+	run_started_f.close()
+#end debug
+	indicate_run_complete_filename = '%s/results_by_run/run_%d/seq_%d_done.txt' % (results_folder, run_idx, seq_idx)
+	assert(len(n_frames) == len(measurementTargetSetsBySequence))
+
+	t0 = time.time()
+	results_filename = '%s/results_by_run/run_%d/%s.txt' % (results_folder, run_idx, sequence_name[seq_idx])
+
+	print "Processing sequence: ", seq_idx
+	tA = time.time()
+	(estimated_ts, cur_seq_info, number_resamplings) = tracker.run(measurementTargetSetsBySequence[seq_idx], results_filename)
+	print "done processing sequence: ", seq_idx
+	tB = time.time()
+
+	print "about to write results"
+	if not config.run_online:
+		tracker.write_targets_to_KITTI_format(estimated_ts, num_frames = n_frames[seq_idx], filename = results_filename)
+	print "done write results"
+	print "running the rbpf took %f seconds" % (tB-tA)
+	t1 = time.time()
+
+	stdout = sys.stdout
+	sys.stdout = open(indicate_run_complete_filename, 'w')
+
+	print "This run is finished (and this file indicates the fact)\n"
+	print "Resampling was performed %d times\n" % number_resamplings
+	print "This run took %f seconds\n" % (t1-t0)
+	print "Random seed: %s\n" % seed
+
+	print "TARGET_EMISSION_PROBS=", config.target_emission_probs
+	print "CLUTTER_PROBABILITIES=", config.clutter_probabilities
+	print "BIRTH_PROBABILITIES=", config.birth_probabilities
+	print "MEAS_NOISE_COVS=", config.meas_noise_covs
+	print "BORDER_DEATH_PROBABILITIES=", config.border_death_probabilities
+	print "NOT_BORDER_DEATH_PROBABILITIES=", config.not_border_death_probabilities
+
+	sys.stdout.close()
+	sys.stdout = stdout
+
+
 if __name__ == "__main__":
 	
-	NEXT_PARTICLE_ID = 0
-	if RUN_ONLINE:
-		NEXT_TARGET_ID = 0 #all targets have unique IDs, even if they are in different particles
-	
 	# check for correct number of arguments. if user_sha and email are not supplied,
 	# no notification email is sent (this option is used for auto-updates)
 	if len(sys.argv)!=10:
@@ -1966,22 +3875,13 @@ if __name__ == "__main__":
 	DESCRIPTION_OF_RUN = get_description_of_run(include_ignored_gt, include_dontcare_in_gt, 
 						   use_regionlets_and_lsvm, sort_dets_on_intervals, use_regionlets)
 
-	results_folder_name = '%s/%d_particles' % (DESCRIPTION_OF_RUN, N_PARTICLES)
 #	results_folder = '%s/rbpf_KITTI_results_par_exec_trainAllButCurSeq_10runs_dup3/%s' % (DIRECTORY_OF_ALL_RESULTS, results_folder_name)
-	results_folder = '%s/%s/%s' % (DIRECTORY_OF_ALL_RESULTS, CUR_EXPERIMENT_BATCH_NAME, results_folder_name)
+	results_folder = get_results_folder(N_PARTICLES, include_ignored_gt, include_dontcare_in_gt, use_regionlets_and_lsvm, \
+										sort_dets_on_intervals, use_regionlets)
 
-	filename_mapping = "./KITTI_helpers/data/evaluate_tracking.seqmap"
-	n_frames         = []
-	sequence_name    = []
-	with open(filename_mapping, "r") as fh:
-	    for i,l in enumerate(fh):
-	        fields = l.split(" ")
-	        sequence_name.append("%04d" % int(fields[0]))
-	        n_frames.append(int(fields[3]) - int(fields[2]))
-	fh.close() 
+	(sequence_name, n_frames) = get_sequence_names_and_frame_counts()
 	print n_frames
 	print sequence_name     
-	assert(len(n_frames) == len(sequence_name))
 
 	if peripheral == 'setup': #create directories
 		print 'begin setup'
@@ -2007,17 +3907,22 @@ if __name__ == "__main__":
 				if (not os.path.isfile(cur_run_complete_filename)):
 					all_runs_complete = False
 		if all_runs_complete:
+			#evaluate every run on all sequences and on each sequence independently at once, so
+			#ground truth is loaded once and all evaluations share one process pool
+			run_folders = get_run_folders(results_folder + "/results_by_run")
+			seq_idx_groups = [SEQUENCES_TO_PROCESS] + [[cur_seq_idx] for cur_seq_idx in SEQUENCES_TO_PROCESS]
+			(metrics_by_group, output_by_group) = evaluate_runs(run_folders, seq_idx_groups)
+
 			#evaluate the results when all runs are complete
 			eval_metrics_file = results_folder + '/evaluation_metrics.txt' # + operator used for string concatenation!
 			stdout = sys.stdout
 			sys.stdout = open(eval_metrics_file, 'w')
 
-			runs_completed = eval_results(results_folder + "/results_by_run", SEQUENCES_TO_PROCESS) # + operateor used for string concatenation!
+			runs_completed = eval_results(results_folder + "/results_by_run", SEQUENCES_TO_PROCESS, \
+				evaluated_runs=(metrics_by_group[0], output_by_group[0])) # + operateor used for string concatenation!
 
 			print "Number of runs completed = ", runs_completed
 			print "Description of run: ", DESCRIPTION_OF_RUN
-			print "Cached likelihoods = ", CACHED_LIKELIHOODS
-			print "not cached likelihoods = ", NOT_CACHED_LIKELIHOODS
 			#print "RBPF runtime (sum of all runs) = ", t1-t0
 			print "USE_CONSTANT_R = ", USE_CONSTANT_R
 			print "number of particles = ", N_PARTICLES
@@ -2031,18 +3936,17 @@ if __name__ == "__main__":
 			print "Printing works normally again!"
 
 			#evaluate each sequence independently as well:
-			for cur_seq_idx in SEQUENCES_TO_PROCESS:
+			for (group_idx, cur_seq_idx) in enumerate(SEQUENCES_TO_PROCESS, 1):
 				#evaluate the results when all runs are complete
 				eval_metrics_file = results_folder + '/evaluation_metrics_seq%s.txt' % cur_seq_idx # + operator used for string concatenation!
 				stdout = sys.stdout
 				sys.stdout = open(eval_metrics_file, 'w')
 
-				runs_completed = eval_results(results_folder + "/results_by_run", [cur_seq_idx]) # + operateor used for string concatenation!
+				runs_completed = eval_results(results_folder + "/results_by_run", [cur_seq_idx], \
+					evaluated_runs=(metrics_by_group[group_idx], output_by_group[group_idx])) # + operateor used for string concatenation!
 
 				print "Number of runs completed = ", runs_completed
 				print "Description of run: ", DESCRIPTION_OF_RUN
-				print "Cached likelihoods = ", CACHED_LIKELIHOODS
-				print "not cached likelihoods = ", NOT_CACHED_LIKELIHOODS
 				#print "RBPF runtime (sum of all runs) = ", t1-t0
 				print "USE_CONSTANT_R = ", USE_CONSTANT_R
 				print "number of particles = ", N_PARTICLES
@@ -2050,6 +3954,9 @@ if __name__ == "__main__":
 	#			print "run on sequences: ", SEQUENCES_TO_PROCESS
 	#			print "number of particles = ", N_PARTICLES
 
+				sys.stdout.close()
+				sys.stdout = stdout
+
 		else:
 			#evaluate the results when all runs are complete
 			eval_metrics_file = results_folder + '/evaluation_metrics.txt' # + operator used for string concatenation!
@@ -2068,174 +3975,13 @@ if __name__ == "__main__":
 
 	elif peripheral == 'run':
 		print 'begin run'
-#debug
-		indicate_run_started_filename = '%s/results_by_run/run_%d/seq_%d_started.txt' % (results_folder, run_idx, seq_idx)
-		run_started_f = open(indicate_run_started_filename, 'w')
-		run_started_f.write("This run was started\n")
-		run_started_f.close()
-#end debug
-
-
 		indicate_run_complete_filename = '%s/results_by_run/run_%d/seq_%d_done.txt' % (results_folder, run_idx, seq_idx)
 		#if we haven't already run, run now:
 		if not os.path.isfile(indicate_run_complete_filename):
-
-
-			#False doesn't really make sense because when actually running without ground truth information we don't know
-			#whether or not a detection is ignored, but debugging. (An ignored detection is a detection not associated with
-			#a ground truth object that would be associated with a don't care ground truth object if they were included.  It 
-			#can also be a neighobring object type, e.g. "van" instead of "car", but this never seems to occur in the data.
-			#If this occured, it would make sense to try excluding these detections.)
-			include_ignored_detections = True 
-
-			if sort_dets_on_intervals:
-				MSCNN_SCORE_INTERVALS = [float(i)*.1 for i in range(3,10)]				
-				REGIONLETS_SCORE_INTERVALS = [i for i in range(2, 20)]
-				LSVM_SCORE_INTERVALS = [i/2.0 for i in range(0, 6)]
-		#		REGIONLETS_SCORE_INTERVALS = [i for i in range(2, 16)]
-		#		LSVM_SCORE_INTERVALS = [i/2.0 for i in range(0, 6)]
-			else:
-				MSCNN_SCORE_INTERVALS = [.5]								
-				REGIONLETS_SCORE_INTERVALS = [2]
-				LSVM_SCORE_INTERVALS = [0]
-
-			#set global variables
-			#global SCORE_INTERVALS
-			#global TARGET_EMISSION_PROBS
-			#global CLUTTER_PROBABILITIES
-			#global BIRTH_PROBABILITIES
-			#global MEAS_NOISE_COVS
-			#global BORDER_DEATH_PROBABILITIES
-			#global NOT_BORDER_DEATH_PROBABILITIES
-
-
-			#train on all training sequences, except the current sequence we are testing on
-			training_sequences = [i for i in [i for i in range(21)] if i != seq_idx]
-			#training_sequences = [i for i in SEQUENCES_TO_PROCESS if i != seq_idx]
-			#training_sequences = [0]
-
-			#use regionlets and lsvm detections
-			if use_regionlets_and_lsvm:
-				SCORE_INTERVALS = [REGIONLETS_SCORE_INTERVALS, LSVM_SCORE_INTERVALS]
-				(measurementTargetSetsBySequence, TARGET_EMISSION_PROBS, CLUTTER_PROBABILITIES, BIRTH_PROBABILITIES,\
-					MEAS_NOISE_COVS, BORDER_DEATH_PROBABILITIES, NOT_BORDER_DEATH_PROBABILITIES) = \
-						get_meas_target_sets_lsvm_and_regionlets(training_sequences, REGIONLETS_SCORE_INTERVALS, \
-						LSVM_SCORE_INTERVALS, obj_class = "car", doctor_clutter_probs = True, doctor_birth_probs = True,\
-						include_ignored_gt = include_ignored_gt, include_dontcare_in_gt = include_dontcare_in_gt, \
-						include_ignored_detections = include_ignored_detections)
-
-			#only use regionlets detections
-			else: 
-				SCORE_INTERVALS = [REGIONLETS_SCORE_INTERVALS]
-				(measurementTargetSetsBySequence, TARGET_EMISSION_PROBS, CLUTTER_PROBABILITIES, BIRTH_PROBABILITIES,\
-					MEAS_NOISE_COVS, BORDER_DEATH_PROBABILITIES, NOT_BORDER_DEATH_PROBABILITIES) = \
-					get_meas_target_sets_regionlets_general_format(training_sequences, REGIONLETS_SCORE_INTERVALS, \
-					obj_class = "car", doctor_clutter_probs = True, doctor_birth_probs = True, \
-					include_ignored_gt = include_ignored_gt, include_dontcare_in_gt = include_dontcare_in_gt, \
-					include_ignored_detections = include_ignored_detections)
-
-			#use mscnn and regionlets detections
-#			if use_regionlets:
-#				SCORE_INTERVALS = [MSCNN_SCORE_INTERVALS, REGIONLETS_SCORE_INTERVALS]
-#				(measurementTargetSetsBySequence, TARGET_EMISSION_PROBS, CLUTTER_PROBABILITIES, BIRTH_PROBABILITIES,\
-#					MEAS_NOISE_COVS, BORDER_DEATH_PROBABILITIES, NOT_BORDER_DEATH_PROBABILITIES) = \
-#						get_meas_target_sets_mscnn_and_regionlets(training_sequences, MSCNN_SCORE_INTERVALS, \
-#						REGIONLETS_SCORE_INTERVALS, obj_class = "car", doctor_clutter_probs = True, doctor_birth_probs = True,\
-#						include_ignored_gt = include_ignored_gt, include_dontcare_in_gt = include_dontcare_in_gt, \
-#						include_ignored_detections = include_ignored_detections)
-#
-#			#only use mscnn detections
-#			else: 
-#				SCORE_INTERVALS = [MSCNN_SCORE_INTERVALS]
-#				(measurementTargetSetsBySequence, TARGET_EMISSION_PROBS, CLUTTER_PROBABILITIES, BIRTH_PROBABILITIES,\
-#					MEAS_NOISE_COVS, BORDER_DEATH_PROBABILITIES, NOT_BORDER_DEATH_PROBABILITIES) = \
-#					get_meas_target_sets_mscnn_general_format(training_sequences, MSCNN_SCORE_INTERVALS, \
-#					obj_class = "car", doctor_clutter_probs = True, doctor_birth_probs = True, \
-#					include_ignored_gt = include_ignored_gt, include_dontcare_in_gt = include_dontcare_in_gt, \
-#					include_ignored_detections = include_ignored_detections)
-#
-			#print "BORDER_DEATH_PROBABILITIES =", BORDER_DEATH_PROBABILITIES
-			#print "NOT_BORDER_DEATH_PROBABILITIES =", NOT_BORDER_DEATH_PROBABILITIES
-
-			#sleep(5)
-
-			#BORDER_DEATH_PROBABILITIES = [-99, 0.3290203327171904, 0.5868263473053892, 0.48148148148148145, 0.4375, 0.42424242424242425]
-			#NOT_BORDER_DEATH_PROBABILITIES = [-99, 0.05133928571428571, 0.006134969325153374, 0.03468208092485549, 0.025735294117647058, 0.037037037037037035]
-
-			#BORDER_DEATH_PROBABILITIES = [-99, 0.059085841694537344, 0.3982102908277405, 0.38953488372093026, 0.3611111111111111, 0.4722222222222222]
-			#NOT_BORDER_DEATH_PROBABILITIES = [-99, 0.0009339793357071974, 0.006880733944954129, 0.023255813953488372, 0.0481283422459893, 0.006944444444444444]
-
-			assert(len(n_frames) == len(measurementTargetSetsBySequence))
-		#	############DEBUG
-		#	
-		#	print "target emission probs: "
-		#	print TARGET_EMISSION_PROBS
-		#	print "cluter probs: "
-		#	print CLUTTER_PROBABILITIES
-		#	print "birth probs: "
-		#	print BIRTH_PROBABILITIES
-		#	print "Meas noise covs:"
-		#	print MEAS_NOISE_COVS
-		#	print "BORDER_DEATH_PROBABILITIES:"
-		#	print BORDER_DEATH_PROBABILITIES
-		#	print "NOT_BORDER_DEATH_PROBABILITIES:"
-		#	print NOT_BORDER_DEATH_PROBABILITIES
-		#	sleep(5)
-		#	##########DONE DEBUG
-
-			t0 = time.time()
-			info_by_run = [] #list of info from each run
-			cur_run_info = None
-		################	for seq_idx in SEQUENCES_TO_PROCESS:
-			results_filename = '%s/results_by_run/run_%d/%s.txt' % (results_folder, run_idx, sequence_name[seq_idx])
-
-			print "Processing sequence: ", seq_idx
-			tA = time.time()
-			(estimated_ts, cur_seq_info, number_resamplings) = run_rbpf_on_targetset(measurementTargetSetsBySequence[seq_idx], results_filename)
-			#estimated_ts = cProfile.run('run_rbpf_on_targetset(measurementTargetSetsBySequence[seq_idx])')
-			print "done processing sequence: ", seq_idx
-			
-			tB = time.time()
-			this_seq_run_time = tB - tA
-			cur_seq_info.append(this_seq_run_time)
-			if cur_run_info == None:
-				cur_run_info = cur_seq_info
-			else:
-				assert(len(cur_run_info) == len(cur_seq_info))
-				for info_idx in len(cur_run_info):
-					#assuming for now info can be summed over each sequence in a run!
-					#works for runtime and number of times resampling is performed
-					cur_run_info[info_idx] += cur_seq_info[info_idx]
-
-			print "about to write results"
-
-			if not RUN_ONLINE:
-				estimated_ts.write_targets_to_KITTI_format(num_frames = n_frames[seq_idx], filename = results_filename)
-			print "done write results"
-			print "running the rbpf took %f seconds" % (tB-tA)
-		################END	for seq_idx in SEQUENCES_TO_PROCESS:
-			
-			info_by_run.append(cur_run_info)
-			t1 = time.time()
-
-			stdout = sys.stdout
-			sys.stdout = open(indicate_run_complete_filename, 'w')
-
-			print "This run is finished (and this file indicates the fact)\n"
-			print "Resampling was performed %d times\n" % number_resamplings
-			print "This run took %f seconds\n" % (t1-t0)
-
-			print "TARGET_EMISSION_PROBS=", TARGET_EMISSION_PROBS
-			print "CLUTTER_PROBABILITIES=", CLUTTER_PROBABILITIES
-			print "BIRTH_PROBABILITIES=", BIRTH_PROBABILITIES
-			print "MEAS_NOISE_COVS=", MEAS_NOISE_COVS
-			print "BORDER_DEATH_PROBABILITIES=", BORDER_DEATH_PROBABILITIES
-			print "NOT_BORDER_DEATH_PROBABILITIES=", NOT_BORDER_DEATH_PROBABILITIES
-
-
-			sys.stdout.close()
-			sys.stdout = stdout
-
+			(measurementTargetSetsBySequence, learned_parameters) = learn_parameters(seq_idx, include_ignored_gt, \
+				include_dontcare_in_gt, use_regionlets_and_lsvm, sort_dets_on_intervals)
+			run_sequence(TrackerConfig(learned_parameters, N_PARTICLES), measurementTargetSetsBySequence, results_folder, \
+						 run_idx, seq_idx, sequence_name, n_frames, get_run_seed(run_idx, seq_idx))
 
 		print 'end run'
 		sys.exit(0);
@@ -2335,8 +4081,8 @@ if __name__ == "__main__":
 
 		print "Processing sequence: ", seq_idx
 		tA = time.time()
-		(estimated_ts, cur_seq_info, number_resamplings) = run_rbpf_on_targetset(measurementTargetSetsBySequence[seq_idx])
-		#estimated_ts = cProfile.run('run_rbpf_on_targetset(measurementTargetSetsBySequence[seq_idx])')
+		(estimated_ts, cur_seq_info, number_resamplings) = run_rbpf_on_targetset(measurementTargetSetsBySequence[seq_idx], filename)
+		#estimated_ts = cProfile.run('run_rbpf_on_targetset(measurementTargetSetsBySequence[seq_idx], filename)')
 		print "done processing sequence: ", seq_idx
 		
 		tB = time.time()
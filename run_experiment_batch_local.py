@@ -0,0 +1,152 @@
+#Run the same (num_particles, flags, run_idx, seq_idx) matrix as run_experiment_batch_sherlock.py
+#on a process pool on this machine instead of submitting one sbatch job per (run, sequence).
+#Each task is every run of one (num_particles, flags, sequence), so a worker learns parameters once
+#for all of them.  A worker loads the detections of every sequence once per flags (rbpf.load_detections)
+#and learns the parameters of each of its sequences from them, both are cached for the tasks that follow.
+#Every run seeds the random number generators with rbpf.get_run_seed(run_idx, seq_idx), so runs are
+#reproducible.  Runs whose seq_%d_done.txt file exists are skipped, so an interrupted
+#batch resumes where it stopped.
+#
+#usage (from the repository root): python run_experiment_batch_local.py [number of processes]
+import collections
+import multiprocessing
+import subprocess
+import sys
+
+from run_experiment_batch_sherlock import NUM_RUNS
+from run_experiment_batch_sherlock import SEQUENCES_TO_PROCESS
+from run_experiment_batch_sherlock import NUM_PARTICLES_TO_TEST
+from run_experiment_batch_sherlock import RUN_EVALUATION
+from run_experiment_batch_sherlock import run_complete
+from run_experiment_batch_sherlock import setup_results_folder
+import rbpf_KITTI_det_scores as rbpf
+
+#number of worker processes, by default one per core
+NUM_PROCESSES = multiprocessing.cpu_count()
+
+#detection flags (include_ignored_gt, include_dontcare_in_gt, use_regionlets_and_lsvm, sort_dets_on_intervals)
+#-> rbpf.load_detections in this worker process, oldest entry first.  The detections don't depend on the
+#sequence parameters are learned without, so every sequence learns its parameters from, and runs on, one copy
+#(rbpf.get_score_parameters recomputes the detections' score parameters for each configuration)
+DETECTIONS_CACHE = collections.OrderedDict()
+#number of detection flags whose detections are kept in DETECTIONS_CACHE
+MAX_CACHED_DETECTION_SETS = 2
+#(detection flags, seq_idx) -> learned parameters (see rbpf.learn_parameters) in this worker process, these
+#are small so every entry is kept
+LEARNED_PARAMETERS_CACHE = {}
+
+def get_tasks(num_particles, include_ignored_gt=False, include_dontcare_in_gt=False,
+	use_regionlets_and_lsvm=True, sort_dets_on_intervals=True):
+	"""
+	Output:
+	- tasks: list of (num_particles, include_ignored_gt, include_dontcare_in_gt, use_regionlets_and_lsvm,
+		sort_dets_on_intervals, seq_idx, run_indices) tuples for every sequence with runs that are not complete,
+		run_indices is the list of those runs
+	"""
+	tasks = []
+	for seq_idx in SEQUENCES_TO_PROCESS:
+		run_indices = [run_idx for run_idx in range(1, NUM_RUNS+1) if not run_complete(run_idx, seq_idx, num_particles, \
+					   include_ignored_gt, include_dontcare_in_gt, use_regionlets_and_lsvm, sort_dets_on_intervals, None)]
+		if len(run_indices) > 0:
+			tasks.append((num_particles, include_ignored_gt, include_dontcare_in_gt, use_regionlets_and_lsvm, \
+						  sort_dets_on_intervals, seq_idx, run_indices))
+	return tasks
+
+def get_detections_and_learned_parameters(detection_flags, seq_idx):
+	"""
+	Output:
+	- measurementTargetSetsBySequence, learned_parameters: see rbpf.learn_parameters, from the caches of this
+		worker process if possible
+	"""
+	if not detection_flags in DETECTIONS_CACHE:
+		if len(DETECTIONS_CACHE) == MAX_CACHED_DETECTION_SETS:
+			DETECTIONS_CACHE.popitem(last=False)
+		DETECTIONS_CACHE[detection_flags] = rbpf.load_detections(*detection_flags)
+	detections = DETECTIONS_CACHE[detection_flags]
+	parameters_key = detection_flags + (seq_idx,)
+	if not parameters_key in LEARNED_PARAMETERS_CACHE:
+		(measurementTargetSetsBySequence, learned_parameters) = rbpf.learn_parameters(seq_idx, *detection_flags, \
+			detections=detections)
+		LEARNED_PARAMETERS_CACHE[parameters_key] = learned_parameters
+	return (detections[0], LEARNED_PARAMETERS_CACHE[parameters_key])
+
+def run_task(task):
+	"""
+	Run every run of task (see get_tasks) that is not complete
+
+	Output:
+	- task
+	- run_count: number of runs done
+	"""
+	(num_particles, include_ignored_gt, include_dontcare_in_gt, use_regionlets_and_lsvm, sort_dets_on_intervals, \
+		seq_idx, run_indices) = task
+	results_folder = rbpf.get_results_folder(num_particles, include_ignored_gt, include_dontcare_in_gt, \
+											 use_regionlets_and_lsvm, sort_dets_on_intervals)
+	(sequence_name, n_frames) = rbpf.get_sequence_names_and_frame_counts()
+	config = None
+	run_count = 0
+	for run_idx in run_indices:
+		#another process may have finished this run since the task list was made
+		if run_complete(run_idx, seq_idx, num_particles, include_ignored_gt, include_dontcare_in_gt,
+						use_regionlets_and_lsvm, sort_dets_on_intervals, None):
+			continue
+		stdout = sys.stdout
+		sys.stdout = open('%s/results_by_run/run_%d/seq_%d_log.txt' % (results_folder, run_idx, seq_idx), 'w')
+		try:
+			if config is None:
+				(measurementTargetSetsBySequence, learned_parameters) = get_detections_and_learned_parameters( \
+					(include_ignored_gt, include_dontcare_in_gt, use_regionlets_and_lsvm, sort_dets_on_intervals), seq_idx)
+				config = rbpf.TrackerConfig(learned_parameters, num_particles)
+			seed = rbpf.get_run_seed(run_idx, seq_idx)
+			print "random seed:", seed
+			rbpf.run_sequence(config, measurementTargetSetsBySequence, results_folder, run_idx, seq_idx, sequence_name, \
+							  n_frames, seed)
+		finally:
+			sys.stdout.close()
+			sys.stdout = stdout
+		run_count += 1
+	return (task, run_count)
+
+def run_experiments_locally(experiments, num_processes=NUM_PROCESSES):
+	"""
+	Inputs:
+	- experiments: list of dictionaries of keyword arguments for get_tasks
+	- num_processes: number of worker processes
+	"""
+	tasks = []
+	for experiment in experiments:
+		setup_results_folder(experiment['num_particles'], experiment.get('include_ignored_gt', False), \
+			experiment.get('include_dontcare_in_gt', False), experiment.get('use_regionlets_and_lsvm', True), \
+			experiment.get('sort_dets_on_intervals', True), None)
+		tasks.extend(get_tasks(**experiment))
+	#start the longest tasks first so the pool isn't left waiting on one long sequence at the end
+	(sequence_name, n_frames) = rbpf.get_sequence_names_and_frame_counts()
+	tasks.sort(key=lambda task: n_frames[task[5]]*len(task[6]), reverse=True)
+	print "%d runs of %d sequences to do on %d processes" % (sum([len(task[6]) for task in tasks]), len(tasks), num_processes)
+
+	pool = multiprocessing.Pool(num_processes)
+	for (finished_count, (task, run_count)) in enumerate(pool.imap_unordered(run_task, tasks)):
+		print "finished %d runs of sequence %d with %d particles (%d of %d)" % (run_count, task[5], task[0], \
+			finished_count + 1, len(tasks))
+	pool.close()
+	pool.join()
+
+	if RUN_EVALUATION:
+		for experiment in experiments:
+			subprocess.call([sys.executable, 'rbpf_KITTI_det_scores.py', '%d' % experiment['num_particles'], \
+				'%s' % experiment.get('include_ignored_gt', False), '%s' % experiment.get('include_dontcare_in_gt', False), \
+				'%s' % experiment.get('use_regionlets_and_lsvm', True), '%s' % experiment.get('sort_dets_on_intervals', True), \
+				'-1', '%d' % NUM_RUNS, '-1', 'evaluate'])
+
+
+if __name__ == "__main__":
+	num_processes = NUM_PROCESSES
+	if len(sys.argv) > 1:
+		num_processes = int(sys.argv[1])
+
+	#regionlets_only_with_score_intervals
+	experiments = []
+	for num_particles in NUM_PARTICLES_TO_TEST:
+		experiments.append({'num_particles': num_particles, 'include_ignored_gt': False, 'include_dontcare_in_gt': False,
+							'use_regionlets_and_lsvm': False, 'sort_dets_on_intervals': True})
+	run_experiments_locally(experiments, num_processes)
@@ -0,0 +1,75 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "KITTI_helpers"))
+import array_cache
+import learn_params1
+
+
+class ArrayCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.input_filename = os.path.join(self.directory, "input.txt")
+        with open(self.input_filename, "w") as f:
+            f.write("0 1 Car\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_cache_key(self):
+        cache_key = array_cache.get_cache_key([self.input_filename], (0.0, "lsvm"))
+        self.assertEqual(cache_key, array_cache.get_cache_key([self.input_filename], (0.0, "lsvm")))
+        self.assertNotEqual(cache_key, array_cache.get_cache_key([self.input_filename], (0.5, "lsvm")))
+        with open(self.input_filename, "a") as f:
+            f.write("1 1 Car\n")
+        self.assertNotEqual(cache_key, array_cache.get_cache_key([self.input_filename], (0.0, "lsvm")))
+
+    def test_missing_input_file(self):
+        missing_filename = os.path.join(self.directory, "missing.txt")
+        self.assertRaises(IOError, array_cache.get_cache_key, [self.input_filename, missing_filename], ())
+
+    def test_save_and_load(self):
+        cache_directory = os.path.join(self.directory, "cache")
+        self.assertEqual(array_cache.load_arrays(cache_directory, "key"), None)
+        array_cache.save_arrays(cache_directory, "key", {'a': np.arange(5), 'b': np.array([1.5, -2.0])})
+        arrays = array_cache.load_arrays(cache_directory, "key")
+        self.assertEqual(sorted(arrays.keys()), ['a', 'b'])
+        self.assertTrue(np.array_equal(arrays['a'], np.arange(5)))
+        self.assertTrue(np.array_equal(arrays['b'], [1.5, -2.0]))
+        self.assertFalse(arrays['a'].flags.writeable)
+
+        #the first entry stored under a key is kept
+        array_cache.save_arrays(cache_directory, "key", {'a': np.zeros(2)})
+        self.assertTrue(np.array_equal(array_cache.load_arrays(cache_directory, "key")['a'], np.arange(5)))
+        self.assertEqual(os.listdir(cache_directory), ["key"])
+
+
+class CachedObjectsTestCase(unittest.TestCase):
+    def test_arrays_to_objects(self):
+        #two sequences, the second with an empty frame
+        gt_objects = [[[learn_params1.gtObject(0, 10, 0, 20, 1)],
+                       [learn_params1.gtObject(1, 11, 0, 20, 1), learn_params1.gtObject(50, 60, 5, 9, 2)]],
+                      [[], [learn_params1.gtObject(3, 4, 5, 6, 0)], []]]
+        arrays = learn_params1.objects_to_arrays(gt_objects, 'gt_', learn_params1.GT_OBJECT_FIELDS)
+        objects = learn_params1.arrays_to_objects(arrays, 'gt_', learn_params1.GT_OBJECT_FIELDS, learn_params1.gtObject)
+
+        self.assertEqual([len(seq_objects) for seq_objects in objects], [2, 3])
+        for (seq_objects, expected_seq_objects) in zip(objects, gt_objects):
+            self.assertEqual([len(frame) for frame in seq_objects], [len(frame) for frame in expected_seq_objects])
+            for (frame, expected_frame) in zip(seq_objects, expected_seq_objects):
+                for (cur_object, expected_object) in zip(frame, expected_frame):
+                    self.assertEqual(vars(cur_object), vars(expected_object))
+
+        #objects are created once per frame, so attributes set on them persist
+        objects[0][1][0].associated_detection = ["detection"]
+        self.assertEqual(objects[0][1][0].associated_detection, ["detection"])
+        self.assertTrue(objects[1][-2] is objects[1][1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import itertools
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "KITTI_helpers"))
+import box_assignment
+
+BACKENDS = ['munkres', 'sparse'] + (['scipy'] if box_assignment.linear_sum_assignment is not None else [])
+
+def get_boxoverlap(a, b, criterion="union"):
+    #boxoverlap of KITTI devkit_tracking/python/evaluate_tracking.py for boxes [x1, y1, x2, y2]
+    w = min(a[2], b[2]) - max(a[0], b[0])
+    h = min(a[3], b[3]) - max(a[1], b[1])
+    if w <= 0. or h <= 0.:
+        return 0.
+    inter = w*h
+    aarea = (a[2] - a[0])*(a[3] - a[1])
+    barea = (b[2] - b[0])*(b[3] - b[1])
+    if criterion == "union":
+        return inter/float(aarea + barea - inter)
+    return float(inter)/float(aarea)
+
+def get_random_boxes(rng, count):
+    corners = rng.uniform(0, 200, (count, 2))
+    return np.hstack((corners, corners + rng.uniform(10, 80, (count, 2))))
+
+def get_brute_force_assignment(cost_matrix, max_gated_cost):
+    """
+    Output:
+    - (pair_count, total_cost): the most pairs within the gate any assignment has, and the smallest total
+        cost of the pairs within the gate of the assignments with that many pairs
+    """
+    (row_count, col_count) = cost_matrix.shape
+    best = (0, 0.0)
+    for rows in itertools.permutations(range(row_count), min(row_count, col_count)):
+        for cols in itertools.permutations(range(col_count), min(row_count, col_count)):
+            costs = [cost_matrix[row, col] for (row, col) in zip(rows, cols) if cost_matrix[row, col] <= max_gated_cost]
+            if len(costs) > best[0] or (len(costs) == best[0] and sum(costs) < best[1] - 1e-12):
+                best = (len(costs), sum(costs))
+    return best
+
+
+class BoxOverlapTestCase(unittest.TestCase):
+    def test_matches_scalar_boxoverlap(self):
+        rng = np.random.RandomState(0)
+        boxes_a = get_random_boxes(rng, 12)
+        boxes_b = get_random_boxes(rng, 9)
+        for criterion in ["union", "a"]:
+            overlaps = box_assignment.get_box_overlaps(boxes_a, boxes_b, criterion)
+            self.assertEqual(overlaps.shape, (12, 9))
+            for i in range(12):
+                for j in range(9):
+                    self.assertAlmostEqual(overlaps[i, j], get_boxoverlap(boxes_a[i], boxes_b[j], criterion))
+        self.assertTrue(np.any(overlaps == 0) and np.any(overlaps > 0))
+
+    def test_touching_and_empty_boxes(self):
+        overlaps = box_assignment.get_box_overlaps([[0, 0, 10, 10]], [[10, 0, 20, 10], [0, 0, 10, 10]])
+        np.testing.assert_array_equal(overlaps, [[0.0, 1.0]])
+        self.assertEqual(box_assignment.get_box_overlaps(np.empty((0, 4)), [[0, 0, 1, 1]]).shape, (0, 1))
+        self.assertRaises(TypeError, box_assignment.get_box_overlaps, [[0, 0, 1, 1]], [[0, 0, 1, 1]], "b")
+
+
+class GatedAssignmentTestCase(unittest.TestCase):
+    def check_assignment(self, cost_matrix, max_gated_cost, assigned_pairs):
+        (pair_count, total_cost) = get_brute_force_assignment(cost_matrix, max_gated_cost)
+        self.assertEqual(assigned_pairs, sorted(assigned_pairs))
+        self.assertEqual(len(set([row for (row, col) in assigned_pairs])), len(assigned_pairs))
+        self.assertEqual(len(set([col for (row, col) in assigned_pairs])), len(assigned_pairs))
+        self.assertTrue(all([cost_matrix[row, col] <= max_gated_cost for (row, col) in assigned_pairs]))
+        self.assertEqual(len(assigned_pairs), pair_count)
+        self.assertAlmostEqual(sum([cost_matrix[row, col] for (row, col) in assigned_pairs]), total_cost)
+
+    def test_backends_find_minimum_cost_assignments(self):
+        rng = np.random.RandomState(0)
+        for trial in range(40):
+            cost_matrix = rng.uniform(0, 1, (rng.randint(1, 5), rng.randint(1, 5)))
+            for backend in BACKENDS:
+                self.check_assignment(cost_matrix, .5, box_assignment.solve_gated_assignment(cost_matrix, .5, backend))
+
+    def test_no_pairs_within_gate(self):
+        for backend in BACKENDS:
+            self.assertEqual(box_assignment.solve_gated_assignment(np.ones((3, 2)), .5, backend), [])
+            self.assertEqual(box_assignment.solve_gated_assignment(np.empty((0, 2)), .5, backend), [])
+
+    def test_ties_are_solved_like_munkres(self):
+        #duplicate rows and columns have the same costs
+        cost_matrix = np.array([[.1, .1, .9], [.1, .1, .9], [.9, .3, .3]])
+        expected_pairs = box_assignment.solve_gated_assignment(cost_matrix, .5, 'munkres')
+        for backend in BACKENDS:
+            self.assertEqual(box_assignment.solve_gated_assignment(cost_matrix, .5, backend, munkres_ties=True), expected_pairs)
+
+    def test_gated_components(self):
+        gated = np.array([[True, False, False, False],
+                          [False, False, True, False],
+                          [True, False, False, False],
+                          [False, False, True, True],
+                          [False, False, False, False]])
+        components = [(list(rows), list(cols)) for (rows, cols) in box_assignment.get_gated_components(gated)]
+        self.assertEqual(sorted(components), [([0, 2], [0]), ([1, 3], [2, 3])])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "KITTI_helpers"))
+from jdk_helper_evaluate_results import count_trajectory_metrics
+
+def count_trajectory_metrics_reference(trajectories, ignored):
+    #the per trajectory loop of KITTI devkit_tracking/python/evaluate_tracking.py compute3rdPartyMetrics
+    n_ignored_tr, MT, PT, ML, id_switches, fragments = [0]*6
+    for g, ign_g in zip(trajectories, ignored):
+        if all(ign_g):
+            n_ignored_tr += 1
+            continue
+        if all([this == -1 for this in g]):
+            ML += 1
+            continue
+        last_id = g[0]
+        tracked = 1 if g[0] >= 0 else 0
+        for f in range(1, len(g)):
+            if ign_g[f]:
+                last_id = -1
+                continue
+            if last_id != g[f] and last_id != -1 and g[f] != -1 and g[f-1] != -1:
+                id_switches += 1
+            if f < len(g)-1 and g[f-1] != g[f] and last_id != -1 and g[f] != -1 and g[f+1] != -1:
+                fragments += 1
+            if g[f] != -1:
+                tracked += 1
+                last_id = g[f]
+        if len(g) > 1 and g[f-1] != g[f] and last_id != -1 and g[f] != -1 and not ign_g[f]:
+            fragments += 1
+        tracking_ratio = tracked/float(len(g))
+        if tracking_ratio > 0.8:
+            MT += 1
+        elif tracking_ratio < 0.2:
+            ML += 1
+        else:
+            PT += 1
+    return (n_ignored_tr, MT, PT, ML, id_switches, fragments)
+
+
+class CountTrajectoryMetricsTestCase(unittest.TestCase):
+    def test_hand_made_trajectories(self):
+        trajectories = [[5, 5, 5, 5, 5],        #mostly tracked
+                        [5, 6, 6, -1, 6, 6],    #id switch, then a fragment
+                        [-1, -1, -1],           #mostly lost
+                        [3, 3, 3, 3],           #ignored on every frame
+                        [2, -1, -1, 2, -1]]     #partially tracked, fragmented
+        ignored = [[False]*5, [False]*6, [False]*3, [True]*4, [False]*5]
+        self.assertEqual(count_trajectory_metrics(trajectories, ignored), (1, 2, 1, 1, 1, 2))
+        self.assertEqual(count_trajectory_metrics(trajectories, ignored), count_trajectory_metrics_reference(trajectories, ignored))
+
+    def test_no_trajectories(self):
+        self.assertEqual(count_trajectory_metrics([], []), (0, 0, 0, 0, 0, 0))
+
+    def test_matches_reference_on_random_trajectories(self):
+        rng = np.random.RandomState(0)
+        for trial in range(200):
+            trajectories = []
+            ignored = []
+            for i in range(rng.randint(1, 8)):
+                length = rng.randint(1, 15)
+                trajectories.append(list(rng.choice([-1, 0, 1, 2], length, p=[.3, .4, .2, .1])))
+                ignored.append(list(rng.rand(length) < [.05, .15, .9][rng.randint(3)]))
+            self.assertEqual(count_trajectory_metrics(trajectories, ignored), \
+                             count_trajectory_metrics_reference(trajectories, ignored), trial)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "KITTI_helpers"))
+import kitti_loader
+
+
+class KittiObject(object):
+    pass
+
+#frame track_id type truncation occlusion alpha x1 y1 x2 y2 h w l X Y Z ry [score]
+LABEL_LINES = ["0 0 Car 0 0 -1 10 20 30 40 -1 -1 -1 -1000 -1000 -1000 -10",
+               "0 1 Pedestrian 0 0 -1 50 20 60 40 -1 -1 -1 -1000 -1000 -1000 -10",
+               "2 0 Car 0 0 -1 12 20 32 40 -1 -1 -1 -1000 -1000 -1000 -10",
+               "2 -1 DontCare -1 -1 -10 70 20 90 40 -1 -1 -1 -1000 -1000 -1000 -10",
+               "1 0 Van 0 0 -1 11 20 31 40 -1 -1 -1 -1000 -1000 -1000 -10",
+               "1 -1 Car 0 0 -1 11 20 31 40 -1 -1 -1 -1000 -1000 -1000 -10"]
+
+DETECTION_LINES = ["0 -1 Car 0 0 -1 10 20 30 40 -1 -1 -1 -1000 -1000 -1000 -10 5.5",
+                   "0 -1 Car 0 0 -1 80 20 90 40 -1 -1 -1 -1000 -1000 -1000 -10 1.5",
+                   "1 -1 Car 0 0 -1 11 20 31 40 -1 -1 -1 -1000 -1000 -1000 -10"]
+
+
+class KittiLoaderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_file(self, lines):
+        filename = os.path.join(self.directory, "%d.txt" % len(os.listdir(self.directory)))
+        with open(filename, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        return filename
+
+    def test_ground_truth_frames(self):
+        sequence = kitti_loader.load_kitti_sequence(self.write_file(LABEL_LINES), "car", 3, has_scores=False)
+        #the pedestrian is not loaded and the car with track id -1 is invalid, dontcare is kept
+        self.assertEqual(sequence.line_count, 6)
+        self.assertEqual(list(sequence.frame_offsets), [0, 1, 2, 4])
+        self.assertEqual(list(sequence.objects['line']), [0, 4, 2, 3])
+        self.assertEqual(sequence.get_trajectory_count(), 1)
+        self.assertEqual(sequence.get_duplicate_id(), None)
+        self.assertTrue(sequence.has_2d_boxes())
+        self.assertFalse(sequence.has_3d_positions())
+
+        frames = sequence.get_frames(KittiObject)
+        self.assertEqual(len(frames), 3)
+        self.assertEqual([len(frame) for frame in frames], [1, 1, 2])
+        self.assertEqual(frames[1][0].obj_type, "van")
+        self.assertEqual(frames[1][0].x1, 11.0)
+        self.assertEqual(frames[2][1].track_id, -1)
+        self.assertEqual(frames[0][0].score, kitti_loader.NO_SCORE_GT)
+
+    def test_detection_scores_and_fake_track_ids(self):
+        filename = self.write_file(DETECTION_LINES)
+        sequence = kitti_loader.load_kitti_sequence(filename, "car", 2, has_scores=True, first_fake_track_id=7)
+        self.assertEqual(list(sequence.objects['score']), [5.5, 1.5, kitti_loader.NO_SCORE_DETECTION])
+        self.assertEqual(list(sequence.objects['track_id']), [7, 8, 9])
+
+        #detections without a score are kept by the cutoff
+        sequence = kitti_loader.load_kitti_sequence(filename, "car", 2, has_scores=True, cutoff_score=2.0, first_fake_track_id=0)
+        self.assertEqual(list(sequence.objects['line']), [0, 2])
+
+    def test_detection_field_count(self):
+        filename = self.write_file(DETECTION_LINES + ["1 -1 Car 0 0 -1 11 20 31 40 -1 -1 -1 -1000 -1000 -1000 -10 2.5 0"])
+        self.assertEqual(kitti_loader.load_kitti_sequence(filename, "car", 2, has_scores=True), None)
+
+    def test_duplicate_id(self):
+        filename = self.write_file(LABEL_LINES + ["2 0 Car 0 0 -1 12 20 32 40 -1 -1 -1 -1000 -1000 -1000 -10"])
+        sequence = kitti_loader.load_kitti_sequence(filename, "car", 3, has_scores=False)
+        self.assertEqual(sequence.get_duplicate_id(), (2, 0))
+
+    def test_frame_count_extension(self):
+        self.assertEqual(kitti_loader.get_frame_count(kitti_loader.np.array([0, 3, 4]), 5), 5)
+        self.assertEqual(kitti_loader.get_frame_count(kitti_loader.np.array([0, 7]), 5), 505)
+        self.assertRaises(IndexError, kitti_loader.get_frame_count, kitti_loader.np.array([1000]), 5)
+
+    def test_frame_objects_indexing(self):
+        frames = kitti_loader.load_kitti_sequence(self.write_file(LABEL_LINES), "car", 3, has_scores=False).get_frames(KittiObject)
+        #objects persist between accesses
+        frames[0][0].associated = True
+        self.assertTrue(frames[0][0].associated)
+        self.assertTrue(frames[-3] is frames[0])
+        self.assertTrue(frames[-1] is frames[2])
+        self.assertEqual(frames[1:], [frames[1], frames[2]])
+        self.assertEqual(frames[::-2], [frames[2], frames[0]])
+        self.assertEqual(frames[5:], [])
+        self.assertRaises(IndexError, frames.__getitem__, 3)
+        self.assertRaises(IndexError, frames.__getitem__, -4)
+        self.assertRaises(TypeError, frames.__getitem__, 1.0)
+        self.assertRaises(TypeError, frames.__getitem__, "1")
+        self.assertEqual(len(list(frames)), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,610 @@
+import copy
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+REPOSITORY_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(REPOSITORY_DIRECTORY, "KITTI_helpers"))
+sys.path.insert(0, REPOSITORY_DIRECTORY)
+import rbpf_KITTI_det_scores as rbpf
+import learn_params1
+
+#(score_intervals, target_emission_probs, clutter_probabilities, birth_probabilities, meas_noise_covs,
+#border_death_probabilities, not_border_death_probabilities) of one measurement source
+LEARNED_PARAMETERS = ([[0.0, 0.5]], [[0.3, 0.6]], [[[.5, .3, .1, .05, .05], [.8, .1, .05, .03, .02]]],
+                      [[[.6, .3, .05, .03, .02], [.5, .4, .05, .03, .02]]], [[np.eye(2)*10, np.eye(2)*8]],
+                      [-99, .3, .5, .5, .5, .6], [-99, .05, .03, .03, .03, .04])
+
+def get_static_scene_detections(n_frames, seed):
+    """
+    Output:
+    - detections: detections[f] is the detections_by_source of frame f (see Tracker.step) of three
+        targets that don't move, detected on every frame with noisy positions
+    """
+    rng = np.random.RandomState(seed)
+    centers = np.array([[100.0, 150.0], [400.0, 200.0], [800.0, 180.0]])
+    detections = []
+    for frame_idx in range(n_frames):
+        noisy_centers = centers + rng.randn(*centers.shape)*2
+        boxes = np.hstack((noisy_centers - [30, 20], noisy_centers + [30, 20]))
+        detections.append([(boxes, np.repeat(.9, len(boxes)))])
+    return detections
+
+def get_crossing_centers(frame_idx):
+    """
+    Output:
+    - entries: the index of each target in frame frame_idx of get_crossing_detections, the kth target
+        enters on frame 15*k
+    - centers: array of shape (len(entries), 2), the true position of each target
+    """
+    entries = np.arange(max(0, frame_idx - 59)//15, frame_idx//15 + 1)
+    return (entries, np.column_stack(((frame_idx - entries*15)*20.0 + 10, 150 + 60*(entries % 3))))
+
+def get_crossing_detections(n_frames, seed):
+    """
+    Output:
+    - detections: detections[f] is the detections_by_source of frame f of targets that enter on the left
+        every 15 frames and leave on the right 60 frames later, detected on every frame with noisy positions
+    """
+    rng = np.random.RandomState(seed)
+    detections = []
+    for frame_idx in range(n_frames):
+        (entries, centers) = get_crossing_centers(frame_idx)
+        centers += rng.randn(*centers.shape)*2
+        boxes = np.hstack((centers - [30, 20], centers + [30, 20]))
+        detections.append([(boxes, np.repeat(.9, len(boxes)))])
+    return detections
+
+def get_detection_sequence(detections):
+    """
+    Output:
+    - sequence: learn_params1.TargetSet of the detections of the first measurement source of detections
+        (see get_static_scene_detections), as Tracker.run takes them
+    """
+    sequence = learn_params1.TargetSet()
+    for (frame_idx, detections_by_source) in enumerate(detections):
+        (boxes, scores) = detections_by_source[0]
+        sequence.measurements.append(rbpf.get_detection_measurement(frame_idx*rbpf.default_time_step, boxes, scores))
+    return sequence
+
+def get_loaded_sequence(n_frames, seed, learned_parameters):
+    """
+    Output:
+    - sequence: learn_params1.TargetSet of a static scene with detection scores spread over [.1, 1), with
+        the score parameters of learned_parameters set as the get_meas_target_set* loaders set them
+    """
+    rng = np.random.RandomState(seed)
+    (score_intervals, target_emission_probs, meas_noise_covs) = [learned_parameters[i][0] for i in [0, 1, 4]]
+    sequence = learn_params1.TargetSet()
+    for (frame_idx, detections_by_source) in enumerate(get_static_scene_detections(n_frames, seed)):
+        (boxes, scores) = detections_by_source[0]
+        measurement = rbpf.get_detection_measurement(frame_idx*rbpf.default_time_step, boxes, rng.uniform(.1, 1, len(scores)))
+        learn_params1.set_score_parameters(measurement, score_intervals, target_emission_probs, meas_noise_covs)
+        sequence.measurements.append(measurement)
+    return sequence
+
+
+class CopyOnWriteTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dt = rbpf.default_time_step
+        self.config = rbpf.TrackerConfig(LEARNED_PARAMETERS, 1)
+        self.ids = rbpf.IdCounters()
+        self.parent = rbpf.TargetSet(self.config, self.ids)
+        self.parent.create_new_target(np.array([100.0, 150.0]), 60, 40, 0.0)
+        self.parent.create_new_target(np.array([400.0, 200.0]), 60, 40, 0.0)
+
+    def predict(self, target_sets, cur_time):
+        particles = []
+        for target_set in target_sets:
+            particle = rbpf.Particle(0, self.config, self.ids, target_set.state_store)
+            particle.targets = target_set
+            particles.append(particle)
+        target_sets[0].state_store.predict(particles, self.dt, cur_time)
+
+    def test_targets_are_copied_on_write_only(self):
+        child = self.parent.create_child()
+        shared_target = self.parent.living_targets[0]
+        self.assertEqual(shared_target.holder_count, 2)
+        #prediction is the same for every holder, so it does not copy
+        self.predict([self.parent, child], self.dt)
+        self.assertIs(child.living_targets[0], shared_target)
+        self.assertEqual(shared_target.get_trajectory().shape[0], 2)
+
+        private_target = child.get_private_target(0)
+        self.assertIsNot(private_target, shared_target)
+        self.assertIs(child.all_targets[0], private_target)
+        self.assertEqual(shared_target.holder_count, 1)
+        self.assertFalse(shared_target.shared)
+        np.testing.assert_array_equal(private_target.get_trajectory(), shared_target.get_trajectory())
+        #the last holder modifies the target in place
+        self.assertIs(self.parent.get_private_target(0), shared_target)
+
+    def test_release_drops_holders(self):
+        child = self.parent.create_child()
+        self.parent.release()
+        for target in child.living_targets:
+            self.assertEqual(target.holder_count, 1)
+            self.assertIs(child.get_private_target(child.living_targets.index(target)), target)
+
+    def test_history_chains_are_bounded(self):
+        target_set = self.parent
+        expected_trajectory = target_set.living_targets[0].get_trajectory()
+        for frame_idx in range(1, 3*rbpf.MAX_HISTORY_DEPTH):
+            cur_time = frame_idx*self.dt
+            self.predict([target_set], cur_time)
+            expected_trajectory = np.concatenate((expected_trajectory, target_set.living_targets[0].last_trajectory_row()[np.newaxis]))
+            child = target_set.create_child()
+            target_set.release()
+            target_set = child
+            target = target_set.get_private_target(0)
+            self.assertLessEqual(target.history_depth, rbpf.MAX_HISTORY_DEPTH)
+            np.testing.assert_array_equal(target.get_trajectory(), expected_trajectory)
+
+    def test_ancestral_targets_are_collected_as_they_were(self):
+        child = self.parent.create_child()
+        self.parent.release()
+        old_id = child.living_targets[0].id_
+        self.predict([child], self.dt)
+        child.get_private_target(0).id_ = -5
+        every_target = child.collect_ancestral_targets()
+        self.assertEqual([target.id_ for target in every_target], [-5, child.living_targets[1].id_, old_id])
+        self.assertEqual(every_target[0].get_trajectory().shape[0], 2)
+        self.assertEqual(every_target[2].get_trajectory().shape[0], 1)
+
+
+class ResamplingTestCase(unittest.TestCase):
+    def get_weights(self, rng, count):
+        #a few heavy particles and many light ones
+        weights = rng.dirichlet(np.repeat(.3, count))
+        return weights/np.sum(weights)
+
+    def test_schemes_sample_close_to_expected_counts(self):
+        np.random.seed(0)
+        rng = np.random.RandomState(0)
+        for trial in range(100):
+            weights = self.get_weights(rng, rng.randint(1, 60))
+            for num_samples in [len(weights), 37]:
+                expected_counts = num_samples*weights
+                for resampling_scheme in ['stratified', 'systematic', 'residual']:
+                    ancestors = rbpf.get_resampling_ancestors(weights, resampling_scheme, num_samples)
+                    self.assertEqual(len(ancestors), num_samples)
+                    self.assertTrue(np.all(np.diff(ancestors) >= 0))
+                    counts = np.bincount(ancestors, minlength=len(weights))
+                    self.assertEqual(len(counts), len(weights))
+                    if resampling_scheme == 'residual':
+                        self.assertTrue(np.all(np.floor(expected_counts) <= counts))
+                    elif resampling_scheme == 'systematic':
+                        self.assertTrue(np.all(np.abs(counts - expected_counts) < 1))
+                    else:
+                        #the positions in the two partially covered divisions are independent
+                        self.assertTrue(np.all(np.abs(counts - expected_counts) < 2))
+
+    def test_first_offspring_is_the_ancestor(self):
+        for use_create_child in [True, False]:
+            config = rbpf.TrackerConfig(LEARNED_PARAMETERS, 5, USE_CREATE_CHILD=use_create_child)
+            ids = rbpf.IdCounters()
+            state_store = rbpf.TargetStateStore()
+            particle_set = []
+            for i in range(5):
+                particle = rbpf.Particle(ids.get_particle_id(), config, ids, state_store)
+                particle.create_new_target(np.array([100.0 + i, 150.0]), 60, 40, 0.0)
+                particle_set.append(particle)
+            ancestors = np.array([0, 0, 1, 3, 3, 3])
+            resampled = rbpf.resample_particles(particle_set, ancestors)
+            self.assertEqual(len(resampled), len(ancestors))
+            for (i, ancestor) in enumerate(ancestors):
+                if i == list(ancestors).index(ancestor):
+                    self.assertIs(resampled[i], particle_set[ancestor])
+                else:
+                    self.assertFalse(any([resampled[i] is particle for particle in particle_set]))
+                    self.assertEqual(resampled[i].targets.living_targets[0].id_, particle_set[ancestor].targets.living_targets[0].id_)
+            self.assertEqual(len(set([id(particle) for particle in resampled])), len(resampled))
+
+
+class KITTIFormatTestCase(unittest.TestCase):
+    #lines the writers wrote before they were vectorized, f.write("%d %d Car ... %d %d %d %d ...\n" % (frame_idx,
+    #target.id_, left, top, right, bottom)) for each target in each frame, "%d" truncates towards zero
+    EXPECTED_LINES = "0 3 Car -1 -1 2.57 79 39 120 60 -1 -1 -1 -1000 -1000 -1000 -10 1\n" \
+                     "0 7 Car -1 -1 2.57 -5 -2 25 43 -1 -1 -1 -1000 -1000 -1000 -10 1\n" \
+                     "3 5 Car -1 -1 2.57 -5 6 -1 9 -1 -1 -1 -1000 -1000 -1000 -10 1\n"
+
+    def setUp(self):
+        self.results_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.results_directory)
+
+    def get_target_set(self, config):
+        target_set = rbpf.TargetSet(config, rbpf.IdCounters())
+        #(center, width, height, time, id) with negative and fractional box coordinates, targets are created
+        #out of id order and nothing is alive on frames 1, 2 and 4
+        for (center, width, height, cur_time, id_) in [([10.25, 20.5], 30.7, 45.2, 0.0, 7), ([100.0, 50.0], 40.5, 20.25, 0.0, 3), \
+                                                       ([-3.5, 7.75], 4.0, 2.5, 3*rbpf.default_time_step, 5)]:
+            target_set.create_new_target(np.array(center), width, height, cur_time)
+            target_set.all_targets[-1].id_ = id_
+        return target_set
+
+    def test_offline_results_format(self):
+        for use_create_child in [True, False]:
+            config = rbpf.TrackerConfig(LEARNED_PARAMETERS, 1, USE_CREATE_CHILD=use_create_child)
+            filename = os.path.join(self.results_directory, "offline.txt")
+            self.get_target_set(config).write_targets_to_KITTI_format(5, filename)
+            with open(filename) as f:
+                self.assertEqual(f.read(), self.EXPECTED_LINES)
+
+    def test_online_results_format(self):
+        target_set = self.get_target_set(rbpf.TrackerConfig(LEARNED_PARAMETERS, 1))
+        filename = os.path.join(self.results_directory, "online.txt")
+        with open(filename, "w") as f:
+            rbpf.write_online_snapshot(f, rbpf.snapshot_living_targets(target_set.living_targets[1::-1], 0))
+            #a frame without targets writes nothing
+            rbpf.write_online_snapshot(f, rbpf.snapshot_living_targets([], 1))
+            rbpf.write_online_snapshot(f, rbpf.snapshot_living_targets(target_set.living_targets[2:], 3))
+        with open(filename) as f:
+            self.assertEqual(f.read(), self.EXPECTED_LINES)
+
+
+class AdaptiveParticleCountTestCase(unittest.TestCase):
+    def get_particle(self, positions, associations):
+        particle = rbpf.Particle(0, rbpf.TrackerConfig(LEARNED_PARAMETERS, 1), self.ids)
+        for (position, association) in zip(positions, associations):
+            particle.create_new_target(np.array(position), 60, 40, 0.0, association)
+        return particle
+
+    def test_bins_ignore_kalman_filter_states(self):
+        self.ids = rbpf.IdCounters()
+        particles = [self.get_particle([[100.0 + offset, 150.0], [400.0, 200.0 - offset]], [(0, 0), (0, 1)]) \
+                     for offset in [-.1, .1, -.2, .3]]
+        self.assertEqual(len(set([rbpf.get_posterior_bin(particle) for particle in particles])), 1)
+        particles.append(self.get_particle([[100.0, 150.0], [400.0, 200.0]], [(0, 0), None]))
+        particles.append(self.get_particle([[100.0, 150.0]], [(0, 0)]))
+        self.assertEqual(len(set([rbpf.get_posterior_bin(particle) for particle in particles])), 3)
+
+    def test_particle_count_is_stable_on_static_scene(self):
+        np.random.seed(0)
+        random.seed(0)
+        #resample on every frame
+        config = rbpf.TrackerConfig(LEARNED_PARAMETERS, 40, ADAPTIVE_PARTICLE_COUNT=True, MIN_PARTICLES=20, \
+                                    MAX_PARTICLES=400, RESAMPLE_RATIO=.5, RUN_ONLINE=False)
+        tracker = rbpf.Tracker(config)
+        particle_counts = []
+        for (frame_idx, detections_by_source) in enumerate(get_static_scene_detections(30, 0)):
+            tracker.step(frame_idx, detections_by_source)
+            particle_counts.append(len(tracker.rbpf_state.particle_set))
+        tracker.flush()
+        self.assertEqual(set(particle_counts[2:]), set([20]))
+
+
+class GatingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.gating_probability = .9999
+        rng = np.random.RandomState(0)
+        self.x = np.zeros((40, 4))
+        self.x[:, [0, 2]] = rng.uniform(0, 1000, (40, 2))
+        #targets with very different uncertainties
+        self.P = np.array([np.eye(4)*variance for variance in rng.uniform(1, 2000, 40)])
+        self.measurements = rng.uniform(0, 1000, (60, 2))
+        self.meas_noise_covs = np.array([np.eye(2)*variance for variance in rng.uniform(5, 50, 60)])
+
+    def test_gated_pairs_match_dense_likelihoods(self):
+        dense_log_likelihoods = rbpf.get_assoc_log_likelihood_matrix(self.x, self.P, self.measurements, self.meas_noise_covs)
+        offsets = self.measurements[np.newaxis, :, :] - self.x[:, [0, 2]][:, np.newaxis, :]
+        (mahalanobis, log_likelihoods) = rbpf.get_innovation_log_likelihoods(self.P[:, [0, 2]][:, :, [0, 2]][:, np.newaxis], \
+            self.meas_noise_covs[np.newaxis], offsets)
+        within_gate = mahalanobis <= rbpf.get_gate_threshold(self.gating_probability)
+        gated = rbpf.get_gated_assoc_likelihoods(self.x, self.P, self.measurements, self.meas_noise_covs, \
+            self.gating_probability)
+        self.assertEqual(len(gated.meas_indices), np.sum(within_gate))
+        for t in range(self.x.shape[0]):
+            for j in range(self.measurements.shape[0]):
+                expected = dense_log_likelihoods[t, j] if within_gate[t, j] else -np.inf
+                self.assertAlmostEqual(gated[t, j], expected)
+        target_sums = gated.get_target_sums()
+        for t in range(self.x.shape[0]):
+            self.assertAlmostEqual(target_sums[t], np.sum(np.exp(dense_log_likelihoods[t][within_gate[t]])))
+        for j in range(self.measurements.shape[0]):
+            (target_indices, likelihoods) = gated.get_measurement_candidates(j)
+            np.testing.assert_array_equal(target_indices, np.flatnonzero(within_gate[:, j]))
+            np.testing.assert_allclose(likelihoods, np.exp(dense_log_likelihoods[within_gate[:, j], j]))
+
+    def test_rows_of_gated_pairs(self):
+        gated = rbpf.get_gated_assoc_likelihoods(self.x, self.P, self.measurements, self.meas_noise_covs, \
+            self.gating_probability)
+        rows = gated.get_rows(10, 25)
+        self.assertEqual(rows.shape, (15, self.measurements.shape[0]))
+        for t in range(15):
+            for j in range(self.measurements.shape[0]):
+                self.assertEqual(rows[t, j], gated[t + 10, j])
+        empty = rbpf.get_gated_assoc_likelihoods(self.x[:0], self.P[:0], self.measurements, self.meas_noise_covs, \
+            self.gating_probability)
+        self.assertEqual(len(empty.get_target_sums()), 0)
+
+
+class FrameTimeBudgetTestCase(unittest.TestCase):
+    def get_timing_stats(self, frame_time_budget):
+        np.random.seed(0)
+        random.seed(0)
+        tracker = rbpf.Tracker(rbpf.TrackerConfig(LEARNED_PARAMETERS, 20, FRAME_TIME_BUDGET=frame_time_budget))
+        for (frame_idx, detections_by_source) in enumerate(get_static_scene_detections(5, 0)):
+            tracker.step(frame_idx, detections_by_source)
+        tracker.flush()
+        return tracker.get_timing_stats()
+
+    def test_stages_after_deadline_are_reported(self):
+        #a negative budget is used up before the first stage
+        timing_stats = self.get_timing_stats(-1.0)
+        self.assertEqual(timing_stats['budget_exhausted_count'], 5)
+        self.assertEqual(timing_stats['mean_updated_fraction'], 0.0)
+        #the likelihoods and with them all particle updates are skipped, there is nothing to resample
+        self.assertEqual(timing_stats['overrun_stage_counts'], {'predict': 5, 'likelihoods': 5, 'kf_update': 0, \
+                         'births_deaths': 0, 'id_matching': 0, 'resampling': 0})
+
+    def test_no_overruns_without_budget(self):
+        timing_stats = self.get_timing_stats(None)
+        self.assertEqual(timing_stats['budget_exhausted_count'], 0)
+        self.assertEqual(timing_stats['mean_updated_fraction'], 1.0)
+        self.assertEqual(sum(timing_stats['overrun_stage_counts'].values()), 0)
+
+
+class SharedMeasurementsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.results_directory = tempfile.mkdtemp()
+        self.config_a = rbpf.TrackerConfig(LEARNED_PARAMETERS, 20)
+        self.config_b = rbpf.TrackerConfig(([[0.0, 0.8]],) + LEARNED_PARAMETERS[1:], 20)
+
+    def tearDown(self):
+        shutil.rmtree(self.results_directory)
+
+    def get_online_results(self, config, sequence, name):
+        np.random.seed(0)
+        random.seed(0)
+        filename = os.path.join(self.results_directory, name)
+        rbpf.Tracker(config).run([sequence], filename)
+        with open(filename) as f:
+            return f.read()
+
+    def test_trackers_with_different_score_intervals_share_a_sequence(self):
+        sequence = get_loaded_sequence(15, 0, LEARNED_PARAMETERS)
+        fresh_sequence_b = get_loaded_sequence(15, 0, self.config_b.get_learned_parameters())
+        self.get_online_results(self.config_a, sequence, "a.txt")
+        self.assertEqual(self.get_online_results(self.config_b, sequence, "b.txt"), \
+                         self.get_online_results(self.config_b, fresh_sequence_b, "fresh_b.txt"))
+
+        measurement = sequence.measurements[0]
+        scores = np.array(measurement.scores)
+        for config in [self.config_a, self.config_b, self.config_a]:
+            (score_indices, emission_probs, meas_noise_covs) = rbpf.get_score_parameters(0, measurement, config)
+            np.testing.assert_array_equal(score_indices, (scores > config.score_intervals[0][1]).astype(int))
+
+    def test_missing_stamp_is_stale(self):
+        measurement = get_loaded_sequence(1, 0, LEARNED_PARAMETERS).measurements[0]
+        #parameters set without recording their tables
+        measurement.score_indices = np.zeros(len(measurement.scores), dtype=int)
+        measurement.score_parameter_tables = None
+        (score_indices, emission_probs, meas_noise_covs) = rbpf.get_score_parameters(0, measurement, self.config_a)
+        np.testing.assert_array_equal(score_indices, (np.array(measurement.scores) > .5).astype(int))
+
+
+class OnlineOnlyTestCase(unittest.TestCase):
+    def get_retained_rows(self, particle_set):
+        """
+        Output:
+        - row_count: number of trajectory rows allocated by the targets the particles reference (through
+            their TargetSets, target histories and history parents), each target counted once
+        """
+        visited = set()
+        def count_rows(target):
+            row_count = 0
+            while target is not None and not id(target) in visited:
+                visited.add(id(target))
+                row_count += target.trajectory.shape[0]
+                target = target.history_parent
+            return row_count
+        row_count = 0
+        for particle in particle_set:
+            targets = particle.targets.all_targets + particle.targets.living_targets
+            target_history = particle.targets.target_history
+            while target_history is not None:
+                targets += target_history.targets
+                target_history = target_history.older_history
+            row_count += sum([count_rows(target) for target in targets])
+        return row_count
+
+    def stream(self, config, detections, retained_rows=None):
+        np.random.seed(0)
+        random.seed(0)
+        tracker = rbpf.Tracker(config)
+        confirmed_tracks = []
+        for (frame_idx, detections_by_source) in enumerate(detections):
+            confirmed_tracks.append(tracker.step(frame_idx, detections_by_source))
+            if retained_rows is not None:
+                retained_rows.append(self.get_retained_rows(tracker.rbpf_state.particle_set))
+        (flushed_tracks, max_weight_target_set) = tracker.flush()
+        return (confirmed_tracks + flushed_tracks, max_weight_target_set)
+
+    def test_memory_stays_flat_on_long_stream(self):
+        config = rbpf.TrackerConfig(LEARNED_PARAMETERS, 10, ONLINE_ONLY=True)
+        retained_rows = []
+        (confirmed_tracks, max_weight_target_set) = self.stream(config, get_crossing_detections(400, 0), retained_rows)
+        self.assertIsNone(max_weight_target_set)
+        #about 4 targets are alive at a time, 26 are born and die over the stream
+        self.assertGreater(max([len(snapshot.ids) for snapshot in confirmed_tracks[3:]]), 2)
+        self.assertLessEqual(max(retained_rows[200:]), 1.25*max(retained_rows[50:200]))
+        self.assertLessEqual(max(retained_rows), 10*6*rbpf.TRAJECTORY_CAPACITY)
+
+    def test_online_results_are_unchanged(self):
+        detections = get_crossing_detections(80, 1)
+        (expected_tracks, max_weight_target_set) = self.stream(rbpf.TrackerConfig(LEARNED_PARAMETERS, 10), detections)
+        (confirmed_tracks, max_weight_target_set) = self.stream(rbpf.TrackerConfig(LEARNED_PARAMETERS, 10, ONLINE_ONLY=True), \
+                                                                detections)
+        self.assertEqual(len(confirmed_tracks), len(expected_tracks))
+        for (snapshot, expected_snapshot) in zip(confirmed_tracks, expected_tracks):
+            if expected_snapshot is None:
+                self.assertIsNone(snapshot)
+            else:
+                self.assertEqual(snapshot.frame_idx, expected_snapshot.frame_idx)
+                np.testing.assert_array_equal(snapshot.ids, expected_snapshot.ids)
+                np.testing.assert_array_equal(snapshot.rows, expected_snapshot.rows)
+
+
+
+class ParallelTestCase(unittest.TestCase):
+    def test_offspring_over_a_shard_size_are_moved(self):
+        #particles 0-2 are in worker 0, 3-4 in worker 1, particle 1 has 4 offspring
+        particle_owners = [0, 0, 0, 1, 1]
+        assigned_ancestors = rbpf.assign_resampled_particles([1, 1, 1, 1, 3], particle_owners, [3, 2])
+        self.assertEqual(assigned_ancestors, [[1, 1, 1], [3, 1]])
+        assigned_ancestors = rbpf.assign_resampled_particles([0, 3, 3, 3, 4], particle_owners, [3, 2])
+        self.assertEqual(assigned_ancestors, [[0, 3, 4], [3, 3]])
+
+    def test_worker_ids_are_unique(self):
+        ids = rbpf.IdCounters()
+        ids.get_particle_id()
+        ids.get_target_id()
+        n_workers = 3
+        match_ids = rbpf.IdCounters(ids.next_target_id, n_workers + 1, ids.next_particle_id)
+        every_ids = [match_ids] + [rbpf.get_worker_id_counters(ids, worker_index, n_workers) for worker_index in range(n_workers)]
+        particle_ids = [cur_ids.get_particle_id() for cur_ids in every_ids for i in range(5)]
+        target_ids = [cur_ids.get_target_id() for cur_ids in every_ids for i in range(5)]
+        for new_ids in [particle_ids, target_ids]:
+            self.assertEqual(len(set(new_ids)), len(new_ids))
+            self.assertGreaterEqual(min(new_ids), 1)
+
+
+class ModeRegressionTestCase(unittest.TestCase):
+    """
+    Each mode tracks the targets of get_crossing_detections with seed 0, every target keeps its ID and
+    every result box is close to its target
+    """
+    def setUp(self):
+        self.results_directory = tempfile.mkdtemp()
+        self.n_frames = 60
+        self.detections = get_crossing_detections(self.n_frames, 0)
+
+    def tearDown(self):
+        shutil.rmtree(self.results_directory)
+
+    def run_tracker(self, config, name):
+        """
+        Output:
+        - results: contents of the results file Tracker.run writes, the offline results if RUN_ONLINE
+            is False
+        - tracker: the Tracker, after the run
+        """
+        np.random.seed(0)
+        random.seed(0)
+        filename = os.path.join(self.results_directory, name)
+        tracker = rbpf.Tracker(config)
+        (max_weight_target_set, run_info, number_resamplings) = tracker.run([get_detection_sequence(self.detections)], filename)
+        if not config.run_online:
+            tracker.write_targets_to_KITTI_format(max_weight_target_set, self.n_frames, filename)
+        with open(filename) as f:
+            return (f.read(), tracker)
+
+    def stream_tracker(self, config, name):
+        """
+        Output:
+        - results: contents of a results file the online results step and flush return are written to,
+            the offline results flush returns if RUN_ONLINE is False
+        - particle_counts: the number of particles after each frame
+        - tracker: the Tracker, after flush
+        """
+        np.random.seed(0)
+        random.seed(0)
+        filename = os.path.join(self.results_directory, name)
+        tracker = rbpf.Tracker(config)
+        particle_counts = []
+        with open(filename, "w") as f:
+            for (frame_idx, detections_by_source) in enumerate(self.detections):
+                confirmed_tracks = tracker.step(frame_idx, detections_by_source)
+                if confirmed_tracks is not None:
+                    rbpf.write_online_snapshot(f, confirmed_tracks)
+                particle_counts.append(len(tracker.rbpf_state.particle_set))
+            (flushed_tracks, max_weight_target_set) = tracker.flush()
+            for confirmed_tracks in flushed_tracks:
+                rbpf.write_online_snapshot(f, confirmed_tracks)
+        if not config.run_online:
+            tracker.write_targets_to_KITTI_format(max_weight_target_set, self.n_frames, filename)
+        with open(filename) as f:
+            return (f.read(), particle_counts, tracker)
+
+    def check_results(self, results):
+        lines = np.loadtxt(results.splitlines(), usecols=(0, 1, 6, 7, 8, 9), ndmin=2)
+        frame_target_pairs = set()
+        id_target_pairs = set()
+        for (frame_idx, target_id, x1, y1, x2, y2) in lines:
+            (entries, centers) = get_crossing_centers(int(frame_idx))
+            distances = np.sqrt(np.sum((centers - [(x1 + x2)/2, (y1 + y2)/2])**2, axis=1))
+            self.assertLess(np.min(distances), 10)
+            frame_target_pairs.add((frame_idx, entries[np.argmin(distances)]))
+            id_target_pairs.add((target_id, entries[np.argmin(distances)]))
+        #one box per target on every frame
+        self.assertEqual(len(frame_target_pairs), len(lines))
+        self.assertEqual(len(lines), sum([len(get_crossing_centers(frame_idx)[0]) for frame_idx in range(self.n_frames)]))
+        #one ID per target
+        self.assertEqual(len(id_target_pairs), self.n_frames//15)
+        self.assertEqual(len(set([target_id for (target_id, entry) in id_target_pairs])), self.n_frames//15)
+
+    def test_serial(self):
+        (results, tracker) = self.run_tracker(rbpf.TrackerConfig(LEARNED_PARAMETERS, 20), "serial.txt")
+        self.check_results(results)
+        self.assertEqual(self.run_tracker(rbpf.TrackerConfig(LEARNED_PARAMETERS, 20), "serial_again.txt")[0], results)
+
+    def test_offline(self):
+        (results, tracker) = self.run_tracker(rbpf.TrackerConfig(LEARNED_PARAMETERS, 20, RUN_ONLINE=False), "offline.txt")
+        self.check_results(results)
+
+    def test_parallel(self):
+        for run_online in [True, False]:
+            config = rbpf.TrackerConfig(LEARNED_PARAMETERS, 20, N_WORKERS=2, RUN_ONLINE=run_online)
+            (results, tracker) = self.run_tracker(config, "parallel.txt")
+            self.check_results(results)
+            #the next run's IDs start after those given by every worker
+            self.assertGreaterEqual(tracker.ids.next_particle_id, 20)
+            if run_online:
+                self.assertGreater(tracker.ids.next_target_id, max([int(line.split()[1]) for line in results.splitlines()]))
+
+    def test_gating(self):
+        (results, tracker) = self.run_tracker(rbpf.TrackerConfig(LEARNED_PARAMETERS, 20, GATING_PROBABILITY=.9999), "gating.txt")
+        self.check_results(results)
+        #the pairs outside the gate are too unlikely to be sampled
+        self.assertEqual(results, self.run_tracker(rbpf.TrackerConfig(LEARNED_PARAMETERS, 20), "serial.txt")[0])
+
+    def test_streaming(self):
+        for settings in [{}, {'ONLINE_ONLY': True}, {'RUN_ONLINE': False}]:
+            (results, particle_counts, tracker) = self.stream_tracker(rbpf.TrackerConfig(LEARNED_PARAMETERS, 20, **settings), \
+                                                                      "streaming.txt")
+            self.check_results(results)
+            #online only results are the same as online results
+            run_settings = dict([(name, value) for (name, value) in settings.items() if name != 'ONLINE_ONLY'])
+            self.assertEqual(results, self.run_tracker(rbpf.TrackerConfig(LEARNED_PARAMETERS, 20, **run_settings), "run.txt")[0])
+
+    def test_adaptive_particle_count(self):
+        #resample on every frame
+        config = rbpf.TrackerConfig(LEARNED_PARAMETERS, 20, ADAPTIVE_PARTICLE_COUNT=True, MIN_PARTICLES=10, \
+                                    MAX_PARTICLES=200, RESAMPLE_RATIO=.5)
+        (results, particle_counts, tracker) = self.stream_tracker(config, "adaptive.txt")
+        self.check_results(results)
+        #more particles are needed on the frames targets enter on, while their birth is uncertain
+        self.assertEqual(set(particle_counts[1:15] + particle_counts[16:30] + particle_counts[31:45]), set([10]))
+        self.assertTrue(all([10 < particle_counts[frame_idx] <= 200 for frame_idx in [0, 15, 30, 45]]))
+
+    def test_frame_time_budget(self):
+        #a budget that is never used up, particles are still updated in ANYTIME_PRIORITY order
+        config = rbpf.TrackerConfig(LEARNED_PARAMETERS, 20, FRAME_TIME_BUDGET=60.0)
+        (results, particle_counts, tracker) = self.stream_tracker(config, "budget.txt")
+        self.check_results(results)
+        self.assertEqual(self.stream_tracker(config, "budget_again.txt")[0], results)
+        timing_stats = tracker.get_timing_stats()
+        self.assertEqual(timing_stats['budget_exhausted_count'], 0)
+        self.assertEqual(timing_stats['mean_updated_fraction'], 1.0)
+        self.assertEqual(sum(timing_stats['overrun_stage_counts'].values()), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
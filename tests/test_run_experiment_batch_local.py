@@ -0,0 +1,153 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+REPOSITORY_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(REPOSITORY_DIRECTORY, "KITTI_helpers"))
+sys.path.insert(0, REPOSITORY_DIRECTORY)
+import rbpf_KITTI_det_scores as rbpf
+import learn_params1
+import run_experiment_batch_local as runner
+
+
+class CacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.load_detections = rbpf.load_detections
+        self.learn_parameters = rbpf.learn_parameters
+        self.loads = []
+        self.calls = []
+        def load_detections(*detection_flags):
+            self.loads.append(detection_flags)
+            return (["measurement target sets", detection_flags], {"regionlets": detection_flags})
+        def learn_parameters(seq_idx, *detection_flags, **kwargs):
+            self.calls.append((detection_flags, seq_idx, kwargs["detections"]))
+            return (["measurement target sets", detection_flags], ("parameters", detection_flags, seq_idx))
+        rbpf.load_detections = load_detections
+        rbpf.learn_parameters = learn_parameters
+        runner.DETECTIONS_CACHE.clear()
+        runner.LEARNED_PARAMETERS_CACHE.clear()
+
+    def tearDown(self):
+        rbpf.load_detections = self.load_detections
+        rbpf.learn_parameters = self.learn_parameters
+        runner.DETECTIONS_CACHE.clear()
+        runner.LEARNED_PARAMETERS_CACHE.clear()
+
+    def test_detections_are_shared_by_sequences(self):
+        flags = (False, False, True, True)
+        (detections_0, parameters_0) = runner.get_detections_and_learned_parameters(flags, 0)
+        (detections_1, parameters_1) = runner.get_detections_and_learned_parameters(flags, 1)
+        self.assertIs(detections_0, detections_1)
+        self.assertEqual((parameters_0[2], parameters_1[2]), (0, 1))
+        #both entries stay cached
+        runner.get_detections_and_learned_parameters(flags, 0)
+        runner.get_detections_and_learned_parameters(flags, 1)
+        #the detections are loaded once and every sequence learns its parameters from them
+        self.assertEqual(self.loads, [flags])
+        loaded = runner.DETECTIONS_CACHE[flags]
+        self.assertIs(detections_0, loaded[0])
+        self.assertEqual([(detection_flags, seq_idx) for (detection_flags, seq_idx, detections) in self.calls], \
+                         [(flags, 0), (flags, 1)])
+        for (detection_flags, seq_idx, detections) in self.calls:
+            self.assertIs(detections, loaded)
+
+    def test_oldest_detections_are_evicted(self):
+        all_flags = [(False, False, use_regionlets_and_lsvm, sort_dets_on_intervals) \
+                     for use_regionlets_and_lsvm in [True, False] for sort_dets_on_intervals in [True, False]]
+        for flags in all_flags:
+            runner.get_detections_and_learned_parameters(flags, 0)
+        self.assertEqual(list(runner.DETECTIONS_CACHE.keys()), all_flags[-runner.MAX_CACHED_DETECTION_SETS:])
+        #the learned parameters are cached, but the detections have to be loaded again
+        runner.get_detections_and_learned_parameters(all_flags[0], 0)
+        self.assertEqual(self.loads, all_flags + [all_flags[0]])
+        self.assertEqual(len(self.calls), len(all_flags))
+
+
+def get_synthetic_objects(det_method, min_score, n_sequences=21, n_frames=30):
+    """
+    Output:
+    - gt_objects, det_objects: as learn_params1.evaluate returns them, the same ground truth tracks for every
+        det_method, each detected with probability .8 plus clutter detections, with scores of at least min_score
+    """
+    gt_rng = np.random.RandomState(0)
+    det_rng = np.random.RandomState(["regionlets", "lsvm"].index(det_method) + 1)
+    gt_objects = []
+    det_objects = []
+    for seq_idx in range(n_sequences):
+        tracks = [(track_id, gt_rng.randint(0, n_frames//2), gt_rng.randint(n_frames//2, n_frames + 5),
+                   gt_rng.uniform(5, 1100), gt_rng.uniform(5, 300)) for track_id in range(4)]
+        seq_gt_objects = []
+        seq_det_objects = []
+        for frame_idx in range(n_frames):
+            frame_gt_objects = []
+            frame_det_objects = []
+            for (track_id, birth, death, x, y) in tracks:
+                if birth <= frame_idx < death:
+                    x1 = x + 3*frame_idx
+                    frame_gt_objects.append(learn_params1.gtObject(x1, x1 + 60, y, y + 40, track_id))
+                    if det_rng.rand() < .8:
+                        (dx, dy) = det_rng.randn(2)
+                        frame_det_objects.append(learn_params1.detObject(x1 + dx, x1 + 60 + dx, y + dy, y + 40 + dy, track_id, \
+                                                                         min_score + det_rng.uniform(0, 20)))
+            for clutter_idx in range(det_rng.poisson(1)):
+                (x1, y1) = (det_rng.uniform(0, 1100), det_rng.uniform(0, 300))
+                frame_det_objects.append(learn_params1.detObject(x1, x1 + 50, y1, y1 + 30, -1, min_score + det_rng.uniform(0, 20)))
+            seq_gt_objects.append(frame_gt_objects)
+            seq_det_objects.append(frame_det_objects)
+        gt_objects.append(seq_gt_objects)
+        det_objects.append(seq_det_objects)
+    return (gt_objects, det_objects)
+
+
+class LoadDetectionsTestCase(unittest.TestCase):
+    """
+    rbpf.learn_parameters learns the same parameters from detections loaded by rbpf.load_detections as
+    when it loads them itself, on synthetic ground truth and detections of every sequence
+    """
+    def setUp(self):
+        self.evaluate = learn_params1.evaluate
+        self.evaluate_calls = []
+        def evaluate(min_score, det_method, mail, obj_class="car", include_ignored_gt=False, include_dontcare_in_gt=False, \
+                     include_ignored_detections=True):
+            self.evaluate_calls.append(det_method)
+            return get_synthetic_objects(det_method, min_score)
+        learn_params1.evaluate = evaluate
+
+    def tearDown(self):
+        learn_params1.evaluate = self.evaluate
+
+    def test_learned_parameters_match(self):
+        for use_regionlets_and_lsvm in [True, False]:
+            flags = (False, False, use_regionlets_and_lsvm, True)
+            del self.evaluate_calls[:]
+            detections = rbpf.load_detections(*flags)
+            load_count = len(self.evaluate_calls)
+            self.assertEqual(load_count, 2 if use_regionlets_and_lsvm else 1)
+            for seq_idx in [0, 3]:
+                del self.evaluate_calls[:]
+                (measurementTargetSetsBySequence, learned_parameters) = rbpf.learn_parameters(seq_idx, *flags, \
+                    detections=detections)
+                self.assertEqual(self.evaluate_calls, [])
+                for (seq_target_sets, loaded_target_sets) in zip(measurementTargetSetsBySequence, detections[0]):
+                    self.assertEqual(len(seq_target_sets), load_count)
+                    for (target_set, loaded_target_set) in zip(seq_target_sets, loaded_target_sets):
+                        self.assertIs(target_set, loaded_target_set)
+                (expected_target_sets, expected_parameters) = rbpf.learn_parameters(seq_idx, *flags)
+                self.assertEqual(repr(learned_parameters), repr(expected_parameters))
+                self.assertEqual([[[(m.scores, [list(v) for v in m.val]) for m in target_set.measurements] \
+                                   for target_set in seq_target_sets] for seq_target_sets in measurementTargetSetsBySequence], \
+                                 [[[(m.scores, [list(v) for v in m.val]) for m in target_set.measurements] \
+                                   for target_set in seq_target_sets] for seq_target_sets in expected_target_sets])
+
+
+class RunSeedTestCase(unittest.TestCase):
+    def test_seeds_are_unique(self):
+        seeds = [rbpf.get_run_seed(run_idx, seq_idx) for seq_idx in range(21) for run_idx in range(1, 101)]
+        self.assertEqual(len(set(seeds)), len(seeds))
+        self.assertEqual(rbpf.get_run_seed(3, 7), rbpf.get_run_seed(3, 7))
+
+
+if __name__ == "__main__":
+    unittest.main()